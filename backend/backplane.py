@@ -0,0 +1,214 @@
+import asyncio
+import glob
+import json
+import os
+
+from settings import BACKPLANE, BACKPLANE_DIR
+
+
+class LocalBackplane:
+    '''
+    In-process backplane: a published message is delivered to the
+    subscribers of this process only. Enough for a single uvicorn worker.
+    '''
+
+    def __init__(self):
+        self._handlers = {}
+        self.dropped = 0
+
+    def subscribe(self, channel: str, handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def publish(self, channel: str, message):
+        await self._deliver(channel, message)
+
+    async def _deliver(self, channel: str, message):
+        for handler in self._handlers.get(channel, []):
+            try:
+                await handler(message)
+            except Exception as e:
+                print(f"Backplane handler for {channel} failed: {e}")
+
+    def stats(self) -> dict:
+        return {'peers': 0, 'dropped': self.dropped}
+
+
+class UnixSocketBackplane(LocalBackplane):
+    '''
+    Backplane for several workers on one host.
+
+    Every worker listens on a stream socket named after its pid in a shared
+    directory. A message is queued once for every other socket there and
+    delivered locally by the publisher itself, so each worker sees it
+    exactly once.
+
+    Each peer has one sender task writing its queue in order over a kept
+    open connection, reconnecting and retrying with backoff when a write
+    fails. A message for a peer whose queue is full is dropped and counted,
+    so a stuck worker never holds up the publishers. Received messages
+    are delivered by a single task in the order they arrive. Sockets left
+    behind by dead workers are removed when a connection is refused.
+    '''
+
+    max_message_size = 1024 * 1024
+    queue_size = 1000
+    max_attempts = 5
+    retry_delay = 0.1
+
+    def __init__(self, directory: str, name: str = None):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f'{name or os.getpid()}.sock')
+        self._server = None
+        self._senders = {}
+        self._readers = {}
+        self._inbox = None
+        self._delivery = None
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self._inbox = asyncio.Queue()
+        self._delivery = asyncio.create_task(self._run_delivery())
+        self._server = await asyncio.start_unix_server(
+            self._serve, path=self.path, limit=self.max_message_size + 1
+        )
+
+    async def close(self):
+        if not self._server:
+            return
+
+        self._server.close()
+        self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        # Let the senders write what is queued
+        senders = [task for _, task in self._senders.values()]
+        for queue, task in self._senders.values():
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                # A stuck peer, what is queued would not get through anyway
+                task.cancel()
+        if senders:
+            await asyncio.wait(senders, timeout=1)
+
+        # Readers see the end of their stream and return
+        for writer in self._readers:
+            writer.close()
+        if self._readers:
+            await asyncio.wait(self._readers.values(), timeout=1)
+        for task in [*senders, self._delivery]:
+            task.cancel()
+        self._senders.clear()
+
+    def _peers(self):
+        return [
+            path
+            for path in glob.glob(os.path.join(self.directory, '*.sock'))
+            if path != self.path
+        ]
+
+    async def publish(self, channel: str, message):
+        if self._server:
+            data = json.dumps([channel, message]).encode() + b'\n'
+            if len(data) > self.max_message_size:
+                raise ValueError(
+                    f"Backplane message on {channel} is {len(data)} bytes, "
+                    f"over the {self.max_message_size} bytes limit"
+                )
+
+            for peer in self._peers():
+                try:
+                    self._sender(peer).put_nowait(data)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+                    if self.dropped % self.queue_size == 1:
+                        print(
+                            f"Backplane queue of {peer} is full, "
+                            f"{self.dropped} messages dropped"
+                        )
+
+        await self._deliver(channel, message)
+
+    def _sender(self, peer: str) -> asyncio.Queue:
+        if peer not in self._senders:
+            queue = asyncio.Queue(self.queue_size)
+            task = asyncio.create_task(self._send(peer, queue))
+            self._senders[peer] = (queue, task)
+
+        return self._senders[peer][0]
+
+    async def _send(self, peer: str, queue: asyncio.Queue):
+        writer = None
+
+        try:
+            while (data := await queue.get()) is not None:
+                for attempt in range(self.max_attempts):
+                    try:
+                        if writer is None:
+                            _, writer = await asyncio.open_unix_connection(peer)
+                        writer.write(data)
+                        await writer.drain()
+                        break
+                    except (ConnectionRefusedError, FileNotFoundError):
+                        # Nobody listens there anymore
+                        try:
+                            os.unlink(peer)
+                        except FileNotFoundError:
+                            pass
+                        return
+                    except OSError as e:
+                        print(f"Backplane send to {peer} failed: {e}, retrying")
+                        if writer:
+                            writer.close()
+                            writer = None
+                        await asyncio.sleep(self.retry_delay * 2**attempt)
+                else:
+                    print(
+                        f"Backplane message to {peer} dropped "
+                        f"after {self.max_attempts} attempts"
+                    )
+        finally:
+            if writer:
+                writer.close()
+            if self._senders.get(peer, (None,))[0] is queue:
+                del self._senders[peer]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._readers[writer] = asyncio.current_task()
+
+        try:
+            while line := await reader.readline():
+                await self._inbox.put(json.loads(line))
+        except (ConnectionError, ValueError) as e:
+            print(f"Backplane connection dropped: {e}")
+        finally:
+            self._readers.pop(writer, None)
+            writer.close()
+
+    async def _run_delivery(self):
+        while True:
+            channel, message = await self._inbox.get()
+            await self._deliver(channel, message)
+
+    def stats(self) -> dict:
+        return {'peers': len(self._senders), 'dropped': self.dropped}
+
+
+def create_backplane():
+    if BACKPLANE == 'unix':
+        return UnixSocketBackplane(BACKPLANE_DIR)
+    return LocalBackplane()
+
+
+backplane = create_backplane()
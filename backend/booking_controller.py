@@ -1,5 +1,4 @@
 import aiosqlite
-import httpx
 from time import time
 from typing import List
 from datetime import datetime, timedelta, UTC
@@ -30,11 +29,19 @@ from tools import (
     check_token,
     delete_s3_object,
     CheckRole,
+    booking_scheduler,
+)
+from database import read_pool
+from search_indexer import search_indexer
+from slot_states import slot_states
+from models import (
+    Booking,
+    BookingPatch,
+    FullBooking,
+    BookingsClosestResponse,
+    BookingLimits,
 )
-from models import Booking, BookingPatch, FullBooking, BookingsClosestResponse
 from settings import (
-    SYSTEM_TOKEN,
-    MEILISEARCH_HOST,
     JWT_SECRET,
     MIN_BOOKING_TIME,
     MAX_BOOKING_TIME,
@@ -71,9 +78,10 @@ async def post_bookings(
             duration,
             event_date,
             description,
-            location
+            location,
+            end_date
             )
-        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9)
         ''',
         (
             user_address,
@@ -84,6 +92,7 @@ async def post_bookings(
             booking.event_date,
             booking.description,
             booking.location,
+            booking.start_date + booking.duration,
         ),
     )
     await db.commit()
@@ -105,18 +114,11 @@ async def post_bookings(
     inserted_booking = dict(inserted_booking)
     inserted_booking['is_live'] = bool(inserted_booking['is_live'])
 
-    meilisearch_headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {SYSTEM_TOKEN}',
-    }
+    await booking_scheduler.reschedule(
+        booking_id, inserted_booking['start_date'], inserted_booking['end_date']
+    )
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f'{MEILISEARCH_HOST}/indexes/booking/documents',
-            headers=meilisearch_headers,
-            json=[inserted_booking],
-        )
-        response.raise_for_status()
+    search_indexer.notify()
 
     await check_closest_booking(
         booking_id, booking.location, inserted_booking, 'added', db
@@ -142,8 +144,7 @@ async def post_booking_poster(
 
     save_path = f'{hash(user_address)}/{int(time())}_{preview.filename}-booking-preview'
 
-    preview_content = await preview.read()
-    s3_urn = await s3_upload(save_path, preview_content)
+    s3_urn = await s3_upload(save_path, preview)
 
     cursor = await db.execute(
         '''
@@ -185,17 +186,7 @@ async def post_booking_poster(
     updated_booking = dict(updated_booking)
     updated_booking['is_live'] = bool(updated_booking['is_live'])
 
-    meilisearch_headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {SYSTEM_TOKEN}',
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f'{MEILISEARCH_HOST}/indexes/booking/documents',
-            headers=meilisearch_headers,
-            json=[updated_booking],
-        )
-        response.raise_for_status()
+    search_indexer.notify()
 
     await check_closest_booking(
         booking_id, updated_booking['location'], updated_booking, 'updated', db
@@ -215,7 +206,7 @@ async def get_bookings(
         '''
         SELECT *
         FROM Booking
-        WHERE (start_date + duration) >= ?1 AND start_date <= ?2 AND location = ?3
+        WHERE location = ?3 AND end_date >= ?1 AND start_date <= ?2
         ''',
         (from_date, to_date, location_id),
     )
@@ -247,6 +238,29 @@ async def get_booking(booking_id: int, db=Depends(db_connection)):
     return booking
 
 
+@router.get('/bookings/{booking_id}/limits', response_model=BookingLimits)
+async def get_booking_limits(booking_id: int, db=Depends(db_connection)):
+
+    db.row_factory = aiosqlite.Row
+
+    cursor = await db.execute(
+        '''
+        SELECT content_limit, content_count, music_limit, music_count
+        FROM Booking
+        WHERE id = ?1
+        ''',
+        (booking_id,),
+    )
+    booking = await cursor.fetchone()
+    if not booking:
+        raise HTTPException(status_code=404, detail="There is no such booking")
+
+    return {
+        'content': {'limit': booking['content_limit'], 'count': booking['content_count']},
+        'music': {'limit': booking['music_limit'], 'count': booking['music_count']},
+    }
+
+
 @router.put('/bookings/{booking_id}', response_model=FullBooking)
 async def update_booking(
     booking_id: int,
@@ -265,7 +279,7 @@ async def update_booking(
     await db.execute(
         '''
         UPDATE Booking 
-        SET owner = ?1, title = ?2, start_date = ?3, location = ?4
+        SET owner = ?1, title = ?2, start_date = ?3, location = ?4, end_date = ?3 + duration
         WHERE id = ?5
         ''',
         (user_address, booking.title, booking.start_date, booking.location, booking_id),
@@ -285,17 +299,11 @@ async def update_booking(
     updated_booking = dict(updated_booking)
     updated_booking['is_live'] = bool(updated_booking['is_live'])
 
-    meilisearch_headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {SYSTEM_TOKEN}',
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f'{MEILISEARCH_HOST}/indexes/booking/documents',
-            headers=meilisearch_headers,
-            json=[updated_booking],
-        )
-        response.raise_for_status()
+    await booking_scheduler.reschedule(
+        booking_id, updated_booking['start_date'], updated_booking['end_date']
+    )
+
+    search_indexer.notify()
 
     return updated_booking
 
@@ -322,9 +330,13 @@ async def partial_update_booking(
 
     query = "UPDATE Booking SET "
     query += ', '.join(f"{key} = ?" for key in updates.keys())
-    query += " WHERE id = ?"
-
     values = list(updates.values())
+
+    if 'start_date' in updates or 'duration' in updates:
+        query += ", end_date = COALESCE(?, start_date) + COALESCE(?, duration)"
+        values.extend([updates.get('start_date'), updates.get('duration')])
+
+    query += " WHERE id = ?"
     values.append(booking_id)
 
     await db.execute(query, values)
@@ -343,17 +355,11 @@ async def partial_update_booking(
     updated_booking = dict(updated_booking)
     updated_booking['is_live'] = bool(updated_booking['is_live'])
 
-    meilisearch_headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {SYSTEM_TOKEN}',
-    }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f'{MEILISEARCH_HOST}/indexes/booking/documents',
-            headers=meilisearch_headers,
-            json=[updated_booking],
-        )
-        response.raise_for_status()
+    await booking_scheduler.reschedule(
+        booking_id, updated_booking['start_date'], updated_booking['end_date']
+    )
+
+    search_indexer.notify()
 
     await check_closest_booking(
         booking_id, updated_booking['location'], updated_booking, 'updated', db
@@ -386,13 +392,9 @@ async def delete_booking(
     await db.execute('DELETE FROM Content WHERE booking = ?', (booking_id,))
     await db.commit()
 
-    meilisearch_headers = {'Authorization': f'Bearer {SYSTEM_TOKEN}'}
-    async with httpx.AsyncClient() as client:
-        response = await client.delete(
-            f'{MEILISEARCH_HOST}/indexes/booking/documents/{booking_id}',
-            headers=meilisearch_headers,
-        )
-        response.raise_for_status()
+    await booking_scheduler.cancel(booking_id)
+
+    search_indexer.notify()
 
     await check_closest_booking(booking_id, location, deleted_booking, 'deleted', db)
 
@@ -412,7 +414,7 @@ async def get_active_bookings(
         '''
         SELECT *
         FROM Booking
-        WHERE location = ?1 AND (start_date + duration) > ?4
+        WHERE location = ?1 AND end_date > ?4
         ORDER BY start_date
         LIMIT ?2 OFFSET ?3
         ''',
@@ -437,7 +439,7 @@ async def get_inactive_bookings(
         '''
         SELECT *
         FROM Booking
-        WHERE location = ?1 AND (start_date + duration < ?4)
+        WHERE location = ?1 AND end_date < ?4
         ORDER BY start_date DESC
         LIMIT ?2 OFFSET ?3
         ''',
@@ -468,7 +470,7 @@ async def get_active_user_bookings(
         '''
         SELECT *
         FROM Booking
-        WHERE owner = ?3 AND location = ?5 AND (start_date + duration > ?4)
+        WHERE owner = ?3 AND location = ?5 AND end_date > ?4
         ORDER BY start_date
         LIMIT ?1 OFFSET ?2
         ''',
@@ -499,7 +501,7 @@ async def get_inactive_user_bookings(
         '''
         SELECT *
         FROM Booking
-        WHERE owner = ?3 AND location = ?5 AND (start_date + duration < ?4)
+        WHERE owner = ?3 AND location = ?5 AND end_date < ?4
         ORDER BY start_date DESC
         LIMIT ?1 OFFSET ?2
         ''',
@@ -568,7 +570,7 @@ async def get_poster(location_id: str, db=Depends(db_connection)):
         SELECT * 
         FROM Booking
         WHERE location = ?1
-        AND (start_date + duration) >= ?2
+        AND end_date >= ?2
         ORDER BY start_date
         LIMIT 2
         ''',
@@ -580,8 +582,8 @@ async def get_poster(location_id: str, db=Depends(db_connection)):
         SELECT * 
         FROM Booking
         WHERE location = ?1
-        AND (start_date + duration) < ?2
-        ORDER BY (?2 - (start_date + duration)) ASC
+        AND end_date < ?2
+        ORDER BY end_date DESC
         LIMIT 1
         ''',
         (location_id, current_date),
@@ -608,11 +610,8 @@ async def websocket_endpoint(
     websocket: WebSocket,
     booking_id: int,
     token: str = None,
-    db=Depends(db_connection),
 ):
 
-    db.row_factory = aiosqlite.Row
-
     if not token:
         user_address = None
 
@@ -625,16 +624,15 @@ async def websocket_endpoint(
 
     await booking_socket_manager.connect(websocket, booking_id)
 
-    cursor = await db.execute(
-        '''
-        SELECT *
-        FROM SlotStates
-        WHERE booking = ?1
-        ''',
-        (booking_id,),
-    )
-    booking_state = await cursor.fetchall()
-    booking_state = [dict(el) for el in booking_state]
+    # Checked once per session rather than per message
+    async with read_pool.connection() as db:
+        cursor = await db.execute(
+            'SELECT owner FROM Booking WHERE id = ?1', (booking_id,)
+        )
+        row = await cursor.fetchone()
+    is_owner = row is not None and row[0] == user_address
+
+    booking_state = await slot_states.load(booking_id)
     await booking_socket_manager.send_personal_message(
         {"type": "init_booking_states", "data": booking_state}, websocket
     )
@@ -644,28 +642,16 @@ async def websocket_endpoint(
             data = await websocket.receive_json()
             message_data = data['data']
 
-            async with db.execute(
-                'SELECT owner FROM Booking WHERE id = ?1', (booking_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row and row['owner'] == user_address:
-                    await cursor.execute(
-                        '''
-                        INSERT OR REPLACE INTO SlotStates (booking, slot, content_index, is_paused)
-                        VALUES (?1, ?2, ?3, ?4)
-                        ''',
-                        (
-                            booking_id,
-                            message_data.get('slot'),
-                            message_data.get('content_index'),
-                            message_data.get('is_paused'),
-                        ),
-                    )
-                    await db.commit()
-
-                    await booking_socket_manager.broadcast(data, booking_id)
+            if not is_owner:
+                continue
+
+            await slot_states.update(booking_id, message_data)
+
+            await booking_socket_manager.broadcast(data, booking_id)
     except WebSocketDisconnect:
         booking_socket_manager.disconnect(websocket, booking_id)
+    finally:
+        await slot_states.release(booking_id)
 
 
 @router.get('/signed/ws-token')
@@ -683,11 +669,9 @@ async def get_token(user_address=Depends(validate_auth_chain)):
 
 @router.websocket('/ws/booking/{booking_id}/signed')
 async def signed_websocket_endpoint(
-    websocket: WebSocket, booking_id: int, token: str, db=Depends(db_connection)
+    websocket: WebSocket, booking_id: int, token: str
 ):
 
-    db.row_factory = aiosqlite.Row
-
     try:
         decoded_token = await check_token(token)
         user_address = decoded_token.get('user_address')
@@ -697,16 +681,15 @@ async def signed_websocket_endpoint(
 
     await booking_socket_manager.connect(websocket, booking_id)
 
-    cursor = await db.execute(
-        '''
-        SELECT *
-        FROM SlotStates
-        WHERE booking = ?1
-        ''',
-        (booking_id,),
-    )
-    booking_state = await cursor.fetchall()
-    booking_state = [dict(el) for el in booking_state]
+    # Checked once per session rather than per message
+    async with read_pool.connection() as db:
+        cursor = await db.execute(
+            'SELECT owner FROM Booking WHERE id = ?1', (booking_id,)
+        )
+        row = await cursor.fetchone()
+    is_owner = row is not None and row[0] == user_address
+
+    booking_state = await slot_states.load(booking_id)
     await booking_socket_manager.send_personal_message(
         {"type": "init_booking_states", "data": booking_state}, websocket
     )
@@ -716,25 +699,13 @@ async def signed_websocket_endpoint(
             data = await websocket.receive_json()
             message_data = data['data']
 
-            async with db.execute(
-                'SELECT owner FROM Booking WHERE id = ?1', (booking_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row and row['owner'] == user_address:
-                    await cursor.execute(
-                        '''
-                        INSERT OR REPLACE INTO SlotStates (booking, slot, content_index, is_paused)
-                        VALUES (?1, ?2, ?3, ?4)
-                        ''',
-                        (
-                            booking_id,
-                            message_data.get('slot'),
-                            message_data.get('content_index'),
-                            message_data.get('is_paused'),
-                        ),
-                    )
-                    await db.commit()
-
-                    await booking_socket_manager.broadcast(data, booking_id)
+            if not is_owner:
+                continue
+
+            await slot_states.update(booking_id, message_data)
+
+            await booking_socket_manager.broadcast(data, booking_id)
     except WebSocketDisconnect:
         booking_socket_manager.disconnect(websocket, booking_id)
+    finally:
+        await slot_states.release(booking_id)
@@ -0,0 +1,145 @@
+import asyncio
+import json
+from collections import deque
+from time import perf_counter
+from typing import Iterable
+
+from fastapi import WebSocket
+
+from settings import BROADCAST_QUEUE_SIZE, BROADCAST_LAG_BUDGET
+
+
+def serialize(message) -> str:
+    # Same encoding as WebSocket.send_json, done once per message
+    return json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+
+
+class SocketChannel:
+    '''
+    Outbound side of one websocket: a bounded queue drained by its own task.
+    '''
+
+    def __init__(self, websocket: WebSocket, latencies: deque, on_closed=None):
+        self.websocket = websocket
+        self.closed = False
+        self._on_closed = on_closed
+
+        self._queue = asyncio.Queue(BROADCAST_QUEUE_SIZE)
+        self._sending_since = None
+        self._latencies = latencies
+        self._task = asyncio.create_task(self._pump())
+
+    def push(self, frame: str, queued_at: float) -> bool:
+        '''
+        Returns False if the client is over its lag budget.
+        '''
+
+        if self.closed:
+            return True
+
+        if (
+            self._sending_since is not None
+            and perf_counter() - self._sending_since > BROADCAST_LAG_BUDGET
+        ):
+            return False
+
+        try:
+            self._queue.put_nowait((frame, queued_at))
+        except asyncio.QueueFull:
+            return False
+
+        return True
+
+    async def _pump(self):
+        try:
+            while True:
+                frame, queued_at = await self._queue.get()
+                self._sending_since = perf_counter()
+                await self.websocket.send_text(frame)
+                self._sending_since = None
+                self._latencies.append(perf_counter() - queued_at)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The socket is gone, the endpoint will call disconnect
+            self.closed = True
+            if self._on_closed:
+                self._on_closed(self)
+
+    def stop(self):
+        self.closed = True
+        self._task.cancel()
+
+    async def kick(self):
+        self.stop()
+        try:
+            await self.websocket.close(code=1013)
+        except Exception:
+            pass
+
+
+class FanOut:
+    '''
+    Serializes a message once and hands the frame to the outbound queue of
+    every target connection, so a slow client never holds up the others.
+    Clients exceeding the queue size or the lag budget are disconnected.
+    '''
+
+    def __init__(self):
+        self.channels: dict[WebSocket, SocketChannel] = {}
+
+        self.latencies = deque(maxlen=1000)
+        self.messages = 0
+        self.frames = 0
+        self.dropped_clients = 0
+
+    def add(self, websocket: WebSocket):
+        self.channels[websocket] = SocketChannel(
+            websocket, self.latencies, self._on_closed
+        )
+
+    def _on_closed(self, channel: SocketChannel):
+        # Frames for a failed socket would be counted as sent
+        if self.channels.get(channel.websocket) is channel:
+            del self.channels[channel.websocket]
+
+    def remove(self, websocket: WebSocket):
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.stop()
+
+    def send(self, message, websockets: Iterable[WebSocket]):
+        frame = serialize(message)
+        queued_at = perf_counter()
+        self.messages += 1
+
+        for websocket in list(websockets):
+            channel = self.channels.get(websocket)
+            if not channel or channel.closed:
+                continue
+
+            if channel.push(frame, queued_at):
+                self.frames += 1
+            else:
+                self.dropped_clients += 1
+                del self.channels[websocket]
+                asyncio.create_task(channel.kick())
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0
+            index = min(int(len(latencies) * p), len(latencies) - 1)
+            return round(latencies[index] * 1000, 3)
+
+        return {
+            'connections': len(self.channels),
+            'messages': self.messages,
+            'frames': self.frames,
+            'dropped_clients': self.dropped_clients,
+            'latency_ms_p50': percentile(0.50),
+            'latency_ms_p95': percentile(0.95),
+            'latency_ms_p99': percentile(0.99),
+        }
@@ -0,0 +1,211 @@
+import asyncio
+import secrets
+from collections import OrderedDict, deque
+
+import aiosqlite
+
+from database import read_pool
+from settings import (
+    DEFAULT_IMAGE,
+    DEFAULT_MUSIC,
+    DEFAULT_PREVIEW,
+    CHANGE_FEED_REPLAY_SIZE,
+    CHANGE_FEED_STATE_SIZE,
+)
+
+
+async def load_slot_content(slot: int, booking: int | None, db) -> list:
+    '''
+    Same items as GET /content?slot_id=&booking_id=
+    '''
+
+    cursor = await db.execute(
+        '''
+        SELECT c.booking, c.slot, r.type, f.s3_urn, l.id AS location_id, c.id AS content_id, c.order_id, f.preview, r.id AS resource_id, r.name, r.deleted
+        FROM Content c
+        JOIN Slot s ON c.slot = s.id
+        JOIN Location l ON s.location = l.id
+        JOIN Resource r ON c.resource = r.id
+        LEFT JOIN Files f ON r.file = f.id
+        WHERE c.slot = ?1 AND c.booking IS ?2
+        ORDER BY c.order_id
+        ''',
+        (slot, booking),
+    )
+    content = [dict(el) for el in await cursor.fetchall()]
+    for el in content:
+        if el['deleted']:
+            el['s3_urn'] = DEFAULT_MUSIC if el['type'] == 'music' else DEFAULT_IMAGE
+            el['preview'] = DEFAULT_PREVIEW
+
+    return content
+
+
+async def load_location_music(location: str, booking: int | None, db) -> list:
+    '''
+    Same items as GET /music?location_id=&booking_id=
+    '''
+
+    cursor = await db.execute(
+        '''
+        SELECT m.booking, r.type, f.s3_urn, m.location AS location_id, m.id AS content_id, m.order_id, r.id AS resource_id, r.name, r.deleted
+        FROM Music m
+        JOIN Resource r ON m.resource = r.id
+        LEFT JOIN Files f ON r.file = f.id
+        WHERE m.location = ?1 AND m.booking IS ?2
+        ORDER BY m.order_id
+        ''',
+        (location, booking),
+    )
+    content = [dict(el) for el in await cursor.fetchall()]
+    for el in content:
+        if el['deleted']:
+            el['s3_urn'] = DEFAULT_MUSIC if el['type'] == 'music' else DEFAULT_IMAGE
+
+    return content
+
+
+def diff_items(previous: list, current: list) -> dict:
+    previous = {item['content_id']: item for item in previous}
+    current_ids = {item['content_id'] for item in current}
+
+    added, updated, reordered = [], [], []
+    for item in current:
+        before = previous.get(item['content_id'])
+        if before is None:
+            added.append(item)
+            continue
+        if {**before, 'order_id': item['order_id']} != item:
+            updated.append(item)
+        elif before['order_id'] != item['order_id']:
+            reordered.append(
+                {'content_id': item['content_id'], 'order_id': item['order_id']}
+            )
+
+    removed = [content_id for content_id in previous if content_id not in current_ids]
+
+    return {
+        'added': added,
+        'updated': updated,
+        'removed': removed,
+        'reordered': reordered,
+    }
+
+
+class ChangeFeed:
+    '''
+    Sequenced content diffs for /ws/changed/slots.
+
+    Every 'changed-slots' hint ({slot, booking} for content, {location,
+    booking} for music) is turned into an event numbered by `seq` that
+    carries what changed in that list since the previous event for it:
+    added and updated items, removed content_ids and new order_ids. A list
+    this worker has no previous state of is sent whole as `items`.
+
+    The last `replay_size` events are kept, so a client reconnecting with
+    its last seq gets the events it missed. Otherwise, or when `epoch` (a
+    new one per process) differs, it gets a snapshot frame and reloads its
+    lists from /content and /music before applying further events.
+    '''
+
+    def __init__(self, replay_size: int, state_size: int):
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.state_size = state_size
+
+        self._events = deque(maxlen=replay_size)
+        self._state = OrderedDict()
+        self._lock = asyncio.Lock()
+
+        self.events = 0
+        self.replayed = 0
+        self.snapshots = 0
+
+    async def record(self, hints: list) -> dict:
+        '''
+        Build the event of a 'changed-slots' hint list. Events are built
+        one at a time, so their order matches the state they were diffed from.
+        '''
+
+        async with self._lock:
+            changes = []
+
+            async with read_pool.connection() as db:
+                db.row_factory = aiosqlite.Row
+                for hint in hints:
+                    if 'slot' in hint:
+                        key = ('slot', hint['slot'], hint['booking'])
+                        items = await load_slot_content(
+                            hint['slot'], hint['booking'], db
+                        )
+                    else:
+                        key = ('location', hint['location'], hint['booking'])
+                        items = await load_location_music(
+                            hint['location'], hint['booking'], db
+                        )
+
+                    previous = self._state.pop(key, None)
+                    if previous is None:
+                        changes.append({**hint, 'items': items})
+                    else:
+                        changes.append({**hint, **diff_items(previous, items)})
+
+                    self._state[key] = items
+                    while len(self._state) > self.state_size:
+                        self._state.popitem(last=False)
+
+            self.seq += 1
+            self.events += 1
+            event = {
+                'type': 'changes',
+                'seq': self.seq,
+                'epoch': self.epoch,
+                'changes': changes,
+            }
+            self._events.append(event)
+            return event
+
+    def skip(self):
+        '''
+        Nobody on this worker follows the feed: don't query, but make sure a
+        later resume across this gap gets a snapshot.
+        '''
+
+        self.seq += 1
+        self._events.clear()
+        self._state.clear()
+
+    def resume(self, since: int, epoch: str = None) -> list:
+        '''
+        Frames that bring a client from `since` up to date.
+        '''
+
+        if epoch == self.epoch and since == self.seq:
+            return []
+
+        if (
+            epoch == self.epoch
+            and self._events
+            and self._events[0]['seq'] <= since + 1
+            and since < self.seq
+        ):
+            events = [event for event in self._events if event['seq'] > since]
+            self.replayed += len(events)
+            return events
+
+        self.snapshots += 1
+        return [{'type': 'snapshot', 'seq': self.seq, 'epoch': self.epoch}]
+
+    def stats(self) -> dict:
+        return {
+            'epoch': self.epoch,
+            'seq': self.seq,
+            'buffered': len(self._events),
+            'lists': len(self._state),
+            'events': self.events,
+            'replayed': self.replayed,
+            'snapshots': self.snapshots,
+        }
+
+
+change_feed = ChangeFeed(CHANGE_FEED_REPLAY_SIZE, CHANGE_FEED_STATE_SIZE)
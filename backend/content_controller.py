@@ -1,21 +1,28 @@
+import json
 import asyncio
 from time import time
 import aiosqlite
 from typing import List, Dict
 
-from fastapi import APIRouter, Depends, WebSocket, Query, HTTPException, Response
+from fastapi import APIRouter, Depends, WebSocket, Query, HTTPException, Request, Response
 
 from tools import (
     db_connection,
     get_default_content,
     connection_manager,
     check_booking_owner,
-    broadcast_changed_slot_if_live,
+    check_limit,
+    limit_errors,
+    change_dispatcher,
     CheckRole,
+    ConditionalGet,
+    check_etag,
 )
 
-from models import GetContentResponse, GetSlotsResponse, ActiveContent
-from settings import DEFAULT_PREVIEW, DEFAULT_IMAGE, DEFAULT_MUSIC, CONTENT_LIMIT
+from live_cache import live_cache
+from ordering import ORDER_STEP, plan_order
+from models import GetContentResponse, GetSlotsResponse, ActiveContent, ContentPlacement
+from settings import DEFAULT_PREVIEW, DEFAULT_IMAGE, DEFAULT_MUSIC
 
 
 super_admin_wallet = '0x7777777777777777777777777777777777777777'
@@ -39,33 +46,110 @@ async def add_content(
     
     if booking:
         limit_data = await content_limit(booking, db)
-        if (limit_data['limit'] - limit_data['content_count']) <= 0:
-            raise HTTPException(status_code=403, detail="Content limit full")
+        check_limit(limit_data, 1, "Content limit full")
+
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Content (booking, slot, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Content WHERE booking IS ?1 AND slot = ?2))
+            ''',
+            (booking, slot, resource, ORDER_STEP),
+        )
 
     await db.execute(
         '''
-        INSERT INTO Content (booking, slot, resource, order_id)
-        VALUES (?1, ?2, ?3, (SELECT COUNT(id)+1 FROM Content WHERE booking=?1 AND slot=?2))
+        UPDATE Resource
+        SET last_used = ?1
         ''',
-        (booking, slot, resource),
+        (int(time()),),
     )
 
+    await db.commit()
+
+    change_dispatcher.notify(slot=slot, booking=booking)
+    # await connection_manager.broadcast([{'slot': slot, 'booking': booking}])
+    # await broadcast_changed_slot_if_live(slot, booking, db)
+
+
+@router.post('/contents/batch')
+async def add_contents(
+    placements: List[ContentPlacement],
+    db=Depends(db_connection),
+    user_data=Depends(CheckRole((None,))),
+):
+
+    if not placements:
+        return
+
+    bookings = {placement.booking for placement in placements}
+
+    user_address = user_data['user_address']
+    user_role = user_data['user_role']
+    if user_role == (None,):
+        for booking in bookings:
+            await check_booking_owner(booking, user_address, db)
+
+    bookings.discard(None)
+    if bookings:
+        cursor = await db.execute(
+            '''
+            SELECT id, content_limit, content_count
+            FROM Booking
+            WHERE id IN (SELECT value FROM json_each(?1))
+            ''',
+            (json.dumps(list(bookings)),),
+        )
+        limits = {row[0]: list(row[1:]) for row in await cursor.fetchall()}
+        if len(limits) < len(bookings):
+            raise HTTPException(status_code=404, detail="There is no such booking")
+
+        cursor = await db.execute(
+            '''
+            SELECT id
+            FROM Resource
+            WHERE id IN (SELECT value FROM json_each(?1)) AND type = 'image'
+            ''',
+            (json.dumps([placement.resource for placement in placements]),),
+        )
+        images = {row[0] for row in await cursor.fetchall()}
+
+        # Same rule as Content_limit_check, applied in insert order
+        for placement in placements:
+            if placement.booking is None:
+                continue
+            limit = limits[placement.booking]
+            if limit[0] is not None and limit[1] >= limit[0]:
+                raise HTTPException(status_code=403, detail="Content limit full")
+            if placement.resource in images:
+                limit[1] += 1
+
+    with limit_errors():
+        await db.executemany(
+            '''
+            INSERT INTO Content (booking, slot, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Content WHERE booking IS ?1 AND slot = ?2))
+            ''',
+            [
+                (placement.booking, placement.slot, placement.resource, ORDER_STEP)
+                for placement in placements
+            ],
+        )
+
     await db.execute(
         '''
         UPDATE Resource
         SET last_used = ?1
+        WHERE id IN (SELECT value FROM json_each(?2))
         ''',
-        (int(time()),),
+        (int(time()), json.dumps([placement.resource for placement in placements])),
     )
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'slot': slot, 'booking': booking}])
-    )
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking))
-    # await connection_manager.broadcast([{'slot': slot, 'booking': booking}])
-    # await broadcast_changed_slot_if_live(slot, booking, db)
+    # Coalesced into one broadcast by the dispatcher
+    for slot, booking in {(placement.slot, placement.booking) for placement in placements}:
+        change_dispatcher.notify(slot=slot, booking=booking)
 
 
 @router.delete('/contents')
@@ -102,10 +186,7 @@ async def remove_content(
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'slot': slot, 'booking': booking_id}])
-    )
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking_id))
+    change_dispatcher.notify(slot=slot, booking=booking_id)
     # await connection_manager.broadcast([{'slot': slot, 'booking': booking_id}])
     # if is_booking_actual(booking_id, db):
     #     await actual_booking_manager.broadcast([{'slot': slot, 'booking': booking_id}])
@@ -165,7 +246,11 @@ async def get_content(
 
 @router.get('/slots')
 async def get_slots(
-    db=Depends(db_connection), _=Depends(CheckRole(('admin', 'superadmin')))
+    _=Depends(CheckRole(('admin', 'superadmin'))),
+    etag=Depends(
+        ConditionalGet('slot', 'location', cache_control='private, no-cache')
+    ),
+    db=Depends(db_connection),
 ):
 
     cursor = await db.execute(
@@ -196,7 +281,9 @@ async def get_slots(
 
 
 @router.get('/slots/for-booking')
-async def get_bookings_slots(db=Depends(db_connection)):
+async def get_bookings_slots(
+    etag=Depends(ConditionalGet('slot', 'location')), db=Depends(db_connection)
+):
     cursor = await db.execute(
         '''
         SELECT s.id, s.location, l.type, s.name, l.preview, l.scene, s.supports_streaming, l.for_booking, s.format, s.trigger
@@ -226,8 +313,8 @@ async def get_bookings_slots(db=Depends(db_connection)):
 
 
 @router.websocket('/ws/changed/slots')
-async def changed_slots(websocket: WebSocket):
-    await connection_manager.connect(websocket)
+async def changed_slots(websocket: WebSocket, since: int = None, epoch: str = None):
+    await connection_manager.connect(websocket, since, epoch)
     try:
         while True:
             await websocket.receive_json()
@@ -242,122 +329,141 @@ async def update_content_order(
     new_order: dict, db=Depends(db_connection), user_data=Depends(CheckRole((None,)))
 ):
 
-    slots = []
-
-    for content_id, order_id in new_order.items():
+    new_order = {int(content_id): order_id for content_id, order_id in new_order.items()}
 
-        cursor = await db.execute(
-            '''
-            SELECT booking, slot
+    # Every item of the playlists the payload touches, in their current order
+    cursor = await db.execute(
+        '''
+        SELECT c.id, c.order_id, c.booking, c.slot
+        FROM Content c
+        JOIN (
+            SELECT DISTINCT booking, slot
             FROM Content
-            WHERE id = ?1
-            ''',
-            (content_id,),
-        )
-        cursor = await cursor.fetchone()
-        booking_id, slot = cursor[0:2]
-        slots.append({'slot': slot, 'booking': booking_id})
+            WHERE id IN (SELECT value FROM json_each(?1))
+        ) p ON c.booking IS p.booking AND c.slot = p.slot
+        ORDER BY c.booking, c.slot, c.order_id, c.id
+        ''',
+        (json.dumps(list(new_order)),),
+    )
+    playlists = {}
+    for content_id, order_id, booking_id, slot in await cursor.fetchall():
+        playlists.setdefault((booking_id, slot), []).append((content_id, order_id))
 
-        user_address = user_data['user_address']
-        user_role = user_data['user_role']
-        if user_role == (None,):
+    found = {content_id for items in playlists.values() for content_id, _ in items}
+    if not found.issuperset(new_order):
+        raise HTTPException(status_code=404, detail="There is no such content")
+
+    user_address = user_data['user_address']
+    user_role = user_data['user_role']
+    if user_role == (None,):
+        for booking_id in {booking_id for booking_id, _ in playlists}:
             await check_booking_owner(booking_id, user_address, db)
 
-        await db.execute(
+    updates = [
+        update
+        for items in playlists.values()
+        for update in plan_order(items, new_order)
+    ]
+    if updates:
+        await db.executemany(
             '''
             UPDATE Content
-            SET order_id = ?2
-            WHERE id = ?1
+            SET order_id = ?1
+            WHERE id = ?2
             ''',
-            (content_id, order_id),
+            updates,
         )
+        await db.commit()
 
-    await db.commit()
-
-    slots_tuples = set([tuple(d.items()) for d in slots])
-    unique_dicts = [dict(t) for t in slots_tuples]
-
-    asyncio.create_task(connection_manager.broadcast(unique_dicts))
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking_id))
-    # await connection_manager.broadcast(list(set(unique_dicts)))
+    for booking_id, slot in playlists:
+        change_dispatcher.notify(slot=slot, booking=booking_id)
 
 
 @router.get('/contents/live', response_model=Dict[str, List[ActiveContent | Dict]])
 async def get_active_content(
-    locations: List[str] = Query(...), db=Depends(db_connection)
+    request: Request,
+    response: Response,
+    locations: List[str] = Query(...),
 ):
 
-    db.row_factory = aiosqlite.Row
-
-    locations_placeholders = ','.join('?' for _ in locations)
-    first_query = f'''
-        SELECT id, location
-        FROM Booking
-        WHERE location IN ({locations_placeholders}) AND is_live = 1
-    '''
-
-    cursor = await db.execute(first_query, locations)
-    bookings = await cursor.fetchall()
-    actual_bookings = [booking['id'] for booking in bookings]
-    actual_locations = [booking['location'] for booking in bookings]
+    return await live_cache.get(
+        'contents',
+        locations,
+        load_active_content,
+        lambda etag: check_etag(request, response, etag),
+    )
 
-    if not actual_bookings:
-        bookings_condition = "IS NULL"
-    else:
-        bookings_placeholders = ','.join('?' for _ in actual_bookings)
-        bookings_condition = f"IN ({bookings_placeholders})"
 
-    if not actual_locations:
-        locations_condition = "IS NULL"
-    else:
-        locations_placeholders = ','.join('?' for _ in actual_locations)
-        locations_condition = f"IN ({locations_placeholders})"
+async def load_active_content(locations: List[str], db):
 
-    combined_parameters = actual_bookings + actual_locations
+    db.row_factory = aiosqlite.Row
 
-    query = f'''
+    # Content of the live bookings of the requested locations, and default
+    # content of those without a live booking, in one pass
+    cursor = await db.execute(
+        '''
+        WITH requested AS (
+            SELECT value AS location FROM json_each(?1)
+        ),
+        live AS (
+            SELECT id, location
+            FROM Booking
+            WHERE location IN requested AND is_live = 1
+        )
         SELECT c.id, c.slot, r.type, f.s3_urn, c.order_id, f.preview, c.booking, s.location, r.deleted
         FROM Content c
         JOIN Slot s ON c.slot = s.id
         JOIN Location l ON s.location = l.id
         JOIN Resource r ON c.resource = r.id
         LEFT JOIN Files f ON r.file = f.id
-        JOIN Booking b ON c.booking = b.id
-        WHERE c.booking {bookings_condition} AND s.location {locations_condition}
-        ORDER BY c.order_id
-    '''
-
-    cursor = await db.execute(query, combined_parameters)
+        WHERE (
+            c.booking IN (SELECT id FROM live)
+            AND s.location IN (SELECT location FROM live)
+        ) OR (
+            c.booking IS NULL
+            AND s.location IN requested
+            AND s.location NOT IN (SELECT location FROM live)
+        )
+        ORDER BY c.order_id, c.booking, c.slot, c.id
+        ''',
+        (json.dumps(locations),),
+    )
     content = await cursor.fetchall()
-    content = [dict(el) for el in content]
-    for el in content:
-        if el['deleted']:
-            el['s3_urn'] = DEFAULT_MUSIC if el['type'] == 'music' else DEFAULT_IMAGE
-            el['preview'] = DEFAULT_PREVIEW
 
     location_dict = {}
+    default_content = {}
+
+    for el in content:
+        item = dict(el)
+        if item['deleted']:
+            item['s3_urn'] = DEFAULT_MUSIC if item['type'] == 'music' else DEFAULT_IMAGE
+            item['preview'] = DEFAULT_PREVIEW
 
-    for item in content:
-        location = item.pop('location')
-        if location not in location_dict:
-            location_dict[location] = []
-        location_dict[location].append(item)
+        if item['booking'] is not None:
+            location_dict.setdefault(item.pop('location'), []).append(item)
+        else:
+            default_content.setdefault(item['location'], []).append(item)
 
+    # A location with nothing to show gets [{}]
     for location in locations:
         if not location_dict.get(location):
-            if location not in [booking['location'] for booking in bookings]:
-                default_contents = await get_default_content(location, db)
-            else:
-                default_contents = [{}]
-            if not location_dict.get(location):
-                location_dict[location] = []
-            location_dict[location] = location_dict[location] + default_contents
+            location_dict[location] = default_content.get(location) or [{}]
 
     return location_dict
 
 
 @router.get('/contents/slot/live', response_model=Dict[str, List[ActiveContent | Dict]])
-async def get_active_slot_content(slot_id: str, db=Depends(db_connection)):
+async def get_active_slot_content(request: Request, response: Response, slot_id: str):
+
+    return await live_cache.get(
+        'slot',
+        [slot_id],
+        lambda slots, db: load_active_slot_content(slots[0], db),
+        lambda etag: check_etag(request, response, etag),
+    )
+
+
+async def load_active_slot_content(slot_id: str, db):
     db.row_factory = aiosqlite.Row
 
     cursor = await db.execute(
@@ -436,31 +542,14 @@ async def content_limit(
 
     cursor = await db.execute(
         '''
-    SELECT duration
+    SELECT content_limit, content_count
     FROM Booking
     WHERE id = ?1
     ''',
         (booking_id,),
     )
-    booking_duration = await cursor.fetchone()
-    if not booking_duration:
+    booking = await cursor.fetchone()
+    if not booking:
         raise HTTPException(status_code=404, detail="There is no such booking")
-    booking_duration = booking_duration[0]
-
-    duration_minutes = booking_duration / 60000
-    limit = (duration_minutes / 30) * CONTENT_LIMIT
-    limit = int(round(limit, 2))
-
-    cursor = await db.execute(
-        '''
-    SELECT COUNT(*)
-    FROM Content c
-    JOIN Resource r ON c.resource = r.id
-    WHERE c.booking = ?1 AND r.type = "image"
-    ''',
-        (booking_id,),
-    )
-    content_count = await cursor.fetchone()
-    content_count = content_count[0]
 
-    return {"limit": limit, "content_count": content_count}
+    return {"limit": booking[0], "content_count": booking[1]}
@@ -0,0 +1,352 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from time import perf_counter
+
+import aiosqlite
+
+from settings import (
+    DATABASE_PATH,
+    DB_READ_POOL_SIZE,
+    DB_WRITE_POOL_SIZE,
+    DB_MMAP_SIZE,
+    DB_CACHE_SIZE,
+    DB_WRITE_BATCH_SIZE,
+)
+
+
+async def connect(**kwargs):
+    db = await aiosqlite.connect(DATABASE_PATH, timeout=30, **kwargs)
+    await db.execute('PRAGMA synchronous = NORMAL')
+    await db.execute(f'PRAGMA mmap_size = {int(DB_MMAP_SIZE)}')
+    await db.execute(f'PRAGMA cache_size = {int(DB_CACHE_SIZE)}')
+    return db
+
+
+async def bootstrap_database():
+    '''
+    Switch the database to WAL so readers never wait on the writer.
+    The journal mode is persistent, so this only has to succeed once.
+    '''
+
+    async with aiosqlite.connect(DATABASE_PATH, timeout=30) as db:
+        cursor = await db.execute('PRAGMA journal_mode = WAL')
+        journal_mode = await cursor.fetchone()
+        print(f"SQLite journal mode: {journal_mode[0]}")
+
+
+class ConnectionPool:
+    '''
+    Bounded pool of long-lived aiosqlite connections.
+
+    Connections are opened lazily up to `size` and handed out in LIFO order,
+    so a quiet service keeps a single warm connection.
+    '''
+
+    def __init__(self, name: str, size: int, read_only: bool = False):
+        self.name = name
+        self.size = size
+        self.read_only = read_only
+
+        self._idle = asyncio.LifoQueue()
+        self._opened = 0
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    async def _open(self):
+        db = await connect()
+        if self.read_only:
+            await db.execute('PRAGMA query_only = 1')
+        return db
+
+    async def acquire(self):
+        started_at = perf_counter()
+
+        try:
+            db = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            if self._opened < self.size:
+                db = None
+            else:
+                self.waits += 1
+                db = await self._idle.get()
+
+        # None is room for a new connection, left by a dropped one
+        if db is None:
+            self._opened += 1
+            try:
+                db = await self._open()
+            except Exception:
+                self._opened -= 1
+                # Pass the room on to anyone who started waiting meanwhile
+                if self._idle.empty():
+                    self._idle.put_nowait(None)
+                raise
+
+        wait_time = perf_counter() - started_at
+        self.checkouts += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+        return db
+
+    async def release(self, db):
+        try:
+            if db.in_transaction:
+                await db.rollback()
+        except Exception:
+            self._opened -= 1
+            # A coroutine waiting for a connection opens one in its place
+            if self._idle.empty():
+                self._idle.put_nowait(None)
+            try:
+                await db.close()
+            except Exception as e:
+                print(f"Closing {self.name} connection failed: {e}")
+            return
+
+        db.row_factory = None
+        self._idle.put_nowait(db)
+
+    @asynccontextmanager
+    async def connection(self):
+        db = await self.acquire()
+        try:
+            yield db
+        finally:
+            await self.release(db)
+
+    async def close(self):
+        while not self._idle.empty():
+            db = self._idle.get_nowait()
+            if db is None:
+                continue
+            self._opened -= 1
+            await db.close()
+
+    def stats(self) -> dict:
+        return {
+            'size': self.size,
+            'opened': self._opened,
+            'in_use': self._opened - self._idle.qsize(),
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'wait_ms_avg': (
+                round(self.wait_time_total / self.checkouts * 1000, 3)
+                if self.checkouts
+                else 0
+            ),
+            'wait_ms_max': round(self.wait_time_max * 1000, 3),
+        }
+
+
+class WriteQueue:
+    '''
+    Single serialized writer.
+
+    Jobs queued from any coroutine are applied by one task over its own
+    connection; everything queued while the previous transaction was
+    committing goes into the next one, so many small writes share a commit.
+    Each job runs inside its own savepoint, so a failing job is rolled back
+    without affecting the rest of the group.
+    '''
+
+    def __init__(self, max_batch: int):
+        self.max_batch = max_batch
+
+        self._queue = asyncio.Queue()
+        self._task = None
+
+        self.transactions = 0
+        self.jobs = 0
+        self.failed_jobs = 0
+        self.largest_batch = 0
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    async def execute(self, sql: str, parameters=()) -> list:
+        '''
+        Queue a single statement and wait for its commit.
+        Returns the rows produced by the statement (e.g. by RETURNING).
+        '''
+
+        results = await self.submit([(sql, parameters)])
+        return results[0]
+
+    async def executemany(self, sql: str, seq_of_parameters) -> None:
+        await self.submit([(sql, list(seq_of_parameters), True)])
+
+    async def submit(self, statements: list) -> list:
+        '''
+        Queue statements that must be committed atomically.
+        Each statement is `(sql, parameters)` or `(sql, seq_of_parameters, True)`
+        for executemany.
+        '''
+
+        if not self._task or self._task.done():
+            raise RuntimeError('Write queue is not running')
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((statements, future))
+        return await future
+
+    async def _run(self):
+        db = None
+        stopping = False
+
+        try:
+            while not stopping:
+                batch = [await self._queue.get()]
+                while len(batch) < self.max_batch and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                if None in batch:
+                    stopping = True
+                    batch = [job for job in batch if job is not None]
+
+                if not batch:
+                    continue
+
+                try:
+                    if db is None:
+                        db = await connect(isolation_level=None)
+                    await self._apply(db, batch)
+                except Exception as e:
+                    # The transaction is in an unknown state: fail what is
+                    # left of the group and go on over a new connection
+                    print(f"Write queue transaction failed: {e}")
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    if db is not None:
+                        try:
+                            await db.close()
+                        except Exception as e:
+                            print(f"Write queue connection close failed: {e}")
+                        db = None
+        finally:
+            if db is not None:
+                await db.close()
+
+    async def _apply(self, db, batch: list):
+        done = []
+
+        try:
+            await db.execute('BEGIN IMMEDIATE')
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for statements, future in batch:
+            await db.execute('SAVEPOINT job')
+            try:
+                results = []
+                for sql, parameters, *many in statements:
+                    if many and many[0]:
+                        await db.executemany(sql, parameters)
+                        results.append([])
+                    else:
+                        cursor = await db.execute(sql, parameters)
+                        results.append(await cursor.fetchall())
+                        await cursor.close()
+                await db.execute('RELEASE job')
+                done.append((future, results))
+            except Exception as e:
+                await db.execute('ROLLBACK TO job')
+                await db.execute('RELEASE job')
+                self.failed_jobs += 1
+                if not future.done():
+                    future.set_exception(e)
+
+        try:
+            await db.execute('COMMIT')
+        except Exception as e:
+            await db.execute('ROLLBACK')
+            for future, _ in done:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.transactions += 1
+        self.jobs += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        for future, results in done:
+            if not future.done():
+                future.set_result(results)
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'transactions': self.transactions,
+            'jobs': self.jobs,
+            'failed_jobs': self.failed_jobs,
+            'largest_batch': self.largest_batch,
+        }
+
+
+read_pool = ConnectionPool('read', DB_READ_POOL_SIZE, read_only=True)
+write_pool = ConnectionPool('write', DB_WRITE_POOL_SIZE)
+write_queue = WriteQueue(DB_WRITE_BATCH_SIZE)
+
+
+class TableVersions:
+    '''
+    Change counters of the database tables, read from TableVersion.
+
+    Triggers bump the counter of a table in the transaction of every write
+    to it, so all workers read the same counters, and writes made by other
+    triggers or outside the service move them too.
+    '''
+
+    def __init__(self):
+        self.reads = 0
+
+    async def version(self, tables: list) -> str:
+        async with read_pool.connection() as db:
+            cursor = await db.execute(
+                '''
+                SELECT name, version
+                FROM TableVersion
+                WHERE name IN (SELECT value FROM json_each(?1))
+                ''',
+                (json.dumps(tables),),
+            )
+            versions = dict(await cursor.fetchall())
+
+        self.reads += 1
+        return '.'.join(str(versions.get(table, 0)) for table in tables)
+
+    def stats(self) -> dict:
+        return {'reads': self.reads}
+
+
+table_versions = TableVersions()
+
+
+async def close_pools():
+    await write_queue.close()
+    await read_pool.close()
+    await write_pool.close()
+
+
+def database_stats() -> dict:
+    return {
+        'read_pool': read_pool.stats(),
+        'write_pool': write_pool.stats(),
+        'write_queue': write_queue.stats(),
+        'table_versions': table_versions.stats(),
+    }
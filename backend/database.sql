@@ -22,7 +22,13 @@ CREATE TABLE Booking (
     description VARCHAR(1000),
     preview VARCHAR(300),
     is_live BOOLEAN DEFAULT 0,
-    location VARCHAR(50) REFERENCES Location(id)
+    location VARCHAR(50) REFERENCES Location(id),
+    end_date INTEGER,
+    updated_at INTEGER,
+    content_count INTEGER NOT NULL DEFAULT 0,
+    music_count INTEGER NOT NULL DEFAULT 0,
+    content_limit INTEGER,
+    music_limit INTEGER
 );
 
 CREATE TABLE Slot (
@@ -95,3 +101,429 @@ CREATE TABLE Music (
     location VARCHAR(50) REFERENCES Location(id),
     resource INTEGER REFERENCES Resource(id)
 );
+
+CREATE INDEX Booking_location_end_date ON Booking (location, end_date);
+CREATE INDEX Booking_location_start_date ON Booking (location, start_date);
+CREATE INDEX Booking_owner_location_end_date ON Booking (owner, location, end_date);
+CREATE INDEX Booking_end_date ON Booking (end_date);
+CREATE INDEX Booking_live ON Booking (location, start_date) WHERE is_live = 1;
+CREATE INDEX Booking_is_live_start_date ON Booking (is_live, start_date) WHERE is_live = 1;
+CREATE INDEX Booking_updated_at ON Booking (updated_at, id);
+CREATE INDEX Slot_location ON Slot (location);
+CREATE INDEX Location_scene ON Location (scene);
+CREATE INDEX Content_booking_slot_order_id ON Content (booking, slot, order_id, resource);
+CREATE INDEX Content_resource ON Content (resource);
+CREATE INDEX Music_booking_location_order_id ON Music (booking, location, order_id, resource);
+CREATE INDEX Music_resource ON Music (resource);
+CREATE INDEX Resource_file ON Resource (file);
+CREATE INDEX Files_user ON Files (user);
+CREATE INDEX Files_s3_urn ON Files (s3_urn);
+CREATE INDEX Discord_guild_channel_added_at ON Discord (guild, channel, added_at);
+CREATE INDEX DiscordScreen_guild_channel ON DiscordScreen (guild, channel);
+
+-- Booking changes waiting to be sent to Meilisearch, written by the
+-- triggers below in the same transaction as the change itself
+CREATE TABLE SearchOutbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    booking INTEGER NOT NULL,
+    created_at INTEGER NOT NULL
+);
+
+CREATE TRIGGER Booking_search_insert AFTER INSERT ON Booking
+BEGIN
+    UPDATE Booking
+    SET updated_at = CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)
+    WHERE id = NEW.id;
+    INSERT INTO SearchOutbox (booking, created_at)
+    VALUES (NEW.id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+-- updated_at only moves forward, so its own nested update never matches.
+-- The counters and limits below are not indexed and don't count as changes
+CREATE TRIGGER Booking_search_update AFTER UPDATE OF
+    owner, title, creation_date, start_date, duration, event_date,
+    description, preview, is_live, location, end_date
+ON Booking
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE Booking
+    SET updated_at = MAX(
+        CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER),
+        IFNULL(OLD.updated_at, 0) + 1
+    )
+    WHERE id = NEW.id;
+    INSERT INTO SearchOutbox (booking, created_at)
+    VALUES (NEW.id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+CREATE TRIGGER Booking_search_delete AFTER DELETE ON Booking
+BEGIN
+    INSERT INTO SearchOutbox (booking, created_at)
+    VALUES (OLD.id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+END;
+
+-- Content and music limits per 30 minutes of booking, written from the
+-- config at startup
+CREATE TABLE BookingLimit (
+    name VARCHAR(50) PRIMARY KEY,
+    per_half_hour INTEGER
+);
+
+CREATE TRIGGER Booking_limits_insert AFTER INSERT ON Booking
+BEGIN
+    UPDATE Booking
+    SET content_limit = (
+            SELECT CAST(ROUND(NEW.duration / 60000.0 / 30 * per_half_hour, 2) AS INTEGER)
+            FROM BookingLimit WHERE name = 'content'
+        ),
+        music_limit = (
+            SELECT CAST(ROUND(NEW.duration / 60000.0 / 30 * per_half_hour, 2) AS INTEGER)
+            FROM BookingLimit WHERE name = 'music'
+        )
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER Booking_limits_update AFTER UPDATE OF duration ON Booking
+WHEN NEW.duration IS NOT OLD.duration
+BEGIN
+    UPDATE Booking
+    SET content_limit = (
+            SELECT CAST(ROUND(NEW.duration / 60000.0 / 30 * per_half_hour, 2) AS INTEGER)
+            FROM BookingLimit WHERE name = 'content'
+        ),
+        music_limit = (
+            SELECT CAST(ROUND(NEW.duration / 60000.0 / 30 * per_half_hour, 2) AS INTEGER)
+            FROM BookingLimit WHERE name = 'music'
+        )
+    WHERE id = NEW.id;
+END;
+
+-- The check and the counter run in the inserting transaction, so
+-- concurrent uploads can't both take the last place. A NULL limit (no
+-- BookingLimit value) does not limit
+CREATE TRIGGER Content_limit_check BEFORE INSERT ON Content
+WHEN NEW.booking IS NOT NULL
+BEGIN
+    SELECT RAISE(ABORT, 'Content limit full')
+    FROM Booking
+    WHERE id = NEW.booking
+    AND content_limit IS NOT NULL AND content_count >= content_limit;
+END;
+
+-- Moving content to another booking takes a place there too
+CREATE TRIGGER Content_limit_check_update BEFORE UPDATE OF booking ON Content
+WHEN NEW.booking IS NOT NULL AND NEW.booking IS NOT OLD.booking
+BEGIN
+    SELECT RAISE(ABORT, 'Content limit full')
+    FROM Booking
+    WHERE id = NEW.booking
+    AND content_limit IS NOT NULL AND content_count >= content_limit;
+END;
+
+-- Only images count towards the content limit
+CREATE TRIGGER Content_count_insert AFTER INSERT ON Content
+WHEN NEW.booking IS NOT NULL
+AND (SELECT type FROM Resource WHERE id = NEW.resource) = 'image'
+BEGIN
+    UPDATE Booking SET content_count = content_count + 1 WHERE id = NEW.booking;
+END;
+
+CREATE TRIGGER Content_count_delete AFTER DELETE ON Content
+WHEN OLD.booking IS NOT NULL
+AND (SELECT type FROM Resource WHERE id = OLD.resource) = 'image'
+BEGIN
+    UPDATE Booking SET content_count = content_count - 1 WHERE id = OLD.booking;
+END;
+
+CREATE TRIGGER Content_count_update AFTER UPDATE OF booking, resource ON Content
+BEGIN
+    UPDATE Booking SET content_count = content_count - 1
+    WHERE id = OLD.booking
+    AND (SELECT type FROM Resource WHERE id = OLD.resource) = 'image';
+    UPDATE Booking SET content_count = content_count + 1
+    WHERE id = NEW.booking
+    AND (SELECT type FROM Resource WHERE id = NEW.resource) = 'image';
+END;
+
+CREATE TRIGGER Music_limit_check BEFORE INSERT ON Music
+WHEN NEW.booking IS NOT NULL
+BEGIN
+    SELECT RAISE(ABORT, 'Music content limit full')
+    FROM Booking
+    WHERE id = NEW.booking
+    AND music_limit IS NOT NULL AND music_count >= music_limit;
+END;
+
+CREATE TRIGGER Music_limit_check_update BEFORE UPDATE OF booking ON Music
+WHEN NEW.booking IS NOT NULL AND NEW.booking IS NOT OLD.booking
+BEGIN
+    SELECT RAISE(ABORT, 'Music content limit full')
+    FROM Booking
+    WHERE id = NEW.booking
+    AND music_limit IS NOT NULL AND music_count >= music_limit;
+END;
+
+CREATE TRIGGER Music_count_insert AFTER INSERT ON Music
+WHEN NEW.booking IS NOT NULL
+BEGIN
+    UPDATE Booking SET music_count = music_count + 1 WHERE id = NEW.booking;
+END;
+
+CREATE TRIGGER Music_count_delete AFTER DELETE ON Music
+WHEN OLD.booking IS NOT NULL
+BEGIN
+    UPDATE Booking SET music_count = music_count - 1 WHERE id = OLD.booking;
+END;
+
+CREATE TRIGGER Music_count_update AFTER UPDATE OF booking ON Music
+BEGIN
+    UPDATE Booking SET music_count = music_count - 1 WHERE id = OLD.booking;
+    UPDATE Booking SET music_count = music_count + 1 WHERE id = NEW.booking;
+END;
+
+-- High-water marks of the incremental search reindex
+CREATE TABLE SearchIndexState (
+    name VARCHAR(50) PRIMARY KEY,
+    high_water_mark INTEGER
+);
+
+-- Delegate/revoke streaming rights requests to the worlds content server
+CREATE TABLE StreamingRightsJob (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    world VARCHAR(150) NOT NULL,
+    address VARCHAR(150) NOT NULL,
+    method VARCHAR(10) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at INTEGER NOT NULL,
+    locked_until INTEGER,
+    last_error VARCHAR(1000),
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+
+CREATE INDEX StreamingRightsJob_status_next_attempt_at ON StreamingRightsJob (status, next_attempt_at);
+CREATE INDEX StreamingRightsJob_world_address_status ON StreamingRightsJob (world, address, status);
+
+-- Version of what each location plays live, bumped by the triggers below
+-- in the writing transaction; live_cache entries and the ETags of the live
+-- endpoints are checked against it
+CREATE TABLE LiveVersion (
+    location VARCHAR(50) NOT NULL PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TRIGGER Content_live_insert AFTER INSERT ON Content
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT location, 1 FROM Slot WHERE id = NEW.slot AND location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Content_live_update AFTER UPDATE ON Content
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT DISTINCT location, 1 FROM Slot
+    WHERE id IN (OLD.slot, NEW.slot) AND location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Content_live_delete AFTER DELETE ON Content
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT location, 1 FROM Slot WHERE id = OLD.slot AND location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Music_live_insert AFTER INSERT ON Music
+WHEN NEW.location IS NOT NULL
+BEGIN
+    INSERT INTO LiveVersion (location, version) VALUES (NEW.location, 1)
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Music_live_update AFTER UPDATE ON Music
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT DISTINCT value, 1 FROM json_each(json_array(OLD.location, NEW.location))
+    WHERE value IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Music_live_delete AFTER DELETE ON Music
+WHEN OLD.location IS NOT NULL
+BEGIN
+    INSERT INTO LiveVersion (location, version) VALUES (OLD.location, 1)
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+-- Only bookings going live, ending or moving while live change what plays
+CREATE TRIGGER Booking_live_insert AFTER INSERT ON Booking
+WHEN NEW.is_live AND NEW.location IS NOT NULL
+BEGIN
+    INSERT INTO LiveVersion (location, version) VALUES (NEW.location, 1)
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Booking_live_update AFTER UPDATE OF is_live, location ON Booking
+WHEN (OLD.is_live OR NEW.is_live)
+AND (OLD.is_live IS NOT NEW.is_live OR OLD.location IS NOT NEW.location)
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT DISTINCT value, 1 FROM json_each(json_array(OLD.location, NEW.location))
+    WHERE value IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Booking_live_delete AFTER DELETE ON Booking
+WHEN OLD.is_live AND OLD.location IS NOT NULL
+BEGIN
+    INSERT INTO LiveVersion (location, version) VALUES (OLD.location, 1)
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Slot_live_update AFTER UPDATE OF id, location ON Slot
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT DISTINCT value, 1 FROM json_each(json_array(OLD.location, NEW.location))
+    WHERE value IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Slot_live_delete AFTER DELETE ON Slot
+WHEN OLD.location IS NOT NULL
+BEGIN
+    INSERT INTO LiveVersion (location, version) VALUES (OLD.location, 1)
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Location_live_update AFTER UPDATE OF id ON Location
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT DISTINCT value, 1 FROM json_each(json_array(OLD.id, NEW.id))
+    WHERE value IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Location_live_delete AFTER DELETE ON Location
+BEGIN
+    INSERT INTO LiveVersion (location, version) VALUES (OLD.id, 1)
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+-- A resource or file shown in several places bumps each of their locations
+CREATE TRIGGER Resource_live_update AFTER UPDATE OF id, name, deleted, file, type ON Resource
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT location, 1 FROM (
+        SELECT s.location FROM Content c JOIN Slot s ON s.id = c.slot
+        WHERE c.resource IN (OLD.id, NEW.id)
+        UNION SELECT location FROM Music WHERE resource IN (OLD.id, NEW.id)
+    )
+    WHERE location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Resource_live_delete AFTER DELETE ON Resource
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT location, 1 FROM (
+        SELECT s.location FROM Content c JOIN Slot s ON s.id = c.slot
+        WHERE c.resource = OLD.id
+        UNION SELECT location FROM Music WHERE resource = OLD.id
+    )
+    WHERE location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Files_live_update AFTER UPDATE OF id, s3_urn, preview ON Files
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT location, 1 FROM (
+        SELECT s.location FROM Resource r
+        JOIN Content c ON c.resource = r.id
+        JOIN Slot s ON s.id = c.slot
+        WHERE r.file IN (OLD.id, NEW.id)
+        UNION SELECT m.location FROM Resource r
+        JOIN Music m ON m.resource = r.id
+        WHERE r.file IN (OLD.id, NEW.id)
+    )
+    WHERE location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER Files_live_delete AFTER DELETE ON Files
+BEGIN
+    INSERT INTO LiveVersion (location, version)
+    SELECT location, 1 FROM (
+        SELECT s.location FROM Resource r
+        JOIN Content c ON c.resource = r.id
+        JOIN Slot s ON s.id = c.slot
+        WHERE r.file = OLD.id
+        UNION SELECT m.location FROM Resource r
+        JOIN Music m ON m.resource = r.id
+        WHERE r.file = OLD.id
+    )
+    WHERE location IS NOT NULL
+    ON CONFLICT (location) DO UPDATE SET version = version + 1;
+END;
+
+-- Change counter of the tables behind the conditional GET endpoints, bumped
+-- by the triggers below in the writing transaction; the ETags are made from it
+CREATE TABLE TableVersion (
+    name VARCHAR(50) NOT NULL PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT INTO TableVersion (name, version) VALUES ('slot', 0), ('location', 0), ('discordscreen', 0);
+
+CREATE TRIGGER Slot_version_insert AFTER INSERT ON Slot
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'slot';
+END;
+
+CREATE TRIGGER Slot_version_update AFTER UPDATE ON Slot
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'slot';
+END;
+
+CREATE TRIGGER Slot_version_delete AFTER DELETE ON Slot
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'slot';
+END;
+
+CREATE TRIGGER Location_version_insert AFTER INSERT ON Location
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'location';
+END;
+
+CREATE TRIGGER Location_version_update AFTER UPDATE ON Location
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'location';
+END;
+
+CREATE TRIGGER Location_version_delete AFTER DELETE ON Location
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'location';
+END;
+
+CREATE TRIGGER DiscordScreen_version_insert AFTER INSERT ON DiscordScreen
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'discordscreen';
+END;
+
+CREATE TRIGGER DiscordScreen_version_update AFTER UPDATE ON DiscordScreen
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'discordscreen';
+END;
+
+CREATE TRIGGER DiscordScreen_version_delete AFTER DELETE ON DiscordScreen
+BEGIN
+    UPDATE TableVersion SET version = version + 1 WHERE name = 'discordscreen';
+END;
+
+-- Object keys referenced by the database, filled by DELETE /sync/s3 for the
+-- length of a run so the S3 listings can be diffed against it page by page
+CREATE TABLE S3GcUrn (
+    urn TEXT NOT NULL PRIMARY KEY
+) WITHOUT ROWID;
@@ -1,11 +1,25 @@
 import json
 import asyncio
 import httpx
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from web3 import Web3
+from eth_account import Account
 from eth_account.messages import encode_defunct
 
-from settings import OWNER_ADDRESS, EPHEMERAL_PRIVATE_KEY, SIGNATURE, EXPIRATION
+from settings import (
+    OWNER_ADDRESS,
+    EPHEMERAL_PRIVATE_KEY,
+    SIGNATURE,
+    EXPIRATION,
+    STREAMING_RIGHTS_WORKERS,
+    STREAMING_RIGHTS_MAX_ATTEMPTS,
+    STREAMING_RIGHTS_RETRY_BASE,
+    STREAMING_RIGHTS_RETRY_MAX,
+    STREAMING_RIGHTS_LEASE,
+    STREAMING_RIGHTS_HEADER_TTL,
+)
+from database import read_pool, write_queue
 
 try:
     EPHEMERAL_ADDRESS = Web3().eth.account.from_key(EPHEMERAL_PRIVATE_KEY).address
@@ -27,7 +41,7 @@ async def delegate_streaming_rights(world_name: str, address: str):
 
     address = address.lower()
 
-    await _update_streaming_rights('put', world_name, address)
+    return await streaming_rights_queue.enqueue('put', world_name, address)
 
 
 async def revoke_streaming_rights(world_name: str, address: str):
@@ -41,37 +55,303 @@ async def revoke_streaming_rights(world_name: str, address: str):
 
     address = address.lower()
 
-    await _update_streaming_rights('delete', world_name, address)
+    return await streaming_rights_queue.enqueue('delete', world_name, address)
 
 
-async def _update_streaming_rights(method: str, world_name: str, address: str):
-    permission = 'streaming'
-    auth_chain, timestamp = _generate_auth_chain(
-        method, f'/world/{world_name}/permissions/{permission}/{address}'
-    )
-    headers = _generate_signed_fetch_headers(auth_chain, timestamp)
-    url = f'{CONTENT_SERVER_URL}/world/{world_name}/permissions/{permission}/{address}'
+class RetryableError(Exception):
+    pass
 
-    counter = 1
-    while True:
-        print(f"{method} {permission} rights attempt {counter}")
 
-        response = httpx.request(method, url, headers=headers)
+class StreamingRightsQueue:
+    '''
+    Durable queue of streaming permission changes.
+
+    Jobs live in the StreamingRightsJob table, so they survive restarts.
+    A pending job for a world/address is replaced by a newer opposite
+    operation (the latest intent wins) and a repeated one is merged into it.
+    Workers claim jobs with a lease in a single UPDATE, only the oldest
+    active job of a world/address being claimable, so several processes can
+    share the table and the changes of one world/address run in order.
+    Server errors are retried with exponential backoff up to max_attempts.
+    '''
+
+    def __init__(
+        self,
+        workers: int,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float,
+        lease: float,
+    ):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = lease
+
+        self._wakeup = asyncio.Event()
+        self._client = None
+
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.superseded = 0
+
+    async def enqueue(self, method: str, world_name: str, address: str) -> int:
+        now = _now_ms()
+
+        results = await write_queue.submit(
+            [
+                (
+                    '''
+                    UPDATE StreamingRightsJob
+                    SET status = 'superseded', updated_at = ?4
+                    WHERE world = ?1 AND address = ?2 AND method != ?3
+                    AND status = 'pending'
+                    RETURNING id
+                    ''',
+                    (world_name, address, method, now),
+                ),
+                (
+                    '''
+                    INSERT INTO StreamingRightsJob (
+                        world, address, method, status, attempts,
+                        next_attempt_at, created_at, updated_at
+                    )
+                    SELECT ?1, ?2, ?3, 'pending', 0, ?4, ?4, ?4
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM StreamingRightsJob
+                        WHERE world = ?1 AND address = ?2 AND method = ?3
+                        AND status = 'pending'
+                    )
+                    RETURNING id
+                    ''',
+                    (world_name, address, method, now),
+                ),
+            ]
+        )
+        self.superseded += len(results[0])
+        self._wakeup.set()
+
+        if results[1]:
+            return results[1][0][0]
+
+        async with read_pool.connection() as db:
+            cursor = await db.execute(
+                '''
+                SELECT id FROM StreamingRightsJob
+                WHERE world = ?1 AND address = ?2 AND method = ?3
+                AND status = 'pending'
+                ''',
+                (world_name, address, method),
+            )
+            job = await cursor.fetchone()
+
+        return job[0] if job else None
+
+    async def _claim(self, limit: int) -> list:
+        now = _now_ms()
+
+        return await write_queue.execute(
+            '''
+            UPDATE StreamingRightsJob
+            SET status = 'running', attempts = attempts + 1,
+                locked_until = ?2, updated_at = ?1
+            WHERE id IN (
+                SELECT j.id
+                FROM StreamingRightsJob j
+                WHERE (
+                    (j.status = 'pending' AND j.next_attempt_at <= ?1)
+                    OR (j.status = 'running' AND j.locked_until <= ?1)
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM StreamingRightsJob r
+                    WHERE r.world = j.world AND r.address = j.address
+                    AND r.status IN ('pending', 'running') AND r.id < j.id
+                )
+                ORDER BY j.id
+                LIMIT ?3
+            )
+            RETURNING id, method, world, address, attempts
+            ''',
+            (now, now + int(self.lease * 1000), limit),
+        )
+
+    async def run(self):
+        headers = {'User-Agent': 'daohq-admin-panel'}
+        async with httpx.AsyncClient(
+            base_url=CONTENT_SERVER_URL, headers=headers, timeout=30
+        ) as client:
+            self._client = client
+            # task -> number of jobs it is sending
+            running = {}
+            cleaned_at = 0
+
+            while True:
+                if _now_ms() - cleaned_at > 3600 * 1000:
+                    cleaned_at = _now_ms()
+                    await self._cleanup()
+
+                try:
+                    jobs = await self._claim(self.workers - sum(running.values()))
+                except Exception as e:
+                    print(f"Streaming rights queue failed: {e}")
+                    jobs = []
+
+                worlds = {}
+                for job in jobs:
+                    worlds.setdefault(job[2], []).append(job)
+
+                for world_name, world_jobs in worlds.items():
+                    task = asyncio.create_task(
+                        self._process_world(world_name, world_jobs)
+                    )
+                    running[task] = len(world_jobs)
+                    task.add_done_callback(lambda task: running.pop(task, None))
+                    task.add_done_callback(lambda _: self._wakeup.set())
+
+                self._wakeup.clear()
+                if sum(running.values()) >= self.workers:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _process_world(self, world_name: str, jobs: list):
+        '''
+        The changes of one world are signed in one go and sent concurrently
+        over the shared client.
+        '''
+
+        requests = [
+            (method, _permission_path(world_name, address))
+            for _, method, _, address, _ in jobs
+        ]
+
+        try:
+            headers = await content_server_signer.headers(requests)
+        except Exception as e:
+            for job in jobs:
+                self.failed += 1
+                await self._finish(job[0], 'failed', f'Signing failed: {e}')
+            return
+
+        await asyncio.gather(
+            *(
+                self._process(job, path, job_headers)
+                for job, (_, path), job_headers in zip(jobs, requests, headers)
+            )
+        )
+
+    async def _process(self, job, path: str, headers: dict):
+        job_id, method, _, _, attempts = job
+        print(f"{method} streaming rights attempt {attempts}")
+
+        try:
+            await _update_streaming_rights(self._client, method, path, headers)
+        except RetryableError as e:
+            if attempts < self.max_attempts:
+                delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+                self.retried += 1
+                await self._finish(job_id, 'pending', str(e), delay)
+            else:
+                self.failed += 1
+                await self._finish(job_id, 'failed', str(e))
+            return
+        except Exception as e:
+            self.failed += 1
+            await self._finish(job_id, 'failed', str(e))
+            return
 
-        if response.status_code >= 300:
-            print(f"{method} {permission} rights fail")
-            print(f'Error: {response.status_code}')
-            if response.status_code < 500:
-                print(f"{method} {permission} fail with server-side error")
-                print(response.text)
-                return
-            await asyncio.sleep(3)
-        else: break
+        self.succeeded += 1
+        await self._finish(job_id, 'done')
+        print(f"{method} streaming rights success")
 
-        counter += 1
-    
-    print(f"{method} {permission} rights success")
+    async def _finish(self, job_id, status, error=None, delay=0):
+        now = _now_ms()
+        await write_queue.execute(
+            '''
+            UPDATE StreamingRightsJob AS j
+            SET status = CASE
+                    -- a newer operation was queued while this one was running
+                    WHEN ?2 = 'pending' AND EXISTS (
+                        SELECT 1 FROM StreamingRightsJob n
+                        WHERE n.world = j.world AND n.address = j.address
+                        AND n.status = 'pending' AND n.id > j.id
+                    )
+                    THEN 'superseded'
+                    ELSE ?2
+                END,
+                last_error = ?3, next_attempt_at = ?4,
+                locked_until = NULL, updated_at = ?5
+            WHERE id = ?1
+            ''',
+            (job_id, status, error, now + int(delay * 1000), now),
+        )
 
+    async def _cleanup(self):
+        '''
+        Forget finished jobs after a week.
+        '''
+
+        try:
+            await write_queue.execute(
+                '''
+                DELETE FROM StreamingRightsJob
+                WHERE status IN ('done', 'superseded', 'failed')
+                AND updated_at < ?1
+                ''',
+                (_now_ms() - 7 * 24 * 3600 * 1000,),
+            )
+        except Exception as e:
+            print(f"Streaming rights cleanup failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'retried': self.retried,
+            'superseded': self.superseded,
+            'headers_signed': content_server_signer.signed,
+            'headers_reused': content_server_signer.reused,
+        }
+
+
+streaming_rights_queue = StreamingRightsQueue(
+    STREAMING_RIGHTS_WORKERS,
+    STREAMING_RIGHTS_MAX_ATTEMPTS,
+    STREAMING_RIGHTS_RETRY_BASE,
+    STREAMING_RIGHTS_RETRY_MAX,
+    STREAMING_RIGHTS_LEASE,
+)
+
+
+async def _update_streaming_rights(
+    client: httpx.AsyncClient, method: str, path: str, headers: dict
+):
+    try:
+        response = await client.request(method, path, headers=headers)
+    except httpx.HTTPError as e:
+        raise RetryableError(f'{type(e).__name__}: {e}')
+
+    if response.status_code >= 500:
+        raise RetryableError(f'Error: {response.status_code}')
+
+    if response.status_code >= 300:
+        print(f"{method} streaming fail with client-side error")
+        print(response.text)
+        raise Exception(f'Error: {response.status_code} {response.text[:200]}'.strip())
+
+
+def _permission_path(world_name: str, address: str) -> str:
+    return f'/world/{world_name}/permissions/streaming/{address}'
+
+
+def _now_ms() -> int:
+    return int(datetime.now(timezone.utc).timestamp() * 1000)
 
 
 def _generate_signed_fetch_headers(auth_chain: list, timestamp: int) -> dict:
@@ -83,9 +363,10 @@ def _generate_signed_fetch_headers(auth_chain: list, timestamp: int) -> dict:
     return headers
 
 
-def _generate_auth_chain(method: str, path: str) -> tuple:
-    timestamp = int(datetime.now(timezone.utc).timestamp() * 1000)
-    auth_chain = [
+def _generate_auth_chain(
+    method: str, path: str, timestamp: int, signature: str
+) -> list:
+    return [
         {'type': 'SIGNER', 'payload': OWNER_ADDRESS, 'signature': ''},
         {
             'type': 'ECDSA_EPHEMERAL',
@@ -95,21 +376,81 @@ def _generate_auth_chain(method: str, path: str) -> tuple:
         {
             'type': 'ECDSA_SIGNED_ENTITY',
             'payload': f'{method}:{path}:{timestamp}:',
-            'signature': '',
+            'signature': signature,
         },
     ]
 
-    auth_chain[2]['signature'] = _sign_message(
-        auth_chain[2]['payload'], EPHEMERAL_PRIVATE_KEY
-    )
 
-    return auth_chain, timestamp
+class ContentServerSigner:
+    '''
+    Signed fetch headers for the worlds content server.
+
+    The ephemeral key is parsed once and kept as an account. Signing runs in
+    a dedicated thread, one executor call per batch of requests, and the
+    headers of a method/path are reused for `ttl` seconds (well inside the
+    server's timestamp window), e.g. by the retries of a job.
+    '''
+
+    def __init__(self, private_key: str, ttl: float):
+        self.ttl = ttl
+
+        self._private_key = private_key
+        self._account = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='content-signer')
+        # (method, path) -> (expires_at, headers)
+        self._headers = {}
+
+        self.signed = 0
+        self.reused = 0
+
+    def _sign(self, requests: list, timestamp: int) -> list:
+        if self._account is None:
+            self._account = Account.from_key(self._private_key)
+
+        return [
+            self._account.sign_message(
+                encode_defunct(text=f'{method}:{path}:{timestamp}:')
+            ).signature.hex()
+            for method, path in requests
+        ]
+
+    async def headers(self, requests: list) -> list:
+        '''
+        Headers for each `(method, path)` of `requests`, in order.
+        '''
+
+        now = _now_ms()
+        self._headers = {
+            request: cached
+            for request, cached in self._headers.items()
+            if cached[0] > now
+        }
+
+        missing = [
+            request
+            for request in dict.fromkeys(requests)
+            if request not in self._headers
+        ]
+        if missing:
+            signatures = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._sign, missing, now
+            )
+            for (method, path), signature in zip(missing, signatures):
+                auth_chain = _generate_auth_chain(method, path, now, signature)
+                self._headers[(method, path)] = (
+                    now + int(self.ttl * 1000),
+                    _generate_signed_fetch_headers(auth_chain, now),
+                )
+
+        self.signed += len(missing)
+        self.reused += len(requests) - len(missing)
+
+        return [self._headers[request][1] for request in requests]
 
 
-def _sign_message(msg: str, private_key: str) -> str:
-    message = encode_defunct(text=msg)
-    signed_message = Web3().eth.account.sign_message(message, private_key=private_key)
-    return signed_message.signature.hex()
+content_server_signer = ContentServerSigner(
+    EPHEMERAL_PRIVATE_KEY, STREAMING_RIGHTS_HEADER_TTL
+)
 
 
 def _current_datetime_utc(offset_days=0) -> str:
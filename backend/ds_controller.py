@@ -4,9 +4,11 @@ import aiosqlite
 from fastapi import APIRouter, Depends, HTTPException
 
 from models import PutDsScreen
+from database import read_pool
 from tools import (
     db_connection,
     CheckRole,
+    ConditionalGet,
     broadcast_deleted_ds_message,
     check_system_token,
     broadcast_added_ds_message,
@@ -131,7 +133,10 @@ async def discord_images_list(screen_id: str, db=Depends(db_connection)):
 
 
 @router.get('/discord/screens')
-async def discord_screens_list(db=Depends(db_connection)):
+async def discord_screens_list(
+    etag=Depends(ConditionalGet('discordscreen', 'location')),
+    db=Depends(db_connection),
+):
 
     db.row_factory = aiosqlite.Row
 
@@ -251,7 +256,7 @@ async def discord_content(
 @router.put('/discord/images')
 async def update_discord_content(jump_url: str, _=Depends(check_system_token)):
 
-    async with aiosqlite.connect('database.sqlite', timeout=30) as db:
+    async with read_pool.connection() as db:
         db.row_factory = aiosqlite.Row
 
         cursor = await db.execute(
@@ -0,0 +1,113 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+from database import read_pool
+from settings import LIVE_CACHE_SIZE
+
+
+class LiveCache:
+    '''
+    In-memory materialized view of what the scenes play right now.
+
+    An entry holds the /contents/live or /music/live items of one location,
+    or the /contents/slot/live items of one slot, with the LiveVersion of
+    its location when it was built. Triggers bump that version in the
+    transaction of any write changing what a location plays, whoever makes
+    it, so a request reads the versions of the locations it asks for and
+    rebuilds only the entries whose location moved. The ETag is made from
+    the same versions, so every worker gives the same tag.
+    '''
+
+    # kind -> versions of the requested keys, as (key, *version) rows
+    version_queries = {
+        'contents': '''
+            SELECT j.value, IFNULL(v.version, 0)
+            FROM json_each(?1) j
+            LEFT JOIN LiveVersion v ON v.location = j.value
+        ''',
+        'music': '''
+            SELECT j.value, IFNULL(v.version, 0)
+            FROM json_each(?1) j
+            LEFT JOIN LiveVersion v ON v.location = j.value
+        ''',
+        'slot': '''
+            SELECT j.value, s.location, IFNULL(v.version, 0)
+            FROM json_each(?1) j
+            LEFT JOIN Slot s ON s.id = j.value
+            LEFT JOIN LiveVersion v ON v.location = s.location
+        ''',
+    }
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    async def get(self, kind: str, keys: list, load, check_etag=None) -> dict:
+        '''
+        Values of `keys` (locations, or slot ids for 'slot') by key.
+
+        `check_etag(etag)` is called with the tag of the response before
+        anything is built, so it can answer 304. Missing and outdated
+        entries are built together by `load(keys, db)`, which returns them
+        by key, on the read connection the versions came from.
+        '''
+
+        keys = list(dict.fromkeys(keys))
+
+        async with read_pool.connection() as db:
+            cursor = await db.execute(self.version_queries[kind], (json.dumps(keys),))
+            versions = {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+
+            if check_etag:
+                check_etag(self.etag(kind, keys, versions))
+
+            values = {}
+            missing = []
+            for key in keys:
+                entry = self._entries.get((kind, key))
+                if entry and entry[0] == versions[key]:
+                    self._entries.move_to_end((kind, key))
+                    self.hits += 1
+                    values[key] = entry[1]
+                else:
+                    self.stale += entry is not None
+                    self.misses += 1
+                    missing.append(key)
+
+            if missing:
+                loaded = await load(missing, db)
+                for key in missing:
+                    values[key] = loaded[key]
+                    # Versions were read first, so a write landing meanwhile
+                    # leaves the entry older than its location and rebuilt
+                    self._entries[(kind, key)] = (versions[key], loaded[key])
+                    self._entries.move_to_end((kind, key))
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+        return {key: values[key] for key in keys}
+
+    @staticmethod
+    def etag(kind: str, keys: list, versions: dict) -> str:
+        state = json.dumps([kind, [(key, *versions[key]) for key in keys]])
+        return f'"live-{hashlib.blake2b(state.encode(), digest_size=12).hexdigest()}"'
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / requests, 4) if requests else 0,
+            'stale': self.stale,
+        }
+
+
+live_cache = LiveCache(LIVE_CACHE_SIZE)
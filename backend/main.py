@@ -5,7 +5,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timezone
 
 from settings import config
-from tools import booking_status
+from tools import booking_status, signature_pool, change_dispatcher, sync_booking_limits
+from database import bootstrap_database, close_pools, write_queue
+from backplane import backplane
+from storage import s3_client
+from search_indexer import search_indexer
+from slot_states import slot_states
+from delegate_streaming_rights import streaming_rights_queue
 
 import booking_controller
 import main_controller
@@ -16,7 +22,8 @@ import ds_controller
 import metrics_controller
 import music_controller
 
-import meilisearch.index_bookings
+import meilisearch.index_setup
+import meilisearch.key
 
 print('prefix:', config.prefix)
 app = FastAPI(root_path=config.prefix)
@@ -50,4 +57,23 @@ def is_not_expired(iso_date):
 
 @app.on_event("startup")
 async def startup_event():
+    await bootstrap_database()
+    write_queue.start()
+    await sync_booking_limits()
+    slot_states.start()
+    await backplane.start()
+    signature_pool.start()
+    await s3_client.start()
     asyncio.create_task(booking_status())
+    asyncio.create_task(search_indexer.run())
+    asyncio.create_task(streaming_rights_queue.run())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await change_dispatcher.close()
+    await slot_states.close()
+    await backplane.close()
+    signature_pool.close()
+    await s3_client.close()
+    await close_pools()
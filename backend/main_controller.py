@@ -5,6 +5,7 @@ import subprocess
 import httpx
 import aiosqlite
 import aioboto3
+from datetime import datetime, timedelta, timezone
 from fastapi import APIRouter, Depends, Response, Body, File, UploadFile, HTTPException
 
 from tools import (
@@ -13,9 +14,14 @@ from tools import (
     check_system_token,
     check_system_out_token,
     delete_s3_object,
-    get_db_urns,
-    get_s3_objects,
-    delete_s3_objects,
+    index_db_urns,
+    drop_db_urns,
+    collect_s3_garbage,
+    s3_gc_run,
+    broadcast_stats,
+    role_cache,
+    signature_stats,
+    ConditionalGet,
 )
 from settings import (
     JWT_SECRET,
@@ -23,8 +29,15 @@ from settings import (
     FILES_BUCKET_NAME,
     FILES_BUCKET_FOLDER,
     USER_FILES_BUCKET_NAME,
+    S3_GC_GRACE_PERIOD,
     aws_session,
 )
+from storage import s3_client
+from search_indexer import search_indexer
+from live_cache import live_cache
+from slot_states import slot_states
+from delegate_streaming_rights import streaming_rights_queue
+from database import database_stats, write_queue
 
 
 router = APIRouter()
@@ -51,16 +64,14 @@ async def version():
 
 
 @router.post('/auth')
-async def auth(
-    signature: str, data_to_sign: str = Body(...), db=Depends(db_connection)
-):
+async def auth(signature: str, data_to_sign: str = Body(...)):
     '''
     This endpoint handles the authentication of users
     by verifying their web3 signature and returning a JWT token if the signature is valid
     '''
 
     address = [el for el in data_to_sign.split() if el.startswith('0x')][0]
-    signer_address = check_signature(signature, data_to_sign)
+    signer_address = await check_signature(signature, data_to_sign)
     if not signer_address or (signer_address != address):
         return Response(status_code=403, content='unvalid signature')
 
@@ -73,14 +84,13 @@ async def auth(
         'signer_address': signer_address,
     }
 
-    await db.execute(
+    await write_queue.execute(
         '''
         INSERT OR IGNORE INTO User (address)
         VALUES (?1)
         ''',
         (signer_address,),
     )
-    await db.commit()
 
     token = jwt.encode(token_data, JWT_SECRET, algorithm='HS256')
 
@@ -265,6 +275,8 @@ async def superadmin_synchronization(
 
     await db.commit()
 
+    await role_cache.invalidate()
+
     return members
 
 
@@ -276,7 +288,9 @@ async def meilisearch_public_key():
 
 
 @router.get('/location/{location_id}')
-async def get_location_data(location_id, db=Depends(db_connection)):
+async def get_location_data(
+    location_id, etag=Depends(ConditionalGet('location')), db=Depends(db_connection)
+):
 
     db.row_factory = aiosqlite.Row
 
@@ -298,19 +312,110 @@ async def get_location_data(location_id, db=Depends(db_connection)):
 
 
 @router.delete('/sync/s3')
-async def s3_synchronization(db=Depends(db_connection), _=Depends(check_system_token)):
+async def s3_synchronization(
+    dry_run: bool = False,
+    _=Depends(check_system_token),
+):
+    '''
+    This endpoint deletes S3 objects which are not referenced in the database.
+    With dry_run the objects are only counted; the keys go to the log
+    '''
 
-    s3_objects_1 = await get_s3_objects(FILES_BUCKET_NAME, FILES_BUCKET_FOLDER)
-    s3_objects_2 = await get_s3_objects(USER_FILES_BUCKET_NAME, FILES_BUCKET_FOLDER)
+    started_at = datetime.now(timezone.utc)
+    if not s3_gc_run.start(
+        dry_run=dry_run,
+        started_at=started_at.isoformat(),
+        bucket=None,
+        listed=0,
+        orphaned=0,
+        deleted=0,
+        failed=0,
+    ):
+        raise HTTPException(status_code=409, detail="S3 synchronization is running")
+
+    try:
+        await index_db_urns()
 
-    db_urns = await get_db_urns(db)
+        modified_before = started_at - timedelta(seconds=S3_GC_GRACE_PERIOD)
 
-    objects_to_delete_1 = set(s3_objects_1) - set(db_urns)
-    objects_to_delete_2 = set(s3_objects_2) - set(db_urns)
+        deleted = 0
+        for bucket_name in (FILES_BUCKET_NAME, USER_FILES_BUCKET_NAME):
+            deleted += await collect_s3_garbage(
+                bucket_name, FILES_BUCKET_FOLDER, modified_before, dry_run
+            )
+    finally:
+        try:
+            await drop_db_urns()
+        finally:
+            s3_gc_run.finish()
 
-    await delete_s3_objects(FILES_BUCKET_NAME, list(objects_to_delete_1))
-    await delete_s3_objects(USER_FILES_BUCKET_NAME, list(objects_to_delete_2))
+    return {"deleted": deleted, "dry_run": dry_run}
 
-    result = [*objects_to_delete_1, *objects_to_delete_2]
 
-    return {"deleted": result}
+@router.get('/sync/s3')
+async def s3_synchronization_progress(_=Depends(check_system_token)):
+    '''
+    This endpoint returns the progress of the last /sync/s3 run
+    '''
+
+    return s3_gc_run.read()
+
+
+@router.get('/streaming-rights/jobs')
+async def streaming_rights_jobs(
+    status: str = None,
+    world: str = None,
+    address: str = None,
+    limit: int = 100,
+    db=Depends(db_connection),
+    _=Depends(check_system_token),
+):
+    '''
+    This endpoint returns the delegate/revoke streaming rights jobs,
+    newest first, and the number of jobs in each status
+    '''
+
+    db.row_factory = aiosqlite.Row
+
+    cursor = await db.execute(
+        '''
+        SELECT status, COUNT(*) AS count
+        FROM StreamingRightsJob
+        GROUP BY status
+        '''
+    )
+    counts = {row['status']: row['count'] for row in await cursor.fetchall()}
+
+    cursor = await db.execute(
+        '''
+        SELECT *
+        FROM StreamingRightsJob
+        WHERE (?1 IS NULL OR status = ?1)
+        AND (?2 IS NULL OR world = ?2)
+        AND (?3 IS NULL OR address = lower(?3))
+        ORDER BY id DESC
+        LIMIT ?4
+        ''',
+        (status, world, address, limit),
+    )
+    jobs = [dict(row) for row in await cursor.fetchall()]
+
+    return {'counts': counts, 'jobs': jobs, **streaming_rights_queue.stats()}
+
+
+@router.get('/stats')
+async def service_stats(_=Depends(check_system_token)):
+    '''
+    This endpoint returns internal runtime counters of the service
+    '''
+
+    return {
+        'database': database_stats(),
+        'broadcast': broadcast_stats(),
+        'role_cache': role_cache.stats(),
+        'signatures': signature_stats(),
+        's3': s3_client.stats(),
+        'search_indexer': search_indexer.stats(),
+        'live_cache': live_cache.stats(),
+        'slot_states': slot_states.stats(),
+    }
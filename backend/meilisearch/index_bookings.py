@@ -1,46 +1,211 @@
-import sqlite3
-import httpx
-
-import os
-import sys
-
-sys.path.append('..')
-from settings import SYSTEM_TOKEN, MEILISEARCH_HOST
+'''
+Reindex bookings in Meilisearch.
 
-current_dir = os.path.dirname(os.path.abspath(__file__))
-database_path = os.path.join(current_dir, '..', 'database.sqlite')
+    python -m meilisearch.index_bookings           # incremental
+    python -m meilisearch.index_bookings --full    # rebuild
 
+The full rebuild streams the Booking table in chunks into a shadow index
+with the settings of the live one and swaps it in, so search keeps serving
+the old documents until the new index is complete. Edits made during the
+rebuild are sent again after the swap, but a booking deleted meanwhile may
+stay in the index until the next rebuild.
 
-meilisearch_headers = {
-    'Authorization': f'Bearer {SYSTEM_TOKEN}',
-    'Content-Type': 'application/json',
-}
-httpx.delete(
-    f'{MEILISEARCH_HOST}/indexes/booking/documents/', headers=meilisearch_headers
-)
+The incremental mode only sends bookings whose updated_at is past the
+high-water mark stored in SearchIndexState by the previous run (deletes
+are handled by the outbox). Run from the backend directory.
 
+Runs hold the reindex file lock, so a run started while another one is in
+progress (the CLI, or the startup reindex of the search indexer) fails
+instead of racing it on the shadow index.
+'''
 
-conn = sqlite3.connect(database_path)
-conn.row_factory = sqlite3.Row
-
-cursor = conn.cursor()
+import asyncio
+import fcntl
+import os
+import sys
 
-cursor.execute('SELECT * FROM Booking')
-rows = cursor.fetchall()
+import aiosqlite
+import httpx
 
-documents = [dict(row) for row in rows]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from settings import (
+    DATABASE_PATH,
+    SYSTEM_TOKEN,
+    MEILISEARCH_HOST,
+    SEARCH_REINDEX_CHUNK_SIZE,
+)
+from database import connect
 
 
-url = f'{MEILISEARCH_HOST}/indexes/booking/documents'
+INDEX = 'booking'
+SHADOW_INDEX = f'{INDEX}_shadow'
 
-response = httpx.post(url, headers=meilisearch_headers, json=documents)
-if response.status_code == 202:
-    print('Data indexed successfully!')
-else:
-    print('Error indexing data:', response.json())
+# Changes committed late with an older updated_at are picked up by
+# re-sending this many milliseconds before the mark
+HIGH_WATER_MARK_OVERLAP = 60 * 1000
 
+meilisearch_headers = {
+    'Authorization': f'Bearer {SYSTEM_TOKEN}',
+    'Content-Type': 'application/json',
+}
 
-conn.close()
 
-import meilisearch.index_setup
-import meilisearch.key
+async def wait_for_task(client: httpx.AsyncClient, response: httpx.Response):
+    response.raise_for_status()
+    task_uid = response.json()['taskUid']
+
+    while True:
+        response = await client.get(f'/tasks/{task_uid}')
+        response.raise_for_status()
+        task = response.json()
+
+        if task['status'] == 'succeeded':
+            return task
+        if task['status'] in ('failed', 'canceled'):
+            raise RuntimeError(
+                f"Meilisearch task {task_uid} {task['status']}: {task.get('error')}"
+            )
+
+        await asyncio.sleep(0.2)
+
+
+async def iter_bookings(db, chunk_size: int, updated_since: int = None):
+    '''
+    Yield Booking rows as documents, `chunk_size` at a time, in
+    (updated_at, id) order so the scan can resume without OFFSET.
+    '''
+
+    last = (-1, -1)
+
+    while True:
+        cursor = await db.execute(
+            '''
+            SELECT *
+            FROM Booking
+            WHERE updated_at >= ?1
+            AND (updated_at, id) > (?2, ?3)
+            ORDER BY updated_at, id
+            LIMIT ?4
+            ''',
+            (updated_since or 0, *last, chunk_size),
+        )
+        rows = await cursor.fetchall()
+        if not rows:
+            return
+
+        documents = [dict(row) for row in rows]
+        for document in documents:
+            document['is_live'] = bool(document['is_live'])
+
+        last = (documents[-1]['updated_at'], documents[-1]['id'])
+        yield documents
+
+
+async def push_documents(
+    client: httpx.AsyncClient, index: str, db, updated_since: int = None
+):
+    tasks = []
+    count = 0
+
+    async for documents in iter_bookings(db, SEARCH_REINDEX_CHUNK_SIZE, updated_since):
+        response = await client.post(f'/indexes/{index}/documents', json=documents)
+        response.raise_for_status()
+        tasks.append(response)
+        count += len(documents)
+        print(f'{index}: {count} bookings sent')
+
+    for response in tasks:
+        await wait_for_task(client, response)
+
+    return count
+
+
+async def full_reindex(client: httpx.AsyncClient, db, updated_since: int):
+    await client.delete(f'/indexes/{SHADOW_INDEX}')
+
+    response = await client.get(f'/indexes/{INDEX}/settings')
+    if response.status_code == 404:
+        await wait_for_task(
+            client,
+            await client.post('/indexes', json={'uid': INDEX, 'primaryKey': 'id'}),
+        )
+        response = await client.get(f'/indexes/{INDEX}/settings')
+    response.raise_for_status()
+    settings = response.json()
+
+    await wait_for_task(
+        client,
+        await client.post('/indexes', json={'uid': SHADOW_INDEX, 'primaryKey': 'id'}),
+    )
+    await wait_for_task(
+        client, await client.patch(f'/indexes/{SHADOW_INDEX}/settings', json=settings)
+    )
+
+    count = await push_documents(client, SHADOW_INDEX, db)
+
+    await wait_for_task(
+        client,
+        await client.post('/swap-indexes', json=[{'indexes': [INDEX, SHADOW_INDEX]}]),
+    )
+    await wait_for_task(client, await client.delete(f'/indexes/{SHADOW_INDEX}'))
+
+    # The outbox indexer kept writing to the old index during the rebuild
+    await push_documents(client, INDEX, db, updated_since)
+
+    return count
+
+
+async def reindex_bookings(full: bool = False):
+    lock_file = open(f'{DATABASE_PATH}.search-reindex.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        raise RuntimeError('Another reindex is running')
+
+    db = await connect()
+    db.row_factory = aiosqlite.Row
+
+    try:
+        cursor = await db.execute(
+            'SELECT high_water_mark FROM SearchIndexState WHERE name = ?1', (INDEX,)
+        )
+        state = await cursor.fetchone()
+        high_water_mark = state['high_water_mark'] if state else None
+
+        # Read before streaming, changes made meanwhile are sent next time
+        cursor = await db.execute('SELECT IFNULL(MAX(updated_at), 0) FROM Booking')
+        new_high_water_mark = (await cursor.fetchone())[0]
+
+        async with httpx.AsyncClient(
+            base_url=MEILISEARCH_HOST, headers=meilisearch_headers, timeout=60
+        ) as client:
+            if full or high_water_mark is None:
+                count = await full_reindex(
+                    client, db, new_high_water_mark - HIGH_WATER_MARK_OVERLAP
+                )
+                print(f'Data indexed successfully! {count} bookings, full rebuild')
+            else:
+                count = await push_documents(
+                    client, INDEX, db, high_water_mark - HIGH_WATER_MARK_OVERLAP
+                )
+                print(f'Data indexed successfully! {count} bookings changed')
+
+        # The mark only moves forward
+        await db.execute(
+            '''
+            INSERT INTO SearchIndexState (name, high_water_mark)
+            VALUES (?1, ?2)
+            ON CONFLICT (name) DO UPDATE
+            SET high_water_mark = MAX(high_water_mark, excluded.high_water_mark)
+            ''',
+            (INDEX, new_high_water_mark),
+        )
+        await db.commit()
+    finally:
+        await db.close()
+        lock_file.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(reindex_bookings(full='--full' in sys.argv))
@@ -7,6 +7,7 @@ from tools import (
     scene_socket_manager,
     delete_s3_object,
 )
+from database import write_queue
 
 
 router = APIRouter()
@@ -62,20 +63,14 @@ async def delete_metrics_content(
 
 
 @router.post('/metrics/images')
-async def metrics_content(
-    metrics: dict, db=Depends(db_connection), _=Depends(check_system_token)
-):
-
-    for metric_id, s3_urn in metrics.items():
+async def metrics_content(metrics: dict, _=Depends(check_system_token)):
 
-        await db.execute(
-            '''
-            INSERT OR REPLACE INTO Metrics (id, s3_urn)
-            VALUES (?1, ?2)
-            ''',
-            (metric_id, s3_urn),
-        )
-
-    await db.commit()
+    await write_queue.executemany(
+        '''
+        INSERT OR REPLACE INTO Metrics (id, s3_urn)
+        VALUES (?1, ?2)
+        ''',
+        metrics.items(),
+    )
 
     await scene_socket_manager.broadcast({'type': 'metrics-updated', 'data': metrics})
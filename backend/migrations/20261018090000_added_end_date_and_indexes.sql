@@ -0,0 +1,34 @@
+-- Add column "end_date" to table: "Booking"
+ALTER TABLE `Booking` ADD COLUMN `end_date` integer NULL;
+-- Backfill "end_date" from "start_date" and "duration"
+UPDATE `Booking` SET `end_date` = `start_date` + `duration`;
+-- Create index "Booking_location_end_date" to table: "Booking"
+CREATE INDEX `Booking_location_end_date` ON `Booking` (`location`, `end_date`);
+-- Create index "Booking_location_start_date" to table: "Booking"
+CREATE INDEX `Booking_location_start_date` ON `Booking` (`location`, `start_date`);
+-- Create index "Booking_owner_location_end_date" to table: "Booking"
+CREATE INDEX `Booking_owner_location_end_date` ON `Booking` (`owner`, `location`, `end_date`);
+-- Create index "Booking_end_date" to table: "Booking"
+CREATE INDEX `Booking_end_date` ON `Booking` (`end_date`);
+-- Create index "Booking_live" to table: "Booking"
+CREATE INDEX `Booking_live` ON `Booking` (`location`, `start_date`) WHERE `is_live` = 1;
+-- Create index "Slot_location" to table: "Slot"
+CREATE INDEX `Slot_location` ON `Slot` (`location`);
+-- Create index "Location_scene" to table: "Location"
+CREATE INDEX `Location_scene` ON `Location` (`scene`);
+-- Create index "Content_booking_slot_order_id" to table: "Content"
+CREATE INDEX `Content_booking_slot_order_id` ON `Content` (`booking`, `slot`, `order_id`, `resource`);
+-- Create index "Content_resource" to table: "Content"
+CREATE INDEX `Content_resource` ON `Content` (`resource`);
+-- Create index "Music_booking_location_order_id" to table: "Music"
+CREATE INDEX `Music_booking_location_order_id` ON `Music` (`booking`, `location`, `order_id`, `resource`);
+-- Create index "Resource_file" to table: "Resource"
+CREATE INDEX `Resource_file` ON `Resource` (`file`);
+-- Create index "Files_user" to table: "Files"
+CREATE INDEX `Files_user` ON `Files` (`user`);
+-- Create index "Files_s3_urn" to table: "Files"
+CREATE INDEX `Files_s3_urn` ON `Files` (`s3_urn`);
+-- Create index "Discord_guild_channel_added_at" to table: "Discord"
+CREATE INDEX `Discord_guild_channel_added_at` ON `Discord` (`guild`, `channel`, `added_at`);
+-- Create index "DiscordScreen_guild_channel" to table: "DiscordScreen"
+CREATE INDEX `DiscordScreen_guild_channel` ON `DiscordScreen` (`guild`, `channel`);
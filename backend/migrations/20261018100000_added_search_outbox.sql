@@ -0,0 +1,21 @@
+-- Create "SearchOutbox" table
+CREATE TABLE `SearchOutbox` (
+  `id` integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+  `booking` integer NOT NULL,
+  `created_at` integer NOT NULL
+);
+-- Create trigger "Booking_search_insert" on table: "Booking"
+CREATE TRIGGER `Booking_search_insert` AFTER INSERT ON `Booking`
+BEGIN
+  INSERT INTO `SearchOutbox` (`booking`, `created_at`) VALUES (NEW.`id`, CAST((julianday('now') - 2440587.5) * 86400000 AS integer));
+END;
+-- Create trigger "Booking_search_update" on table: "Booking"
+CREATE TRIGGER `Booking_search_update` AFTER UPDATE ON `Booking`
+BEGIN
+  INSERT INTO `SearchOutbox` (`booking`, `created_at`) VALUES (NEW.`id`, CAST((julianday('now') - 2440587.5) * 86400000 AS integer));
+END;
+-- Create trigger "Booking_search_delete" on table: "Booking"
+CREATE TRIGGER `Booking_search_delete` AFTER DELETE ON `Booking`
+BEGIN
+  INSERT INTO `SearchOutbox` (`booking`, `created_at`) VALUES (OLD.`id`, CAST((julianday('now') - 2440587.5) * 86400000 AS integer));
+END;
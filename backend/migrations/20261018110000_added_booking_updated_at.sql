@@ -0,0 +1,27 @@
+-- Add column "updated_at" to table: "Booking"
+ALTER TABLE `Booking` ADD COLUMN `updated_at` integer NULL;
+-- Backfill "updated_at" from "creation_date"
+UPDATE `Booking` SET `updated_at` = IFNULL(`creation_date`, 0);
+-- Create index "Booking_updated_at" to table: "Booking"
+CREATE INDEX `Booking_updated_at` ON `Booking` (`updated_at`, `id`);
+-- Drop trigger "Booking_search_insert" from table: "Booking"
+DROP TRIGGER `Booking_search_insert`;
+-- Create trigger "Booking_search_insert" on table: "Booking"
+CREATE TRIGGER `Booking_search_insert` AFTER INSERT ON `Booking`
+BEGIN
+  UPDATE `Booking` SET `updated_at` = CAST((julianday('now') - 2440587.5) * 86400000 AS integer) WHERE `id` = NEW.`id`;
+  INSERT INTO `SearchOutbox` (`booking`, `created_at`) VALUES (NEW.`id`, CAST((julianday('now') - 2440587.5) * 86400000 AS integer));
+END;
+-- Drop trigger "Booking_search_update" from table: "Booking"
+DROP TRIGGER `Booking_search_update`;
+-- Create trigger "Booking_search_update" on table: "Booking"
+CREATE TRIGGER `Booking_search_update` AFTER UPDATE ON `Booking` WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN
+  UPDATE `Booking` SET `updated_at` = MAX(CAST((julianday('now') - 2440587.5) * 86400000 AS integer), IFNULL(OLD.`updated_at`, 0) + 1) WHERE `id` = NEW.`id`;
+  INSERT INTO `SearchOutbox` (`booking`, `created_at`) VALUES (NEW.`id`, CAST((julianday('now') - 2440587.5) * 86400000 AS integer));
+END;
+-- Create "SearchIndexState" table
+CREATE TABLE `SearchIndexState` (
+  `name` varchar NOT NULL PRIMARY KEY,
+  `high_water_mark` integer NULL
+);
@@ -0,0 +1,18 @@
+-- Create "StreamingRightsJob" table
+CREATE TABLE `StreamingRightsJob` (
+  `id` integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+  `world` varchar NOT NULL,
+  `address` varchar NOT NULL,
+  `method` varchar NOT NULL,
+  `status` varchar NOT NULL DEFAULT 'pending',
+  `attempts` integer NOT NULL DEFAULT 0,
+  `next_attempt_at` integer NOT NULL,
+  `locked_until` integer NULL,
+  `last_error` varchar NULL,
+  `created_at` integer NOT NULL,
+  `updated_at` integer NOT NULL
+);
+-- Create index "StreamingRightsJob_status_next_attempt_at" to table: "StreamingRightsJob"
+CREATE INDEX `StreamingRightsJob_status_next_attempt_at` ON `StreamingRightsJob` (`status`, `next_attempt_at`);
+-- Create index "StreamingRightsJob_world_address_status" to table: "StreamingRightsJob"
+CREATE INDEX `StreamingRightsJob_world_address_status` ON `StreamingRightsJob` (`world`, `address`, `status`);
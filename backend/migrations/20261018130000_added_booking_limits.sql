@@ -0,0 +1,75 @@
+-- Add column "content_count" to table: "Booking"
+ALTER TABLE `Booking` ADD COLUMN `content_count` integer NOT NULL DEFAULT 0;
+-- Add column "music_count" to table: "Booking"
+ALTER TABLE `Booking` ADD COLUMN `music_count` integer NOT NULL DEFAULT 0;
+-- Add column "content_limit" to table: "Booking"
+ALTER TABLE `Booking` ADD COLUMN `content_limit` integer NULL;
+-- Add column "music_limit" to table: "Booking"
+ALTER TABLE `Booking` ADD COLUMN `music_limit` integer NULL;
+-- Create "BookingLimit" table
+CREATE TABLE `BookingLimit` (
+  `name` varchar NOT NULL PRIMARY KEY,
+  `per_half_hour` integer NULL
+);
+-- Drop trigger "Booking_search_update" from table: "Booking"
+DROP TRIGGER `Booking_search_update`;
+-- Create trigger "Booking_search_update" on table: "Booking"
+CREATE TRIGGER `Booking_search_update` AFTER UPDATE OF `owner`, `title`, `creation_date`, `start_date`, `duration`, `event_date`, `description`, `preview`, `is_live`, `location`, `end_date` ON `Booking` WHEN NEW.`updated_at` IS OLD.`updated_at`
+BEGIN
+  UPDATE `Booking` SET `updated_at` = MAX(CAST((julianday('now') - 2440587.5) * 86400000 AS integer), IFNULL(OLD.`updated_at`, 0) + 1) WHERE `id` = NEW.`id`;
+  INSERT INTO `SearchOutbox` (`booking`, `created_at`) VALUES (NEW.`id`, CAST((julianday('now') - 2440587.5) * 86400000 AS integer));
+END;
+-- Backfill "content_count" and "music_count"
+UPDATE `Booking` SET `content_count` = (SELECT COUNT(*) FROM `Content` `c` JOIN `Resource` `r` ON `c`.`resource` = `r`.`id` WHERE `c`.`booking` = `Booking`.`id` AND `r`.`type` = 'image'), `music_count` = (SELECT COUNT(*) FROM `Music` `m` WHERE `m`.`booking` = `Booking`.`id`);
+-- Create trigger "Booking_limits_insert" on table: "Booking"
+CREATE TRIGGER `Booking_limits_insert` AFTER INSERT ON `Booking`
+BEGIN
+  UPDATE `Booking` SET `content_limit` = (SELECT CAST(ROUND(NEW.`duration` / 60000.0 / 30 * `per_half_hour`, 2) AS integer) FROM `BookingLimit` WHERE `name` = 'content'), `music_limit` = (SELECT CAST(ROUND(NEW.`duration` / 60000.0 / 30 * `per_half_hour`, 2) AS integer) FROM `BookingLimit` WHERE `name` = 'music') WHERE `id` = NEW.`id`;
+END;
+-- Create trigger "Booking_limits_update" on table: "Booking"
+CREATE TRIGGER `Booking_limits_update` AFTER UPDATE OF `duration` ON `Booking` WHEN NEW.`duration` IS NOT OLD.`duration`
+BEGIN
+  UPDATE `Booking` SET `content_limit` = (SELECT CAST(ROUND(NEW.`duration` / 60000.0 / 30 * `per_half_hour`, 2) AS integer) FROM `BookingLimit` WHERE `name` = 'content'), `music_limit` = (SELECT CAST(ROUND(NEW.`duration` / 60000.0 / 30 * `per_half_hour`, 2) AS integer) FROM `BookingLimit` WHERE `name` = 'music') WHERE `id` = NEW.`id`;
+END;
+-- Create trigger "Content_limit_check" on table: "Content"
+CREATE TRIGGER `Content_limit_check` BEFORE INSERT ON `Content` WHEN NEW.`booking` IS NOT NULL
+BEGIN
+  SELECT RAISE(ABORT, 'Content limit full') FROM `Booking` WHERE `id` = NEW.`booking` AND `content_count` >= `content_limit`;
+END;
+-- Create trigger "Content_count_insert" on table: "Content"
+CREATE TRIGGER `Content_count_insert` AFTER INSERT ON `Content` WHEN NEW.`booking` IS NOT NULL AND (SELECT `type` FROM `Resource` WHERE `id` = NEW.`resource`) = 'image'
+BEGIN
+  UPDATE `Booking` SET `content_count` = `content_count` + 1 WHERE `id` = NEW.`booking`;
+END;
+-- Create trigger "Content_count_delete" on table: "Content"
+CREATE TRIGGER `Content_count_delete` AFTER DELETE ON `Content` WHEN OLD.`booking` IS NOT NULL AND (SELECT `type` FROM `Resource` WHERE `id` = OLD.`resource`) = 'image'
+BEGIN
+  UPDATE `Booking` SET `content_count` = `content_count` - 1 WHERE `id` = OLD.`booking`;
+END;
+-- Create trigger "Content_count_update" on table: "Content"
+CREATE TRIGGER `Content_count_update` AFTER UPDATE OF `booking`, `resource` ON `Content`
+BEGIN
+  UPDATE `Booking` SET `content_count` = `content_count` - 1 WHERE `id` = OLD.`booking` AND (SELECT `type` FROM `Resource` WHERE `id` = OLD.`resource`) = 'image';
+  UPDATE `Booking` SET `content_count` = `content_count` + 1 WHERE `id` = NEW.`booking` AND (SELECT `type` FROM `Resource` WHERE `id` = NEW.`resource`) = 'image';
+END;
+-- Create trigger "Music_limit_check" on table: "Music"
+CREATE TRIGGER `Music_limit_check` BEFORE INSERT ON `Music` WHEN NEW.`booking` IS NOT NULL
+BEGIN
+  SELECT RAISE(ABORT, 'Music content limit full') FROM `Booking` WHERE `id` = NEW.`booking` AND `music_count` >= `music_limit`;
+END;
+-- Create trigger "Music_count_insert" on table: "Music"
+CREATE TRIGGER `Music_count_insert` AFTER INSERT ON `Music` WHEN NEW.`booking` IS NOT NULL
+BEGIN
+  UPDATE `Booking` SET `music_count` = `music_count` + 1 WHERE `id` = NEW.`booking`;
+END;
+-- Create trigger "Music_count_delete" on table: "Music"
+CREATE TRIGGER `Music_count_delete` AFTER DELETE ON `Music` WHEN OLD.`booking` IS NOT NULL
+BEGIN
+  UPDATE `Booking` SET `music_count` = `music_count` - 1 WHERE `id` = OLD.`booking`;
+END;
+-- Create trigger "Music_count_update" on table: "Music"
+CREATE TRIGGER `Music_count_update` AFTER UPDATE OF `booking` ON `Music`
+BEGIN
+  UPDATE `Booking` SET `music_count` = `music_count` - 1 WHERE `id` = OLD.`booking`;
+  UPDATE `Booking` SET `music_count` = `music_count` + 1 WHERE `id` = NEW.`booking`;
+END;
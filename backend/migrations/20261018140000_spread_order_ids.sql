@@ -0,0 +1,4 @@
+-- Renumber "order_id" of table: "Content" one step (1024) apart per playlist
+UPDATE `Content` SET `order_id` = `r`.`position` * 1024 FROM (SELECT `id`, ROW_NUMBER() OVER (PARTITION BY `booking`, `slot` ORDER BY `order_id`, `id`) AS `position` FROM `Content`) AS `r` WHERE `Content`.`id` = `r`.`id`;
+-- Renumber "order_id" of table: "Music" one step (1024) apart per playlist
+UPDATE `Music` SET `order_id` = `r`.`position` * 1024 FROM (SELECT `id`, ROW_NUMBER() OVER (PARTITION BY `booking`, `location` ORDER BY `order_id`, `id`) AS `position` FROM `Music`) AS `r` WHERE `Music`.`id` = `r`.`id`;
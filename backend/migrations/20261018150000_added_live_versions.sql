@@ -0,0 +1,92 @@
+-- Create "LiveVersion" table
+CREATE TABLE `LiveVersion` (
+  `location` varchar NOT NULL PRIMARY KEY,
+  `version` integer NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+-- Create index "Music_resource" to table: "Music"
+CREATE INDEX `Music_resource` ON `Music` (`resource`);
+-- Create trigger "Content_live_insert" on table: "Content"
+CREATE TRIGGER `Content_live_insert` AFTER INSERT ON `Content`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT `location`, 1 FROM `Slot` WHERE `id` = NEW.`slot` AND `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Content_live_update" on table: "Content"
+CREATE TRIGGER `Content_live_update` AFTER UPDATE ON `Content`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT DISTINCT `location`, 1 FROM `Slot` WHERE `id` IN (OLD.`slot`, NEW.`slot`) AND `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Content_live_delete" on table: "Content"
+CREATE TRIGGER `Content_live_delete` AFTER DELETE ON `Content`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT `location`, 1 FROM `Slot` WHERE `id` = OLD.`slot` AND `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Music_live_insert" on table: "Music"
+CREATE TRIGGER `Music_live_insert` AFTER INSERT ON `Music` WHEN NEW.`location` IS NOT NULL
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) VALUES (NEW.`location`, 1) ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Music_live_update" on table: "Music"
+CREATE TRIGGER `Music_live_update` AFTER UPDATE ON `Music`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT DISTINCT `value`, 1 FROM json_each(json_array(OLD.`location`, NEW.`location`)) WHERE `value` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Music_live_delete" on table: "Music"
+CREATE TRIGGER `Music_live_delete` AFTER DELETE ON `Music` WHEN OLD.`location` IS NOT NULL
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) VALUES (OLD.`location`, 1) ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Booking_live_insert" on table: "Booking"
+CREATE TRIGGER `Booking_live_insert` AFTER INSERT ON `Booking` WHEN NEW.`is_live` AND NEW.`location` IS NOT NULL
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) VALUES (NEW.`location`, 1) ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Booking_live_update" on table: "Booking"
+CREATE TRIGGER `Booking_live_update` AFTER UPDATE OF `is_live`, `location` ON `Booking` WHEN (OLD.`is_live` OR NEW.`is_live`) AND (OLD.`is_live` IS NOT NEW.`is_live` OR OLD.`location` IS NOT NEW.`location`)
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT DISTINCT `value`, 1 FROM json_each(json_array(OLD.`location`, NEW.`location`)) WHERE `value` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Booking_live_delete" on table: "Booking"
+CREATE TRIGGER `Booking_live_delete` AFTER DELETE ON `Booking` WHEN OLD.`is_live` AND OLD.`location` IS NOT NULL
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) VALUES (OLD.`location`, 1) ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Slot_live_update" on table: "Slot"
+CREATE TRIGGER `Slot_live_update` AFTER UPDATE OF `id`, `location` ON `Slot`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT DISTINCT `value`, 1 FROM json_each(json_array(OLD.`location`, NEW.`location`)) WHERE `value` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Slot_live_delete" on table: "Slot"
+CREATE TRIGGER `Slot_live_delete` AFTER DELETE ON `Slot` WHEN OLD.`location` IS NOT NULL
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) VALUES (OLD.`location`, 1) ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Location_live_update" on table: "Location"
+CREATE TRIGGER `Location_live_update` AFTER UPDATE OF `id` ON `Location`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT DISTINCT `value`, 1 FROM json_each(json_array(OLD.`id`, NEW.`id`)) WHERE `value` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Location_live_delete" on table: "Location"
+CREATE TRIGGER `Location_live_delete` AFTER DELETE ON `Location`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) VALUES (OLD.`id`, 1) ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Resource_live_update" on table: "Resource"
+CREATE TRIGGER `Resource_live_update` AFTER UPDATE OF `id`, `name`, `deleted`, `file`, `type` ON `Resource`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT `location`, 1 FROM (SELECT `s`.`location` FROM `Content` `c` JOIN `Slot` `s` ON `s`.`id` = `c`.`slot` WHERE `c`.`resource` IN (OLD.`id`, NEW.`id`) UNION SELECT `location` FROM `Music` WHERE `resource` IN (OLD.`id`, NEW.`id`)) WHERE `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Resource_live_delete" on table: "Resource"
+CREATE TRIGGER `Resource_live_delete` AFTER DELETE ON `Resource`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT `location`, 1 FROM (SELECT `s`.`location` FROM `Content` `c` JOIN `Slot` `s` ON `s`.`id` = `c`.`slot` WHERE `c`.`resource` = OLD.`id` UNION SELECT `location` FROM `Music` WHERE `resource` = OLD.`id`) WHERE `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Files_live_update" on table: "Files"
+CREATE TRIGGER `Files_live_update` AFTER UPDATE OF `id`, `s3_urn`, `preview` ON `Files`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT `location`, 1 FROM (SELECT `s`.`location` FROM `Resource` `r` JOIN `Content` `c` ON `c`.`resource` = `r`.`id` JOIN `Slot` `s` ON `s`.`id` = `c`.`slot` WHERE `r`.`file` IN (OLD.`id`, NEW.`id`) UNION SELECT `m`.`location` FROM `Resource` `r` JOIN `Music` `m` ON `m`.`resource` = `r`.`id` WHERE `r`.`file` IN (OLD.`id`, NEW.`id`)) WHERE `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
+-- Create trigger "Files_live_delete" on table: "Files"
+CREATE TRIGGER `Files_live_delete` AFTER DELETE ON `Files`
+BEGIN
+  INSERT INTO `LiveVersion` (`location`, `version`) SELECT `location`, 1 FROM (SELECT `s`.`location` FROM `Resource` `r` JOIN `Content` `c` ON `c`.`resource` = `r`.`id` JOIN `Slot` `s` ON `s`.`id` = `c`.`slot` WHERE `r`.`file` = OLD.`id` UNION SELECT `m`.`location` FROM `Resource` `r` JOIN `Music` `m` ON `m`.`resource` = `r`.`id` WHERE `r`.`file` = OLD.`id`) WHERE `location` IS NOT NULL ON CONFLICT (`location`) DO UPDATE SET `version` = `version` + 1;
+END;
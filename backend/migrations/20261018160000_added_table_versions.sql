@@ -0,0 +1,51 @@
+-- Create "TableVersion" table
+CREATE TABLE `TableVersion` (
+  `name` varchar NOT NULL PRIMARY KEY,
+  `version` integer NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+INSERT INTO `TableVersion` (`name`, `version`) VALUES ('slot', 0), ('location', 0), ('discordscreen', 0);
+-- Create trigger "Slot_version_insert" on table: "Slot"
+CREATE TRIGGER `Slot_version_insert` AFTER INSERT ON `Slot`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'slot';
+END;
+-- Create trigger "Slot_version_update" on table: "Slot"
+CREATE TRIGGER `Slot_version_update` AFTER UPDATE ON `Slot`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'slot';
+END;
+-- Create trigger "Slot_version_delete" on table: "Slot"
+CREATE TRIGGER `Slot_version_delete` AFTER DELETE ON `Slot`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'slot';
+END;
+-- Create trigger "Location_version_insert" on table: "Location"
+CREATE TRIGGER `Location_version_insert` AFTER INSERT ON `Location`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'location';
+END;
+-- Create trigger "Location_version_update" on table: "Location"
+CREATE TRIGGER `Location_version_update` AFTER UPDATE ON `Location`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'location';
+END;
+-- Create trigger "Location_version_delete" on table: "Location"
+CREATE TRIGGER `Location_version_delete` AFTER DELETE ON `Location`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'location';
+END;
+-- Create trigger "DiscordScreen_version_insert" on table: "DiscordScreen"
+CREATE TRIGGER `DiscordScreen_version_insert` AFTER INSERT ON `DiscordScreen`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'discordscreen';
+END;
+-- Create trigger "DiscordScreen_version_update" on table: "DiscordScreen"
+CREATE TRIGGER `DiscordScreen_version_update` AFTER UPDATE ON `DiscordScreen`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'discordscreen';
+END;
+-- Create trigger "DiscordScreen_version_delete" on table: "DiscordScreen"
+CREATE TRIGGER `DiscordScreen_version_delete` AFTER DELETE ON `DiscordScreen`
+BEGIN
+  UPDATE `TableVersion` SET `version` = `version` + 1 WHERE `name` = 'discordscreen';
+END;
@@ -0,0 +1,4 @@
+-- Create "S3GcUrn" table
+CREATE TABLE `S3GcUrn` (
+  `urn` text NOT NULL PRIMARY KEY
+) WITHOUT ROWID;
@@ -0,0 +1,2 @@
+-- Create index "Booking_is_live_start_date" to table: "Booking"
+CREATE INDEX `Booking_is_live_start_date` ON `Booking` (`is_live`, `start_date`) WHERE `is_live` = 1;
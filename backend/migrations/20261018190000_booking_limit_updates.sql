@@ -0,0 +1,27 @@
+-- Backfill "content_limit" and "music_limit" of the bookings made before BookingLimit was filled
+UPDATE `Booking` SET `content_limit` = (SELECT CAST(ROUND(`Booking`.`duration` / 60000.0 / 30 * `per_half_hour`, 2) AS integer) FROM `BookingLimit` WHERE `name` = 'content') WHERE `content_limit` IS NULL;
+UPDATE `Booking` SET `music_limit` = (SELECT CAST(ROUND(`Booking`.`duration` / 60000.0 / 30 * `per_half_hour`, 2) AS integer) FROM `BookingLimit` WHERE `name` = 'music') WHERE `music_limit` IS NULL;
+-- Drop trigger "Content_limit_check" from table: "Content"
+DROP TRIGGER `Content_limit_check`;
+-- Create trigger "Content_limit_check" on table: "Content"
+CREATE TRIGGER `Content_limit_check` BEFORE INSERT ON `Content` WHEN NEW.`booking` IS NOT NULL
+BEGIN
+  SELECT RAISE(ABORT, 'Content limit full') FROM `Booking` WHERE `id` = NEW.`booking` AND `content_limit` IS NOT NULL AND `content_count` >= `content_limit`;
+END;
+-- Create trigger "Content_limit_check_update" on table: "Content"
+CREATE TRIGGER `Content_limit_check_update` BEFORE UPDATE OF `booking` ON `Content` WHEN NEW.`booking` IS NOT NULL AND NEW.`booking` IS NOT OLD.`booking`
+BEGIN
+  SELECT RAISE(ABORT, 'Content limit full') FROM `Booking` WHERE `id` = NEW.`booking` AND `content_limit` IS NOT NULL AND `content_count` >= `content_limit`;
+END;
+-- Drop trigger "Music_limit_check" from table: "Music"
+DROP TRIGGER `Music_limit_check`;
+-- Create trigger "Music_limit_check" on table: "Music"
+CREATE TRIGGER `Music_limit_check` BEFORE INSERT ON `Music` WHEN NEW.`booking` IS NOT NULL
+BEGIN
+  SELECT RAISE(ABORT, 'Music content limit full') FROM `Booking` WHERE `id` = NEW.`booking` AND `music_limit` IS NOT NULL AND `music_count` >= `music_limit`;
+END;
+-- Create trigger "Music_limit_check_update" on table: "Music"
+CREATE TRIGGER `Music_limit_check_update` BEFORE UPDATE OF `booking` ON `Music` WHEN NEW.`booking` IS NOT NULL AND NEW.`booking` IS NOT OLD.`booking`
+BEGIN
+  SELECT RAISE(ABORT, 'Music content limit full') FROM `Booking` WHERE `id` = NEW.`booking` AND `music_limit` IS NOT NULL AND `music_count` >= `music_limit`;
+END;
@@ -41,6 +41,22 @@ class BookingsClosestResponse(BaseModel):
     past_booking: Optional[FullBooking]
 
 
+class Limit(BaseModel):
+    limit: Optional[int]
+    count: int
+
+
+class BookingLimits(BaseModel):
+    content: Limit
+    music: Limit
+
+
+class ContentPlacement(BaseModel):
+    slot: int
+    resource: int
+    booking: Optional[int] = None
+
+
 class GetContentResponse(BaseModel):
     booking: Optional[int]
     slot: int
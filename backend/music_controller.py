@@ -1,19 +1,25 @@
+import json
 import asyncio
 from time import time
 import aiosqlite
 from typing import List, Dict
 
-from fastapi import APIRouter, Depends, WebSocket, Query, HTTPException, Response
+from fastapi import APIRouter, Depends, WebSocket, Query, HTTPException, Request, Response
 
 from tools import (
     db_connection,
     get_default_music,
-    connection_manager,
+    change_dispatcher,
     check_booking_owner,
+    check_limit,
+    limit_errors,
     CheckRole,
+    check_etag,
 )
 
-from settings import DEFAULT_MUSIC, DEFAULT_IMAGE, MUSIC_LIMIT
+from live_cache import live_cache
+from ordering import ORDER_STEP, plan_order
+from settings import DEFAULT_MUSIC, DEFAULT_IMAGE
 
 
 super_admin_wallet = '0x7777777777777777777777777777777777777777'
@@ -31,27 +37,25 @@ async def add_content(
 ):
 
     limit_data = await music_limit(booking, db)
-    if (limit_data['limit'] - limit_data['content_count']) <= 0:
-        raise HTTPException(status_code=403, detail="Music content limit full")
+    check_limit(limit_data, 1, "Music content limit full")
 
     user_address = user_data['user_address']
     user_role = user_data['user_role']
     if user_role == (None,):
         await check_booking_owner(booking, user_address, db)
 
-    await db.execute(
-        '''
-        INSERT INTO Music (booking, location, resource, order_id)
-        VALUES (?1, ?2, ?3, (SELECT COUNT(id)+1 FROM Music WHERE booking=?1))
-        ''',
-        (booking, location, resource),
-    )
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Music (booking, location, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Music WHERE booking IS ?1 AND location = ?2))
+            ''',
+            (booking, location, resource, ORDER_STEP),
+        )
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'location': location, 'booking': booking}])
-    )
+    change_dispatcher.notify(location=location, booking=booking)
     # asyncio.create_task(broadcast_changed_slot_if_live(slot, booking))
 
 
@@ -89,9 +93,7 @@ async def remove_music_from_playlist(
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'location': location, 'booking': booking_id}])
-    )
+    change_dispatcher.notify(location=location, booking=booking_id)
     # asyncio.create_task(broadcast_changed_slot_if_live(slot, booking_id))
     # await connection_manager.broadcast([{'slot': slot, 'booking': booking_id}])
     # if is_booking_actual(booking_id, db):
@@ -149,43 +151,54 @@ async def update_content_order(
     new_order: dict, db=Depends(db_connection), user_data=Depends(CheckRole((None,)))
 ):
 
-    music = []
+    new_order = {int(content_id): order_id for content_id, order_id in new_order.items()}
 
-    for content_id, order_id in new_order.items():
-
-        cursor = await db.execute(
-            '''
-            SELECT booking, location
+    # Every item of the playlists the payload touches, in their current order
+    cursor = await db.execute(
+        '''
+        SELECT m.id, m.order_id, m.booking, m.location
+        FROM Music m
+        JOIN (
+            SELECT DISTINCT booking, location
             FROM Music
-            WHERE id = ?1
-            ''',
-            (content_id,),
-        )
-        cursor = await cursor.fetchone()
-        booking_id, location = cursor[0:2]
-        music.append({'location': location, 'booking': booking_id})
+            WHERE id IN (SELECT value FROM json_each(?1))
+        ) p ON m.booking IS p.booking AND m.location = p.location
+        ORDER BY m.booking, m.location, m.order_id, m.id
+        ''',
+        (json.dumps(list(new_order)),),
+    )
+    playlists = {}
+    for content_id, order_id, booking_id, location in await cursor.fetchall():
+        playlists.setdefault((booking_id, location), []).append((content_id, order_id))
+
+    found = {content_id for items in playlists.values() for content_id, _ in items}
+    if not found.issuperset(new_order):
+        raise HTTPException(status_code=404, detail="There is no such content")
 
-        user_address = user_data['user_address']
-        user_role = user_data['user_role']
-        if user_role == (None,):
+    user_address = user_data['user_address']
+    user_role = user_data['user_role']
+    if user_role == (None,):
+        for booking_id in {booking_id for booking_id, _ in playlists}:
             await check_booking_owner(booking_id, user_address, db)
 
-        await db.execute(
+    updates = [
+        update
+        for items in playlists.values()
+        for update in plan_order(items, new_order)
+    ]
+    if updates:
+        await db.executemany(
             '''
             UPDATE Music
-            SET order_id = ?2
-            WHERE id = ?1
+            SET order_id = ?1
+            WHERE id = ?2
             ''',
-            (content_id, order_id),
+            updates,
         )
+        await db.commit()
 
-    await db.commit()
-
-    music_tuples = set([tuple(d.items()) for d in music])
-    unique_dicts = [dict(t) for t in music_tuples]
-
-    asyncio.create_task(connection_manager.broadcast(unique_dicts))
-    # asyncio.create_task(broadcast_changed_slot_if_live(slot, booking_id))
+    for booking_id, location in playlists:
+        change_dispatcher.notify(location=location, booking=booking_id)
 
 
 @router.get('/user/music')
@@ -201,7 +214,7 @@ async def get_user_music(
         '''
         SELECT *
         FROM Resource r
-        JOIN File f ON f.id = r.file
+        JOIN Files f ON f.id = r.file
         WHERE f.user = ?1
         ''',
         (user_address,),
@@ -215,9 +228,21 @@ async def get_user_music(
 
 @router.get('/music/live')
 async def get_active_music(
-    locations: List[str] = Query(...), db=Depends(db_connection)
+    request: Request,
+    response: Response,
+    locations: List[str] = Query(...),
 ):
 
+    return await live_cache.get(
+        'music',
+        locations,
+        load_active_music,
+        lambda etag: check_etag(request, response, etag),
+    )
+
+
+async def load_active_music(locations: List[str], db):
+
     db.row_factory = aiosqlite.Row
 
     locations_placeholders = ','.join('?' for _ in locations)
@@ -293,30 +318,14 @@ async def music_limit(
 
     cursor = await db.execute(
         '''
-    SELECT duration
+    SELECT music_limit, music_count
     FROM Booking
     WHERE id = ?1
     ''',
         (booking_id,),
     )
-    booking_duration = await cursor.fetchone()
-    if not booking_duration:
+    booking = await cursor.fetchone()
+    if not booking:
         raise HTTPException(status_code=404)
-    booking_duration = booking_duration[0]
-
-    duration_minutes = booking_duration / 60000
-    limit = (duration_minutes / 30) * MUSIC_LIMIT
-    limit = int(round(limit, 2))
-
-    cursor = await db.execute(
-        '''
-    SELECT COUNT(*)
-    FROM Music
-    WHERE booking = ?1
-    ''',
-        (booking_id,),
-    )
-    content_count = await cursor.fetchone()
-    content_count = content_count[0]
 
-    return {"limit": limit, "content_count": content_count}
+    return {"limit": booking[0], "content_count": booking[1]}
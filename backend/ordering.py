@@ -0,0 +1,102 @@
+from bisect import bisect_left
+
+
+# Distance between the order_ids of consecutive items. New items go one
+# step past the last one, and a moved item takes a key between its new
+# neighbours, so neither touches the rest of the playlist.
+ORDER_STEP = 1024
+
+
+def longest_increasing(ranks: list) -> set:
+    '''
+    Indexes of a longest strictly increasing subsequence of `ranks`.
+    '''
+
+    tails = []
+    tail_indexes = []
+    previous = [None] * len(ranks)
+
+    for i, rank in enumerate(ranks):
+        j = bisect_left(tails, rank)
+        if j == len(tails):
+            tails.append(rank)
+            tail_indexes.append(i)
+        else:
+            tails[j] = rank
+            tail_indexes[j] = i
+        previous[i] = tail_indexes[j - 1] if j else None
+
+    kept = set()
+    i = tail_indexes[-1] if tail_indexes else None
+    while i is not None:
+        kept.add(i)
+        i = previous[i]
+
+    return kept
+
+
+def plan_order(items: list, new_order: dict) -> list:
+    '''
+    `items` are the (id, order_id) of one playlist in their current order and
+    `new_order` maps ids to their new 1-based positions, as PATCH
+    /contents/order and /music/order receive them. Items left out keep their
+    current position.
+
+    Returns the (order_id, id) updates giving that order. The longest run of
+    items already in order keeps its keys and the others get keys spread in
+    the gaps between them; only when a gap is too narrow is the whole
+    playlist renumbered one ORDER_STEP apart.
+    '''
+
+    rank = {item_id: i for i, (item_id, _) in enumerate(items)}
+    keys = dict(items)
+
+    # Requested items take their positions, the others fill the rest in
+    # their current order
+    moved = sorted(
+        (item_id for item_id in rank if item_id in new_order),
+        key=lambda item_id: (new_order[item_id], rank[item_id]),
+        reverse=True,
+    )
+    rest = [item_id for item_id in reversed(rank) if item_id not in new_order]
+    target = []
+    while moved or rest:
+        if moved and (not rest or new_order[moved[-1]] <= len(target) + 1):
+            target.append(moved.pop())
+        else:
+            target.append(rest.pop())
+
+    kept = longest_increasing([rank[item_id] for item_id in target])
+
+    updates = []
+    start = 0
+    while start < len(target):
+        if start in kept:
+            start += 1
+            continue
+
+        end = start
+        while end < len(target) and end not in kept:
+            end += 1
+        count = end - start
+
+        low = keys[target[start - 1]] if start else 0
+        high = keys[target[end]] if end < len(target) else low + (count + 1) * ORDER_STEP
+        if high - low <= count:
+            return renumber(target, keys)
+
+        for i in range(count):
+            order_id = low + (high - low) * (i + 1) // (count + 1)
+            updates.append((order_id, target[start + i]))
+
+        start = end
+
+    return updates
+
+
+def renumber(target: list, keys: dict) -> list:
+    return [
+        ((i + 1) * ORDER_STEP, item_id)
+        for i, item_id in enumerate(target)
+        if keys[item_id] != (i + 1) * ORDER_STEP
+    ]
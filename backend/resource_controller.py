@@ -1,5 +1,7 @@
 import asyncio
+import secrets
 import time
+from contextlib import asynccontextmanager
 from typing import List, Optional
 
 import aiosqlite
@@ -9,19 +11,26 @@ from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
 from tools import (
     db_connection,
     s3_upload,
+    s3_upload_many,
+    upload_size,
     check_booking_owner,
+    check_limit,
+    limit_errors,
     check_system_token,
     CheckRole,
-    connection_manager,
-    broadcast_changed_slot_if_live,
+    change_dispatcher,
     delete_s3_file_if_exceeds,
     scene_socket_manager,
     delete_s3_object,
+    delete_s3_urns,
 )
 
 from content_controller import get_content
 from settings import DEFAULT_IMAGE, DEFAULT_PREVIEW, DEFAULT_MUSIC, MAX_FILE_SIZE
 from content_controller import content_limit
+from music_controller import music_limit
+from ordering import ORDER_STEP
+from change_feed import load_slot_content, load_location_music
 
 from models import GetContentResponse
 
@@ -39,15 +48,11 @@ async def image_content(
     user_data=Depends(CheckRole((None,))),
 ):
 
-    file_content = await file.read()
-    file_size = len(file_content)
-    if file_size > MAX_FILE_SIZE:
+    if upload_size(file) > MAX_FILE_SIZE:
         raise HTTPException(
             status_code=400, detail="File too large, maximum allowed size is 1MB"
         )
 
-    file.file.seek(0)
-
     if len(file_name) > 250:
         raise HTTPException(
             status_code=400, detail="file_name must not exceed 250 characters"
@@ -62,14 +67,12 @@ async def image_content(
 
     if booking:
         limit_data = await content_limit(booking, db)
-        if (limit_data['limit'] - limit_data['content_count']) <= 0:
-            raise HTTPException(status_code=403, detail="Content limit full")
+        check_limit(limit_data, 1, "Content limit full")
     
     save_path = f'{hash(user_address)}/{int(time.time())}_{file.filename}'
-    file_content = await file.read()
 
     await delete_s3_file_if_exceeds(db)
-    s3_urn = await s3_upload(save_path, file_content)
+    s3_urn = await s3_upload(save_path, file)
 
     await db.execute(
         '''
@@ -96,20 +99,18 @@ async def image_content(
     resource_id = await cursor.fetchone()
     resource_id = resource_id[0]
 
-    await db.execute(
-        '''
-        INSERT INTO Content (booking, slot, resource, order_id)
-        VALUES (?, ?, ?, (SELECT COUNT(id)+1 FROM Content WHERE booking=?1 AND slot=?2))
-        ''',
-        (booking, slot, resource_id),
-    )
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Content (booking, slot, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Content WHERE booking IS ?1 AND slot = ?2))
+            ''',
+            (booking, slot, resource_id, ORDER_STEP),
+        )
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'slot': slot, 'booking': booking}])
-    )
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking))
+    change_dispatcher.notify(slot=slot, booking=booking)
     # await connection_manager.broadcast([{'slot': slot, 'booking': booking}])
 
     return await get_content(slot_id=slot, resource_id=resource_id, db=db)
@@ -147,8 +148,7 @@ async def streaming_content(
 
     if booking:
         limit_data = await content_limit(booking, db)
-        if (limit_data['limit'] - limit_data['content_count']) <= 0:
-            raise HTTPException(status_code=403, detail="Content limit full")
+        check_limit(limit_data, 1, "Content limit full")
     
     await db.execute(
         '''
@@ -163,13 +163,14 @@ async def streaming_content(
     resource_id = await cursor.fetchone()
     resource_id = resource_id[0]
 
-    await db.execute(
-        '''
-        INSERT INTO Content (booking, slot, resource, order_id)
-        VALUES (?, ?, ?, (SELECT COUNT(id)+1 FROM Content WHERE booking=?1 AND slot=?2))
-        ''',
-        (booking, slot, resource_id),
-    )
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Content (booking, slot, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Content WHERE booking IS ?1 AND slot = ?2))
+            ''',
+            (booking, slot, resource_id, ORDER_STEP),
+        )
     await db.commit()
     cursor = await db.execute('SELECT last_insert_rowid()')
     content_id = await cursor.fetchone()
@@ -177,10 +178,7 @@ async def streaming_content(
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'slot': slot, 'booking': booking}])
-    )
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking))
+    change_dispatcher.notify(slot=slot, booking=booking)
 
     return content_id
 
@@ -210,17 +208,15 @@ async def video_content(
 
     if booking:
         limit_data = await content_limit(booking, db)
-        if (limit_data['limit'] - limit_data['content_count']) <= 0:
-            raise HTTPException(status_code=403, detail="Content limit full")
+        check_limit(limit_data, 1, "Content limit full")
     
     if preview:
         save_path = (
             f'{hash(user_address)}/{int(time.time())}_{preview.filename}-preview'
         )
 
-        preview_content = await preview.read()
         await delete_s3_file_if_exceeds(db)
-        s3_urn = await s3_upload(save_path, preview_content)
+        s3_urn = await s3_upload(save_path, preview)
     else:
         s3_urn = None
 
@@ -248,20 +244,18 @@ async def video_content(
     resource_id = await cursor.fetchone()
     resource_id = resource_id[0]
 
-    await db.execute(
-        '''
-        INSERT INTO Content (booking, slot, resource, order_id)
-        VALUES (?, ?, ?, (SELECT COUNT(id)+1 FROM Content WHERE booking=?1 AND slot=?2))
-        ''',
-        (booking, slot, resource_id),
-    )
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Content (booking, slot, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Content WHERE booking IS ?1 AND slot = ?2))
+            ''',
+            (booking, slot, resource_id, ORDER_STEP),
+        )
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'slot': slot, 'booking': booking}])
-    )
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking))
+    change_dispatcher.notify(slot=slot, booking=booking)
 
     return await get_content(slot_id=slot, resource_id=resource_id, db=db)
 
@@ -284,9 +278,8 @@ async def music_content(
         await check_booking_owner(booking, user_address, db)
 
     save_path = f'{hash(user_address)}/{int(time.time())}_{file.filename}'
-    file_content = await file.read()
     await delete_s3_file_if_exceeds(db)
-    s3_urn = await s3_upload(save_path, file_content)
+    s3_urn = await s3_upload(save_path, file)
 
     await db.execute(
         '''
@@ -313,19 +306,18 @@ async def music_content(
     resource_id = await cursor.fetchone()
     resource_id = resource_id[0]
 
-    await db.execute(
-        '''
-        INSERT INTO Music (location, booking, resource, order_id)
-        VALUES (?1, ?2, ?3, (SELECT COUNT(id)+1 FROM Music WHERE booking=?2))
-        ''',
-        (location, booking, resource_id),
-    )
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Music (location, booking, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Music WHERE booking IS ?2 AND location = ?1))
+            ''',
+            (location, booking, resource_id, ORDER_STEP),
+        )
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'location': location, 'booking': booking}])
-    )
+    change_dispatcher.notify(location=location, booking=booking)
     # asyncio.create_task(broadcast_changed_slot_if_live(slot, booking))
     # await connection_manager.broadcast([{'slot': slot, 'booking': booking}])
 
@@ -333,6 +325,170 @@ async def music_content(
     # return await get_content(slot_id=slot, resource_id=resource_id, db=db)
 
 
+def upload_names(files: List[UploadFile], file_names: Optional[List[str]]) -> list:
+    if file_names is None:
+        file_names = [file.filename for file in files]
+
+    if len(file_names) != len(files):
+        raise HTTPException(
+            status_code=400, detail="file_names must have one name per file"
+        )
+
+    if any(len(file_name) > 250 for file_name in file_names):
+        raise HTTPException(
+            status_code=400, detail="file_name must not exceed 250 characters"
+        )
+
+    return file_names
+
+
+@asynccontextmanager
+async def upload_files(
+    files: List[UploadFile], file_names: list, resource_type: str, user_address, db
+):
+    '''
+    Send `files` to S3 concurrently and add their Files and Resource rows
+    without committing. Gives the resource ids in the order of `files`;
+    commit inside the block, if it raises the uploads are deleted again.
+    '''
+
+    for _ in files:
+        if not await delete_s3_file_if_exceeds(db):
+            break
+
+    # Unique per batch, two batches in the same second may reuse file names
+    prefix = f'{hash(user_address)}/{int(time.time())}_{secrets.token_hex(4)}'
+    s3_urns = await s3_upload_many(
+        [
+            (f'{prefix}_{i}_{file.filename}', file)
+            for i, file in enumerate(files)
+        ]
+    )
+
+    try:
+        resource_ids = []
+        for s3_urn, file_name in zip(s3_urns, file_names):
+            cursor = await db.execute(
+                '''
+                INSERT INTO Files (s3_urn, user)
+                VALUES (?1, ?2)
+                RETURNING id
+                ''',
+                (s3_urn, user_address),
+            )
+            file_id = (await cursor.fetchone())[0]
+
+            cursor = await db.execute(
+                '''
+                INSERT INTO Resource (file, name, type)
+                VALUES (?1, ?2, ?3)
+                RETURNING id
+                ''',
+                (file_id, file_name, resource_type),
+            )
+            resource_ids.append((await cursor.fetchone())[0])
+
+        yield resource_ids
+    except BaseException:
+        # Not committed: the pool rolls the rows back, nothing refers to the uploads
+        await delete_s3_urns(s3_urns)
+        raise
+
+
+@router.post('/image-content/batch', response_model=List[GetContentResponse])
+async def image_content_batch(
+    slot: int,
+    booking: int = None,
+    files: List[UploadFile] = File(...),
+    file_names: List[str] = Query(None),
+    db=Depends(db_connection),
+    user_data=Depends(CheckRole((None,))),
+):
+
+    file_names = upload_names(files, file_names)
+
+    if any(upload_size(file) > MAX_FILE_SIZE for file in files):
+        raise HTTPException(
+            status_code=400, detail="File too large, maximum allowed size is 1MB"
+        )
+
+    user_address = user_data['user_address']
+    user_role = user_data['user_role']
+    if user_role == (None,):
+        if not booking:
+            raise HTTPException(status_code=403, detail="Insufficient rights")
+        await check_booking_owner(booking, user_address, db)
+
+    if booking:
+        limit_data = await content_limit(booking, db)
+        check_limit(limit_data, len(files), "Content limit full")
+
+    async with upload_files(
+        files, file_names, 'image', user_address, db
+    ) as resource_ids:
+        with limit_errors():
+            await db.executemany(
+                '''
+                INSERT INTO Content (booking, slot, resource, order_id)
+                VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Content WHERE booking IS ?1 AND slot = ?2))
+                ''',
+                [(booking, slot, resource_id, ORDER_STEP) for resource_id in resource_ids],
+            )
+
+        await db.commit()
+
+    change_dispatcher.notify(slot=slot, booking=booking)
+
+    db.row_factory = aiosqlite.Row
+    content = await load_slot_content(slot, booking, db)
+    return [el for el in content if el['resource_id'] in resource_ids]
+
+
+@router.post('/music-content/batch')
+async def music_content_batch(
+    location: str,
+    booking: int = None,
+    files: List[UploadFile] = File(...),
+    file_names: List[str] = Query(None),
+    db=Depends(db_connection),
+    user_data=Depends(CheckRole((None,))),
+):
+
+    file_names = upload_names(files, file_names)
+
+    user_address = user_data['user_address']
+    user_role = user_data['user_role']
+    if user_role == (None,):
+        if not booking:
+            raise HTTPException(status_code=403, detail="Insufficient rights")
+        await check_booking_owner(booking, user_address, db)
+
+    if booking:
+        limit_data = await music_limit(booking, db)
+        check_limit(limit_data, len(files), "Music content limit full")
+
+    async with upload_files(
+        files, file_names, 'music', user_address, db
+    ) as resource_ids:
+        with limit_errors():
+            await db.executemany(
+                '''
+                INSERT INTO Music (location, booking, resource, order_id)
+                VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Music WHERE booking IS ?2 AND location = ?1))
+                ''',
+                [(location, booking, resource_id, ORDER_STEP) for resource_id in resource_ids],
+            )
+
+        await db.commit()
+
+    change_dispatcher.notify(location=location, booking=booking)
+
+    # Same items as GET /music, which have no slot
+    db.row_factory = aiosqlite.Row
+    music = await load_location_music(location, booking, db)
+    return [el for el in music if el['resource_id'] in resource_ids]
+
+
 # @router.post('/music-content/for-tests')
 async def music_content_for_tests(
     file_name: str,
@@ -350,8 +506,7 @@ async def music_content_for_tests(
     #         raise HTTPException(status_code=403, detail="Insufficient rights")
 
     save_path = f'{hash(user_address)}/{int(time.time())}_{file.filename}'
-    file_content = await file.read()
-    s3_urn = await s3_upload(save_path, file_content)
+    s3_urn = await s3_upload(save_path, file)
 
     await db.execute(
         '''
@@ -378,19 +533,18 @@ async def music_content_for_tests(
     resource_id = await cursor.fetchone()
     resource_id = resource_id[0]
 
-    await db.execute(
-        '''
-        INSERT INTO Music (location, booking, resource, order_id)
-        VALUES (?1, ?2, ?3, (SELECT COUNT(id)+1 FROM Music WHERE booking=?2))
-        ''',
-        (location, booking, resource_id),
-    )
+    with limit_errors():
+        await db.execute(
+            '''
+            INSERT INTO Music (location, booking, resource, order_id)
+            VALUES (?1, ?2, ?3, (SELECT IFNULL(MAX(order_id), 0) + ?4 FROM Music WHERE booking IS ?2 AND location = ?1))
+            ''',
+            (location, booking, resource_id, ORDER_STEP),
+        )
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'location': location, 'booking': booking}])
-    )
+    change_dispatcher.notify(location=location, booking=booking)
 
 
 @router.patch('/video-content/{res_id}/preview')
@@ -434,9 +588,8 @@ async def patch_video_content_preview(
 
     save_path = f'{hash(user_address)}/{int(time.time())}_{preview.filename}-preview'
 
-    preview_content = await preview.read()
     await delete_s3_file_if_exceeds(db)
-    s3_urn = await s3_upload(save_path, preview_content)
+    s3_urn = await s3_upload(save_path, preview)
 
     cursor = await db.execute(
         '''
@@ -462,10 +615,7 @@ async def patch_video_content_preview(
 
     await db.commit()
 
-    asyncio.create_task(
-        connection_manager.broadcast([{'slot': slot, 'booking': booking_id}])
-    )
-    asyncio.create_task(broadcast_changed_slot_if_live(slot, booking_id))
+    change_dispatcher.notify(slot=slot, booking=booking_id)
     # await connection_manager.broadcast([{'slot': slot, 'booking': booking_id}])
 
     return res_id
@@ -481,9 +631,8 @@ async def patch_location_preview(
 
     save_path = f'location-previews/{location_id}-{int(time.time())}-preview'
 
-    preview_content = await preview.read()
     await delete_s3_file_if_exceeds(db)
-    s3_urn = await s3_upload(save_path, preview_content)
+    s3_urn = await s3_upload(save_path, preview)
 
     cursor = await db.execute(
         '''
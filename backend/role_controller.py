@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, Response
-from tools import db_connection, CheckRole, check_system_token
+from tools import db_connection, CheckRole, check_system_token, role_cache
 
 
 router = APIRouter()
@@ -40,6 +40,8 @@ async def add_admin_rights(
 
     await db.commit()
 
+    await role_cache.invalidate(address)
+
 
 @router.post('/superadmins/{address}')
 async def add_superadmin_rights(
@@ -76,6 +78,8 @@ async def add_superadmin_rights(
 
     await db.commit()
 
+    await role_cache.invalidate(address)
+
 
 @router.delete('/admins/{address}')
 async def remove_admin_rights(
@@ -93,6 +97,8 @@ async def remove_admin_rights(
 
     await db.commit()
 
+    await role_cache.invalidate(address)
+
 
 @router.get('/admins')
 async def get_all_admins(
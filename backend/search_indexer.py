@@ -0,0 +1,194 @@
+import asyncio
+import fcntl
+from time import time
+
+import aiosqlite
+import httpx
+
+from database import read_pool, write_queue
+from meilisearch.index_bookings import reindex_bookings
+from settings import (
+    DATABASE_PATH,
+    MEILISEARCH_HOST,
+    SYSTEM_TOKEN,
+    SEARCH_BATCH_SIZE,
+    SEARCH_POLL_INTERVAL,
+    SEARCH_RETRY_MAX,
+)
+
+
+class SearchIndexer:
+    '''
+    Drains SearchOutbox into the Meilisearch booking index.
+
+    Outbox rows are written by triggers in the same transaction as the
+    Booking change. They are read in id order and repeated changes of one
+    booking collapse into a single document built from its current row, or
+    a delete if the row is gone. Rows are removed only once Meilisearch has
+    accepted the batch; failures are retried with exponential backoff.
+
+    Only the worker holding the indexer file lock drains the outbox, so two
+    processes never send changes of the same booking out of order. It is
+    also the one running the startup reindex, once it has the lock.
+    '''
+
+    def __init__(self, index: str, batch_size: int, poll_interval: float, retry_max: float):
+        self.index = index
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retry_max = retry_max
+
+        self._wakeup = asyncio.Event()
+        self._lock_file = None
+
+        self.batches = 0
+        self.documents = 0
+        self.deletes = 0
+        self.coalesced = 0
+        self.failures = 0
+        self.pending = 0
+        self.lag = 0.0
+        self.last_indexed_at = None
+
+    def notify(self):
+        '''
+        Called after a committed booking change to skip the poll delay.
+        '''
+
+        self._wakeup.set()
+
+    def _acquire_lock(self) -> bool:
+        lock_file = open(f'{DATABASE_PATH}.search-indexer.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        self._lock_file = lock_file
+        return True
+
+    async def run(self):
+        while not self._acquire_lock():
+            await asyncio.sleep(self.retry_max)
+
+        asyncio.create_task(self._reindex())
+
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {SYSTEM_TOKEN}',
+        }
+        async with httpx.AsyncClient(
+            base_url=MEILISEARCH_HOST, headers=headers, timeout=30
+        ) as client:
+            failures = 0
+
+            while True:
+                try:
+                    indexed = await self._index_batch(client)
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    self.failures += 1
+                    delay = min(2**failures, self.retry_max)
+                    print(f"Search indexing failed: {e}, retrying in {delay}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                if not indexed:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+
+    async def _reindex(self):
+        try:
+            await reindex_bookings()
+        except Exception as e:
+            print(f"Search reindex failed: {e}")
+
+    async def _index_batch(self, client: httpx.AsyncClient) -> int:
+        async with read_pool.connection() as db:
+            db.row_factory = aiosqlite.Row
+
+            cursor = await db.execute(
+                '''
+                SELECT id, booking, created_at
+                FROM SearchOutbox
+                ORDER BY id
+                LIMIT ?1
+                ''',
+                (self.batch_size,),
+            )
+            changes = await cursor.fetchall()
+
+            cursor = await db.execute('SELECT COUNT(*) FROM SearchOutbox')
+            self.pending = (await cursor.fetchone())[0]
+
+            if not changes:
+                self.lag = 0.0
+                return 0
+
+            self.lag = round(time() - changes[0]['created_at'] / 1000, 3)
+
+            booking_ids = list(dict.fromkeys(change['booking'] for change in changes))
+
+            cursor = await db.execute(
+                f'''
+                SELECT *
+                FROM Booking
+                WHERE id IN ({', '.join('?' * len(booking_ids))})
+                ''',
+                booking_ids,
+            )
+            documents = [dict(row) for row in await cursor.fetchall()]
+
+        for document in documents:
+            document['is_live'] = bool(document['is_live'])
+
+        existing = {document['id'] for document in documents}
+        deleted = [booking_id for booking_id in booking_ids if booking_id not in existing]
+
+        if documents:
+            response = await client.post(
+                f'/indexes/{self.index}/documents', json=documents
+            )
+            response.raise_for_status()
+
+        if deleted:
+            response = await client.post(
+                f'/indexes/{self.index}/documents/delete-batch', json=deleted
+            )
+            response.raise_for_status()
+
+        await write_queue.execute(
+            'DELETE FROM SearchOutbox WHERE id <= ?1', (changes[-1]['id'],)
+        )
+
+        self.batches += 1
+        self.documents += len(documents)
+        self.deletes += len(deleted)
+        self.coalesced += len(changes) - len(booking_ids)
+        self.pending -= len(changes)
+        self.last_indexed_at = int(time() * 1000)
+
+        return len(changes)
+
+    def stats(self) -> dict:
+        return {
+            'active': self._lock_file is not None,
+            'pending': self.pending,
+            'lag_seconds': self.lag,
+            'batches': self.batches,
+            'documents': self.documents,
+            'deletes': self.deletes,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+            'last_indexed_at': self.last_indexed_at,
+        }
+
+
+search_indexer = SearchIndexer(
+    'booking', SEARCH_BATCH_SIZE, SEARCH_POLL_INTERVAL, SEARCH_RETRY_MAX
+)
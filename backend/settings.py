@@ -48,6 +48,46 @@ MUSIC_LIMIT = config.get('MUSIC_LIMIT')
 
 MAX_FILE_SIZE = 1 * 1024 * 1024
 
+# verified tokens kept by CheckRole and for how long (seconds)
+ROLE_CACHE_SIZE = config.auth.role_cache_size
+ROLE_CACHE_TTL = config.auth.role_cache_ttl
+
+# 'process' or 'thread' pool for signature recovery
+SIGNATURE_POOL = config.auth.signature_pool
+SIGNATURE_WORKERS = config.auth.signature_workers
+
+# verified ephemeral delegations of the auth chain
+DELEGATION_CACHE_SIZE = config.auth.delegation_cache_size
+
+DATABASE_PATH = config.database.path
+DB_READ_POOL_SIZE = config.database.read_pool_size
+DB_WRITE_POOL_SIZE = config.database.write_pool_size
+DB_MMAP_SIZE = config.database.mmap_size
+DB_CACHE_SIZE = config.database.cache_size
+DB_WRITE_BATCH_SIZE = config.database.write_batch_size
+
+# presenter slot states are written in one transaction this often (seconds)
+SLOT_STATES_FLUSH_INTERVAL = config.database.slot_states_flush_interval
+
+# outbound websocket queue per client and how long (seconds) a single send may stall
+BROADCAST_QUEUE_SIZE = config.broadcast.queue_size
+BROADCAST_LAG_BUDGET = config.broadcast.lag_budget
+
+# content changes reported within this many seconds go out as one broadcast
+BROADCAST_DEBOUNCE_WINDOW = config.broadcast.debounce_window
+
+# 'local' for a single worker, 'unix' to share broadcasts between workers on one host
+BACKPLANE = config.broadcast.backplane
+BACKPLANE_DIR = config.broadcast.backplane_dir
+
+# live content kept in memory, one entry per location or slot
+LIVE_CACHE_SIZE = config.broadcast.live_cache_size
+
+# /ws/changed/slots: events kept for resuming clients, and content lists
+# remembered to diff against
+CHANGE_FEED_REPLAY_SIZE = config.broadcast.change_feed_replay_size
+CHANGE_FEED_STATE_SIZE = config.broadcast.change_feed_state_size
+
 w3 = Web3(
     Web3.HTTPProvider(f'https://goerli.infura.io/v3/{INFURA_KEY}')
 )
@@ -63,10 +103,43 @@ FILES_BUCKET_FOLDER = (
 
 MEILISEARCH_HOST = 'http://localhost:7700'
 
+# booking outbox indexer: changes per batch, idle poll and max retry delay
+SEARCH_BATCH_SIZE = config.meilisearch.batch_size
+SEARCH_POLL_INTERVAL = config.meilisearch.poll_interval
+SEARCH_RETRY_MAX = config.meilisearch.retry_max
+
+# bookings per request of meilisearch/index_bookings.py
+SEARCH_REINDEX_CHUNK_SIZE = config.meilisearch.reindex_chunk_size
+
 # delegate streaming rights
 OWNER_ADDRESS = hex(config.get('OWNER_ADDRESS'))
 EPHEMERAL_PRIVATE_KEY = config.get('EPHEMERAL_PRIVATE_KEY')
 SIGNATURE = hex(config.get('SIGNATURE'))
 EXPIRATION = config.get('EXPIRATION').strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
 
+# streaming rights job queue: concurrent requests, attempts before a job
+# fails, backoff base and cap (seconds) and the lease of a claimed job
+STREAMING_RIGHTS_WORKERS = config.streaming_rights.workers
+STREAMING_RIGHTS_MAX_ATTEMPTS = config.streaming_rights.max_attempts
+STREAMING_RIGHTS_RETRY_BASE = config.streaming_rights.retry_base
+STREAMING_RIGHTS_RETRY_MAX = config.streaming_rights.retry_max
+STREAMING_RIGHTS_LEASE = config.streaming_rights.lease
+# signed fetch headers are reused for this many seconds
+STREAMING_RIGHTS_HEADER_TTL = config.streaming_rights.header_ttl
+
 aws_session = aioboto3.Session()
+
+# shared S3 client: HTTP connections and multipart transfer settings
+S3_MAX_CONNECTIONS = config.s3.max_connections
+S3_MULTIPART_THRESHOLD = config.s3.multipart_threshold
+S3_MULTIPART_CHUNKSIZE = config.s3.multipart_chunksize
+S3_MULTIPART_CONCURRENCY = config.s3.multipart_concurrency
+# attempts per call, retried with exponential backoff
+S3_MAX_ATTEMPTS = config.s3.max_attempts
+# files of one multi-file upload sent at the same time
+S3_UPLOAD_CONCURRENCY = config.s3.upload_concurrency
+
+# /sync/s3: DeleteObjects batches in flight, and objects younger than the
+# grace period (seconds) are kept as their rows may not be committed yet
+S3_GC_CONCURRENCY = config.s3.gc_concurrency
+S3_GC_GRACE_PERIOD = config.s3.gc_grace_period
@@ -0,0 +1,58 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+
+def recover_address(message: str, signature: str) -> str:
+    '''
+    Address that signed `message` (EIP-191 personal message).
+    Runs inside the pool workers, so this module only imports eth_account.
+    '''
+
+    return Account.recover_message(encode_defunct(text=message), signature=signature)
+
+
+class SignaturePool:
+    '''
+    Executor for secp256k1 public key recovery.
+
+    Recovery is pure Python CPU work that holds the GIL, so by default it runs
+    in worker processes (spawned, to stay clear of the event loop's threads)
+    and a burst of logins no longer stalls the websockets.
+    '''
+
+    def __init__(self, kind: str, workers: int):
+        self.kind = kind
+        self.workers = workers
+
+        self._executor = None
+
+        self.recoveries = 0
+
+    def start(self):
+        if self._executor:
+            return
+
+        if self.kind == 'process':
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix='signatures'
+            )
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def recover(self, message: str, signature: str) -> str:
+        self.start()
+        self.recoveries += 1
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, recover_address, message, signature
+        )
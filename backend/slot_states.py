@@ -0,0 +1,171 @@
+import asyncio
+
+import aiosqlite
+
+from backplane import backplane
+from database import read_pool, write_queue
+from settings import SLOT_STATES_FLUSH_INTERVAL
+
+
+class SlotStateStore:
+    '''
+    Presenter state (content index, paused) of the slots of the bookings
+    with open websockets.
+
+    The state in memory is authoritative: an update is applied on every
+    worker through the backplane and broadcast right away, while the rows
+    it changed are written to SlotStates in one transaction every
+    `flush_interval` seconds, when the last socket of a booking closes and
+    on shutdown.
+    '''
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+
+        self._states = {}
+        self._loading = {}
+        self._pending = {}
+        self._sessions = {}
+        self._dirty = {}
+        self._task = None
+
+        self.updates = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+        backplane.subscribe('slot-states', self._on_update)
+
+    def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def load(self, booking_id: int) -> list:
+        '''
+        Open a session on the booking and return its slot states.
+        '''
+
+        self._sessions[booking_id] = self._sessions.get(booking_id, 0) + 1
+
+        if booking_id not in self._states:
+            # Sessions opening while the state is read wait for the same read
+            loading = self._loading.get(booking_id)
+            if not loading:
+                # Updates arriving during the read land here and win over it
+                self._pending[booking_id] = {}
+                loading = self._loading[booking_id] = asyncio.create_task(
+                    self._fetch(booking_id)
+                )
+                loading.add_done_callback(
+                    lambda _: self._loading.pop(booking_id, None)
+                )
+            await asyncio.shield(loading)
+
+        return list(self._states[booking_id].values())
+
+    async def _fetch(self, booking_id: int):
+        try:
+            async with read_pool.connection() as db:
+                db.row_factory = aiosqlite.Row
+                cursor = await db.execute(
+                    '''
+                    SELECT *
+                    FROM SlotStates
+                    WHERE booking = ?1
+                    ''',
+                    (booking_id,),
+                )
+                states = {row['slot']: dict(row) for row in await cursor.fetchall()}
+        finally:
+            updates = self._pending.pop(booking_id)
+
+        states.update(updates)
+        if booking_id in self._sessions:
+            self._states[booking_id] = states
+
+    async def release(self, booking_id: int):
+        '''
+        Close a session; the last one writes the booking's changes and
+        drops its state from memory.
+        '''
+
+        self._sessions[booking_id] = self._sessions.get(booking_id, 1) - 1
+        if self._sessions[booking_id] > 0:
+            return
+
+        del self._sessions[booking_id]
+        await self.flush()
+        if booking_id not in self._sessions:
+            self._states.pop(booking_id, None)
+
+    async def update(self, booking_id: int, message_data: dict):
+        state = {
+            'booking': booking_id,
+            'slot': message_data.get('slot'),
+            'content_index': message_data.get('content_index'),
+            'is_paused': message_data.get('is_paused'),
+        }
+        self.updates += 1
+        self._dirty[(booking_id, state['slot'])] = state
+
+        await backplane.publish('slot-states', state)
+
+    async def _on_update(self, state: dict):
+        states = self._states.get(state['booking'], self._pending.get(state['booking']))
+        if states is not None:
+            states[state['slot']] = state
+
+    async def flush(self):
+        if not self._dirty:
+            return
+
+        states, self._dirty = self._dirty, {}
+
+        try:
+            await write_queue.executemany(
+                '''
+                INSERT OR REPLACE INTO SlotStates (booking, slot, content_index, is_paused)
+                VALUES (?1, ?2, ?3, ?4)
+                ''',
+                [
+                    (
+                        state['booking'],
+                        state['slot'],
+                        state['content_index'],
+                        state['is_paused'],
+                    )
+                    for state in states.values()
+                ],
+            )
+        except Exception as e:
+            print(f"Slot states flush failed: {e}")
+            # Keep them for the next flush unless updated meanwhile
+            for key, state in states.items():
+                self._dirty.setdefault(key, state)
+            return
+
+        self.flushes += 1
+        self.rows_written += len(states)
+
+    def stats(self) -> dict:
+        return {
+            'bookings': len(self._states),
+            'sessions': sum(self._sessions.values()),
+            'dirty': len(self._dirty),
+            'updates': self.updates,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+        }
+
+
+slot_states = SlotStateStore(SLOT_STATES_FLUSH_INTERVAL)
@@ -0,0 +1,214 @@
+import asyncio
+import io
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from time import perf_counter
+
+from aiobotocore.config import AioConfig
+from boto3.s3.transfer import TransferConfig
+
+from settings import (
+    aws_session,
+    S3_MAX_CONNECTIONS,
+    S3_MULTIPART_THRESHOLD,
+    S3_MULTIPART_CHUNKSIZE,
+    S3_MULTIPART_CONCURRENCY,
+    S3_MAX_ATTEMPTS,
+)
+
+
+class OperationStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latencies = deque(maxlen=1000)
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0
+            index = min(int(len(latencies) * p), len(latencies) - 1)
+            return round(latencies[index] * 1000, 3)
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'latency_ms_p50': percentile(0.50),
+            'latency_ms_p95': percentile(0.95),
+            'latency_ms_max': round(latencies[-1] * 1000, 3) if latencies else 0,
+        }
+
+
+class S3Client:
+    '''
+    Application-lifetime S3 client.
+
+    One aiobotocore client is opened at startup and shared by every request;
+    it keeps its own pool of up to `max_connections` HTTP connections, so
+    TLS and credential setup are paid once instead of per call. Throttled,
+    5xx and connection errors are retried up to `max_attempts` times with
+    exponential backoff.
+    '''
+
+    # DeleteObjects limit
+    max_delete_batch = 1000
+
+    def __init__(
+        self,
+        max_connections: int,
+        multipart_threshold: int,
+        multipart_chunksize: int,
+        multipart_concurrency: int,
+        max_attempts: int,
+    ):
+        self.max_connections = max_connections
+        self.max_attempts = max_attempts
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=multipart_concurrency,
+        )
+
+        self._client = None
+        self._stack = None
+        self._lock = asyncio.Lock()
+
+        self.operations = {}
+
+    async def start(self):
+        async with self._lock:
+            if self._client:
+                return
+
+            self._stack = AsyncExitStack()
+            self._client = await self._stack.enter_async_context(
+                aws_session.client(
+                    's3',
+                    config=AioConfig(
+                        max_pool_connections=self.max_connections,
+                        retries={
+                            'mode': 'standard',
+                            'total_max_attempts': self.max_attempts,
+                        },
+                    ),
+                )
+            )
+
+    async def close(self):
+        async with self._lock:
+            if self._stack:
+                await self._stack.aclose()
+            self._client = None
+            self._stack = None
+
+    async def client(self):
+        # Scripts and tests may use it without the startup hook
+        if not self._client:
+            await self.start()
+        return self._client
+
+    @asynccontextmanager
+    async def operation(self, name: str):
+        stats = self.operations.setdefault(name, OperationStats())
+        started_at = perf_counter()
+        stats.count += 1
+
+        try:
+            yield stats
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.latencies.append(perf_counter() - started_at)
+
+    async def upload(self, bucket: str, key: str, file, content_type: str):
+        '''
+        Stream `file` (bytes, a binary file object or an UploadFile) to S3.
+        Bodies above the multipart threshold are sent as a multipart upload,
+        one chunk at a time, so memory stays bounded by the chunk size.
+        '''
+
+        if isinstance(file, (bytes, bytearray)):
+            file = io.BytesIO(file)
+
+        def count_bytes(amount):
+            stats.bytes += amount
+
+        client = await self.client()
+        async with self.operation('upload') as stats:
+            await client.upload_fileobj(
+                file,
+                bucket,
+                key,
+                ExtraArgs={'ContentType': content_type},
+                Callback=count_bytes,
+                Config=self.transfer_config,
+            )
+
+    async def delete(self, bucket: str, key: str):
+        client = await self.client()
+        async with self.operation('delete'):
+            await client.delete_object(Bucket=bucket, Key=key)
+
+    async def delete_many(self, bucket: str, keys: list) -> list:
+        '''
+        Delete up to `max_delete_batch` keys with one DeleteObjects call.
+        Returns the keys S3 failed to delete.
+        '''
+
+        client = await self.client()
+        async with self.operation('delete_many'):
+            response = await client.delete_objects(
+                Bucket=bucket,
+                Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True},
+            )
+
+        return [error['Key'] for error in response.get('Errors', [])]
+
+    async def iter_key_pages(self, bucket: str, prefix: str, modified_before=None):
+        '''
+        Yield the keys under `prefix` one listing page (up to 1000) at a time,
+        optionally skipping objects modified at or after `modified_before`.
+        '''
+
+        client = await self.client()
+        pages = client.get_paginator('list_objects_v2').paginate(
+            Bucket=bucket, Prefix=prefix
+        )
+        pages = pages.__aiter__()
+
+        while True:
+            async with self.operation('list'):
+                page = await anext(pages, None)
+            if page is None:
+                return
+
+            yield [
+                obj['Key']
+                for obj in page.get('Contents', [])
+                if not modified_before or obj['LastModified'] < modified_before
+            ]
+
+    async def list_keys(self, bucket: str, prefix: str) -> list:
+        return [
+            key
+            async for keys in self.iter_key_pages(bucket, prefix)
+            for key in keys
+        ]
+
+    def stats(self) -> dict:
+        return {name: stats.stats() for name, stats in self.operations.items()}
+
+
+s3_client = S3Client(
+    S3_MAX_CONNECTIONS,
+    S3_MULTIPART_THRESHOLD,
+    S3_MULTIPART_CHUNKSIZE,
+    S3_MULTIPART_CONCURRENCY,
+    S3_MAX_ATTEMPTS,
+)
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+
+BACKEND = Path(__file__).resolve().parent.parent
+DATABASE_PATH = Path(tempfile.mkdtemp()) / 'database.sqlite'
+
+# settings.py reads config/ relative to the working directory and needs
+# these from the environment
+os.chdir(BACKEND)
+sys.path.insert(0, str(BACKEND))
+os.environ.update(
+    {
+        'DYNACONF_DATABASE__PATH': str(DATABASE_PATH),
+        'DYNACONF_W3_PRIVATE_KEY': '0x' + '11' * 32,
+        'DYNACONF_EPHEMERAL_PRIVATE_KEY': '0x' + '22' * 32,
+        'DYNACONF_JWT_SECRET': 'secret',
+        'DYNACONF_OWNER_ADDRESS': '@int 1',
+        'DYNACONF_SIGNATURE': '@int 1',
+        'DYNACONF_EXPIRATION': '2030-01-01T00:00:00',
+    }
+)
+
+db = sqlite3.connect(DATABASE_PATH)
+for migration in sorted((BACKEND / 'migrations').glob('*.sql')):
+    db.executescript(migration.read_text())
+db.close()
+
+
+@pytest.fixture(scope='session')
+def run():
+    '''
+    Runs a coroutine on the event loop shared by the tests, as the pools and
+    queues of the service are bound to the loop they were first used on.
+    '''
+
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+
+    from database import close_pools
+
+    loop.run_until_complete(close_pools())
+    loop.close()
+
+
+@pytest.fixture
+def write_queue(run):
+    from database import write_queue
+
+    async def start():
+        write_queue.start()
+
+    run(start())
+    return write_queue
+
+
+@pytest.fixture
+def database():
+    db = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+    yield db
+    db.close()
@@ -0,0 +1,220 @@
+'''
+GET /contents/live over 500 locations: the single set-based query of
+load_active_content against the per-location lookups it replaced.
+'''
+
+import random
+import sqlite3
+from time import perf_counter
+
+import aiosqlite
+import pytest
+
+from conftest import DATABASE_PATH
+from content_controller import load_active_content
+from settings import DEFAULT_IMAGE, DEFAULT_MUSIC, DEFAULT_PREVIEW
+from tools import get_default_content
+
+
+LOCATIONS = [f'bench-{i}' for i in range(500)]
+FIRST_ID = 100_000
+
+
+@pytest.fixture(scope='module')
+def locations():
+    '''
+    Three slots per location. Of every five locations, one has a live
+    booking with content, one a live booking without, one default content
+    only, one nothing and one a finished booking next to its default content.
+    '''
+
+    db = sqlite3.connect(DATABASE_PATH)
+    rng = random.Random(1)
+
+    db.execute(
+        "INSERT INTO Files (id, s3_urn, preview) VALUES (?1, 'urn', 'preview')",
+        (FIRST_ID,),
+    )
+    resources = range(FIRST_ID, FIRST_ID + 20)
+    for resource in resources:
+        db.execute(
+            '''
+            INSERT INTO Resource (id, name, type, deleted, file)
+            VALUES (?1, ?2, ?3, ?4, ?5)
+            ''',
+            (
+                resource,
+                'r',
+                'music' if resource % 3 else 'image',
+                resource % 7 == 0,
+                FIRST_ID,
+            ),
+        )
+
+    slot = booking = FIRST_ID
+    for i, location in enumerate(LOCATIONS):
+        db.execute(
+            "INSERT INTO Location (id, type, scene) VALUES (?1, 'x', 's')", (location,)
+        )
+        slots = []
+        for _ in range(3):
+            slot += 1
+            slots.append(slot)
+            db.execute(
+                '''
+                INSERT INTO Slot (id, name, supports_streaming, location)
+                VALUES (?1, 's', 1, ?2)
+                ''',
+                (slot, location),
+            )
+
+        kind = i % 5
+        if kind in (0, 1, 4):
+            booking += 1
+            db.execute(
+                'INSERT INTO Booking (id, location, is_live) VALUES (?1, ?2, ?3)',
+                (booking, location, kind != 4),
+            )
+            if kind != 1:
+                for s in slots:
+                    for order_id in range(1, 4):
+                        db.execute(
+                            '''
+                            INSERT INTO Content (order_id, booking, slot, resource)
+                            VALUES (?1, ?2, ?3, ?4)
+                            ''',
+                            (order_id, booking, s, rng.choice(resources)),
+                        )
+        if kind in (0, 1, 2, 4):
+            for s in slots[:2]:
+                for order_id in range(1, 3):
+                    db.execute(
+                        '''
+                        INSERT INTO Content (order_id, booking, slot, resource)
+                        VALUES (?1, NULL, ?2, ?3)
+                        ''',
+                        (order_id, s, rng.choice(resources)),
+                    )
+
+    db.commit()
+    db.close()
+    return LOCATIONS
+
+
+async def per_location_active_content(locations: list, db) -> dict:
+    '''
+    The lookups GET /contents/live made before: the live bookings, their
+    content, then the default content of each location without a live
+    booking, one query per location.
+    '''
+
+    db.row_factory = aiosqlite.Row
+
+    cursor = await db.execute(
+        f'''
+        SELECT id, location
+        FROM Booking
+        WHERE location IN ({','.join('?' for _ in locations)}) AND is_live = 1
+        ''',
+        locations,
+    )
+    bookings = await cursor.fetchall()
+    live_bookings = [booking['id'] for booking in bookings]
+    live_locations = [booking['location'] for booking in bookings]
+
+    cursor = await db.execute(
+        f'''
+        SELECT c.id, c.slot, r.type, f.s3_urn, c.order_id, f.preview, c.booking, s.location, r.deleted
+        FROM Content c
+        JOIN Slot s ON c.slot = s.id
+        JOIN Location l ON s.location = l.id
+        JOIN Resource r ON c.resource = r.id
+        LEFT JOIN Files f ON r.file = f.id
+        JOIN Booking b ON c.booking = b.id
+        WHERE c.booking IN ({','.join('?' for _ in live_bookings)})
+        AND s.location IN ({','.join('?' for _ in live_locations)})
+        ORDER BY c.order_id
+        ''',
+        live_bookings + live_locations,
+    )
+    content = [dict(el) for el in await cursor.fetchall()]
+    for el in content:
+        if el['deleted']:
+            el['s3_urn'] = DEFAULT_MUSIC if el['type'] == 'music' else DEFAULT_IMAGE
+            el['preview'] = DEFAULT_PREVIEW
+
+    location_dict = {}
+    for item in content:
+        location_dict.setdefault(item.pop('location'), []).append(item)
+
+    for location in locations:
+        if not location_dict.get(location):
+            if location not in live_locations:
+                location_dict[location] = await get_default_content(location, db)
+            else:
+                location_dict[location] = [{}]
+
+    return location_dict
+
+
+def by_location(content: dict) -> dict:
+    return {
+        location: sorted(
+            items, key=lambda item: (item.get('slot', 0), item.get('order_id', 0))
+        )
+        for location, items in content.items()
+    }
+
+
+def test_one_query_for_all_locations(run, locations):
+
+    async def load():
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            statements = []
+            await db.set_trace_callback(statements.append)
+            content = await load_active_content(locations, db)
+            return statements, content
+
+    statements, content = run(load())
+
+    assert len(statements) == 1
+    assert sorted(content) == sorted(locations)
+
+
+def test_same_content_as_per_location_lookups(run, locations):
+    requested = locations + ['bench-missing', locations[0]]
+
+    async def load():
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            return (
+                await load_active_content(requested, db),
+                await per_location_active_content(requested, db),
+            )
+
+    single, per_location = run(load())
+
+    assert by_location(single) == by_location(per_location)
+    assert single['bench-1'] == [{}]
+    assert single['bench-3'] == [{}]
+    assert single['bench-missing'] == [{}]
+    assert {item['booking'] for item in single['bench-4']} == {None}
+
+
+def test_benchmark(run, locations):
+
+    async def measure(load):
+        async with aiosqlite.connect(DATABASE_PATH) as db:
+            await load(locations, db)
+            started_at = perf_counter()
+            for _ in range(5):
+                await load(locations, db)
+            return (perf_counter() - started_at) / 5
+
+    single = run(measure(load_active_content))
+    per_location = run(measure(per_location_active_content))
+    print(
+        f"500 locations: one query {single * 1000:.1f} ms, "
+        f"per location {per_location * 1000:.1f} ms"
+    )
+
+    assert single < per_location
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import socket
+import tempfile
+
+import pytest
+
+from backplane import UnixSocketBackplane
+
+
+@pytest.fixture
+def directory():
+    # Short, socket paths are limited to about 100 bytes
+    return tempfile.mkdtemp(prefix='bp-')
+
+
+async def until(condition, timeout=5):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+async def started(directory, name, received=None):
+    backplane = UnixSocketBackplane(directory, name)
+    if received is not None:
+
+        async def handler(message):
+            received.append(message['i'])
+
+        backplane.subscribe('scene', handler)
+    await backplane.start()
+    return backplane
+
+
+def test_delivered_once_in_order(run, directory):
+    async def scenario():
+        local, remote = [], []
+        first = await started(directory, 'first', local)
+        second = await started(directory, 'second', remote)
+        try:
+            for i in range(100):
+                await first.publish('scene', {'i': i})
+            await until(lambda: len(remote) == 100)
+        finally:
+            await first.close()
+            await second.close()
+        return local, remote
+
+    local, remote = run(scenario())
+    assert local == remote == list(range(100))
+
+
+def test_peer_restart(run, directory):
+    async def scenario():
+        received = []
+        first = await started(directory, 'first')
+        second = await started(directory, 'second', received)
+        try:
+            await first.publish('scene', {'i': 0})
+            await until(lambda: received == [0])
+
+            # Same socket path, new process: the kept connection is gone
+            await second.close()
+            second = await started(directory, 'second', received)
+            i = 1
+            while len(received) < 2:
+                await first.publish('scene', {'i': i})
+                await asyncio.sleep(0.05)
+                i += 1
+
+            # A worker that died without closing leaves its socket behind
+            dead = os.path.join(directory, 'dead.sock')
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.bind(dead)
+            sock.close()
+            await first.publish('scene', {'i': -1})
+            await until(lambda: not os.path.exists(dead))
+        finally:
+            await first.close()
+            await second.close()
+        return received
+
+    received = run(scenario())
+    assert received[0] == 0 and received[1] > 0
+
+
+def test_full_peer_does_not_block_publish(run, directory):
+    async def scenario():
+        released = asyncio.Event()
+
+        async def stuck(reader, writer):
+            # Accepts and never reads, like a worker stuck in a handler
+            await released.wait()
+            writer.close()
+
+        received = []
+        first = await started(directory, 'first')
+        first.queue_size = 5
+        second = await started(directory, 'second', received)
+        server = await asyncio.start_unix_server(
+            stuck, path=os.path.join(directory, 'stuck.sock')
+        )
+        try:
+            async with asyncio.timeout(5):
+                for i in range(200):
+                    await first.publish('scene', {'i': i, 'pad': 'x' * 100_000})
+                    # Give the senders a turn, as the request handlers would
+                    await asyncio.sleep(0.001)
+            await until(lambda: len(received) == 200)
+        finally:
+            released.set()
+            server.close()
+            await first.close()
+            await second.close()
+        return first.dropped, received
+
+    dropped, received = run(scenario())
+    assert dropped > 0
+    assert received == list(range(200))
@@ -0,0 +1,65 @@
+import sqlite3
+
+import aiosqlite
+import pytest
+from fastapi import HTTPException
+
+from tools import check_limit, limit_errors
+
+
+@pytest.fixture
+def bookings(database):
+    database.executescript(
+        '''
+        INSERT INTO Location (id) VALUES ('limits');
+        INSERT INTO Slot (id, location) VALUES (400001, 'limits');
+        INSERT INTO Files (id, s3_urn) VALUES (400001, 'urn');
+        INSERT INTO Resource (id, name, file, type) VALUES (400001, 'r', 400001, 'image');
+        INSERT INTO Booking (id, location, duration) VALUES (400001, 'limits', 0), (400002, 'limits', 0);
+        UPDATE Booking SET content_limit = 1, music_limit = 1 WHERE id IN (400001, 400002);
+        INSERT INTO Content (booking, slot, resource) VALUES (400001, 400001, 400001);
+        INSERT INTO Music (booking, location, resource) VALUES (400001, 'limits', 400001);
+        '''
+    )
+    yield
+    database.executescript(
+        '''
+        DELETE FROM Content WHERE slot = 400001;
+        DELETE FROM Music WHERE location = 'limits';
+        DELETE FROM Booking WHERE location = 'limits';
+        DELETE FROM Resource WHERE id = 400001;
+        DELETE FROM Files WHERE id = 400001;
+        DELETE FROM Slot WHERE id = 400001;
+        DELETE FROM Location WHERE id = 'limits';
+        '''
+    )
+
+
+def test_moving_into_a_full_booking_is_rejected(database, bookings):
+    database.execute("INSERT INTO Content (booking, slot, resource) VALUES (400002, 400001, 400001)")
+
+    with pytest.raises(sqlite3.IntegrityError, match='Content limit full'):
+        database.execute('UPDATE Content SET booking = 400002 WHERE booking = 400001')
+    with pytest.raises(sqlite3.IntegrityError, match='Music content limit full'):
+        database.execute("INSERT INTO Music (booking, location, resource) VALUES (400002, 'limits', 400001)")
+        database.execute('UPDATE Music SET booking = 400002 WHERE booking = 400001')
+
+
+def test_null_limit_does_not_limit(database, bookings):
+    database.execute('UPDATE Booking SET content_limit = NULL WHERE id = 400001')
+    database.execute("INSERT INTO Content (booking, slot, resource) VALUES (400001, 400001, 400001)")
+
+    check_limit({'limit': None, 'content_count': 5}, 3, 'Content limit full')
+    with pytest.raises(HTTPException):
+        check_limit({'limit': 5, 'content_count': 3}, 3, 'Content limit full')
+
+
+def test_only_limit_errors_become_403():
+    with pytest.raises(HTTPException) as e:
+        with limit_errors():
+            raise aiosqlite.IntegrityError('Content limit full')
+    assert e.value.status_code == 403
+
+    with pytest.raises(aiosqlite.IntegrityError):
+        with limit_errors():
+            raise aiosqlite.IntegrityError('UNIQUE constraint failed: Slot.id')
@@ -0,0 +1,57 @@
+import asyncio
+from time import time
+
+from tools import BookingScheduler
+
+
+def test_transition_survives_load_and_notify_failures(run, write_queue, database):
+    now = int(time() * 1000)
+    database.executescript(
+        f'''
+        INSERT INTO Location (id) VALUES ('scheduler');
+        INSERT INTO Booking (id, location, start_date, end_date, is_live)
+        VALUES (500001, 'scheduler', {now - 1000}, {now + 3600000}, 0);
+        '''
+    )
+
+    scheduler = BookingScheduler()
+    scheduler.retry_delay = 10
+    calls = {'load': 0, 'notify': 0}
+    sent = []
+
+    async def load():
+        calls['load'] += 1
+        if calls['load'] == 1:
+            raise OSError('database is locked')
+        scheduler.schedule(500001, now - 1000, now + 3600000)
+
+    async def notify(started, finished):
+        calls['notify'] += 1
+        if calls['notify'] == 1:
+            raise OSError('broadcast failed')
+        sent.append(([b['id'] for b in started], [b['id'] for b in finished]))
+
+    scheduler._load = load
+    scheduler._notify = notify
+
+    async def scenario():
+        task = asyncio.create_task(scheduler.run())
+        try:
+            async with asyncio.timeout(5):
+                while not sent:
+                    await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+
+    run(scenario())
+
+    assert calls == {'load': 2, 'notify': 2}
+    assert sent == [([500001], [])]
+    assert database.execute('SELECT is_live FROM Booking WHERE id = 500001').fetchone() == (1,)
+
+    database.executescript(
+        '''
+        DELETE FROM Booking WHERE id = 500001;
+        DELETE FROM Location WHERE id = 'scheduler';
+        '''
+    )
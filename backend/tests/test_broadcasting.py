@@ -0,0 +1,78 @@
+import asyncio
+
+import broadcasting
+from broadcasting import FanOut
+
+
+class Socket:
+
+    def __init__(self, slow=False, broken=False):
+        self.slow = slow
+        self.broken = broken
+        self.frames = []
+        self.close_code = None
+        self._never = asyncio.Event()
+
+    async def send_text(self, frame):
+        if self.broken:
+            raise ConnectionResetError('gone')
+        if self.slow:
+            await self._never.wait()
+        self.frames.append(frame)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_slow_consumer_is_kicked_others_keep_receiving(run, monkeypatch):
+    monkeypatch.setattr(broadcasting, 'BROADCAST_QUEUE_SIZE', 5)
+
+    async def scenario():
+        fan_out = FanOut()
+        fast, other, slow = Socket(), Socket(), Socket(slow=True)
+        for socket in (fast, other, slow):
+            fan_out.add(socket)
+
+        for i in range(20):
+            fan_out.send({'i': i}, [fast, other, slow])
+            await settle()
+
+        connected = set(fan_out.channels)
+        for socket in (fast, other):
+            fan_out.remove(socket)
+        return fan_out, connected, fast, other, slow
+
+    fan_out, connected, fast, other, slow = run(scenario())
+
+    assert slow.close_code == 1013
+    assert connected == {fast, other}
+    assert fan_out.dropped_clients == 1
+    assert fast.frames == other.frames == [f'{{"i":{i}}}' for i in range(20)]
+
+
+def test_failed_socket_is_removed(run):
+    async def scenario():
+        fan_out = FanOut()
+        healthy, broken = Socket(), Socket(broken=True)
+        fan_out.add(healthy)
+        fan_out.add(broken)
+
+        fan_out.send({'i': 0}, [healthy, broken])
+        await settle()
+        fan_out.send({'i': 1}, [healthy, broken])
+        await settle()
+
+        connected = set(fan_out.channels)
+        fan_out.remove(healthy)
+        return fan_out, connected, healthy
+
+    fan_out, connected, healthy = run(scenario())
+
+    assert connected == {healthy}
+    assert fan_out.frames == 3
+    assert fan_out.dropped_clients == 0
@@ -0,0 +1,60 @@
+import asyncio
+
+from database import ConnectionPool
+
+
+def test_waiter_gets_a_connection_when_rollback_fails(run):
+    pool = ConnectionPool('test', 1)
+
+    async def use():
+        db = await pool.acquire()
+        await db.execute('BEGIN')
+
+        async def failing_rollback():
+            raise RuntimeError('disk I/O error')
+
+        db.rollback = failing_rollback
+
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        await pool.release(db)
+
+        replacement = await asyncio.wait_for(waiter, 5)
+        assert replacement is not db
+        assert pool.stats()['opened'] == 1
+
+        cursor = await replacement.execute('SELECT 1')
+        assert await cursor.fetchone() == (1,)
+        await pool.release(replacement)
+        await pool.close()
+
+    run(use())
+
+
+def test_waiter_gets_a_connection_when_opening_fails(run):
+    pool = ConnectionPool('test', 1)
+    opened = pool._open
+    attempts = []
+
+    async def open_once_failing():
+        attempts.append(None)
+        if len(attempts) == 1:
+            await asyncio.sleep(0.05)
+            raise RuntimeError('unable to open database file')
+        return await opened()
+
+    pool._open = open_once_failing
+
+    async def use():
+        first = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(pool.acquire())
+
+        results = await asyncio.wait_for(
+            asyncio.gather(first, second, return_exceptions=True), 5
+        )
+        assert isinstance(results[0], RuntimeError)
+        await pool.release(results[1])
+        await pool.close()
+
+    run(use())
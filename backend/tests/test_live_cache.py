@@ -0,0 +1,105 @@
+import json
+import sqlite3
+
+import pytest
+
+from conftest import DATABASE_PATH
+from live_cache import LiveCache
+
+
+@pytest.fixture(scope='module')
+def locations():
+    db = sqlite3.connect(DATABASE_PATH)
+    db.executescript(
+        '''
+        INSERT INTO Location (id) VALUES ('cache-a'), ('cache-b');
+        INSERT INTO Slot (id, location) VALUES (200001, 'cache-a'), (200002, 'cache-b');
+        INSERT INTO Files (id, s3_urn) VALUES (200001, 'urn');
+        INSERT INTO Resource (id, name, file, type) VALUES (200001, 'r', 200001, 'image');
+        '''
+    )
+    db.commit()
+    db.close()
+    return ['cache-a', 'cache-b']
+
+
+class Loader:
+
+    def __init__(self):
+        self.loaded = []
+
+    async def __call__(self, keys, db):
+        self.loaded.append(keys)
+        cursor = await db.execute(
+            '''
+            SELECT s.location, COUNT(c.id)
+            FROM Slot s LEFT JOIN Content c ON c.slot = s.id
+            WHERE s.location IN (SELECT value FROM json_each(?1))
+            GROUP BY s.location
+            ''',
+            (json.dumps(keys),),
+        )
+        return dict(await cursor.fetchall())
+
+
+def get(run, cache, keys, load):
+    tags = []
+    values = run(cache.get('contents', keys, load, tags.append))
+    return tags[0], values
+
+
+def test_workers_agree_on_the_tag(run, locations):
+    first, second = LiveCache(100), LiveCache(100)
+
+    assert get(run, first, locations, Loader()) == get(run, second, locations, Loader())
+
+
+def test_write_rebuilds_only_its_location(run, locations):
+    cache, load = LiveCache(100), Loader()
+    tag, values = get(run, cache, locations, load)
+    assert get(run, cache, locations, load) == (tag, values)
+    assert load.loaded == [locations]
+
+    # Written outside the service, as a script would
+    db = sqlite3.connect(DATABASE_PATH)
+    db.execute('INSERT INTO Content (order_id, slot, resource) VALUES (1, 200001, 200001)')
+    db.commit()
+    db.close()
+
+    new_tag, new_values = get(run, cache, locations, load)
+    assert new_tag != tag
+    assert new_values == {'cache-a': values['cache-a'] + 1, 'cache-b': values['cache-b']}
+    assert load.loaded == [locations, ['cache-a']]
+    assert get(run, LiveCache(100), locations, Loader())[0] == new_tag
+
+
+def test_unrelated_writes_keep_the_entries(run, locations):
+    cache, load = LiveCache(100), Loader()
+    tag, _ = get(run, cache, locations, load)
+
+    db = sqlite3.connect(DATABASE_PATH)
+    db.execute("INSERT INTO Files (s3_urn) VALUES ('upload')")
+    db.execute("INSERT INTO Resource (name, type) VALUES ('upload', 'image')")
+    db.execute("INSERT INTO Booking (id, location, is_live) VALUES (200001, 'cache-a', 0)")
+    db.execute("UPDATE Booking SET title = 'renamed' WHERE id = 200001")
+    db.commit()
+    db.close()
+
+    assert get(run, cache, locations, load)[0] == tag
+    assert len(load.loaded) == 1
+
+
+def test_matching_tag_skips_the_build(run, locations):
+    cache, load = LiveCache(100), Loader()
+    tag, _ = get(run, cache, locations, load)
+
+    class NotModified(Exception):
+        pass
+
+    def check_etag(etag):
+        if etag == tag:
+            raise NotModified
+
+    with pytest.raises(NotModified):
+        run(LiveCache(100).get('contents', locations, load, check_etag))
+    assert len(load.loaded) == 1
@@ -0,0 +1,136 @@
+'''
+The read queries of the backend modules must be answered from the indexes
+the migrations create, never by a full scan of a watched table.
+
+The queries are taken from the source of the modules, so a query changed
+in a controller is checked as it is.
+'''
+
+import ast
+import re
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+
+BACKEND = Path(__file__).resolve().parent.parent
+MIGRATIONS = BACKEND / 'migrations'
+WATCHED = ('Booking', 'Content', 'Music', 'Files', 'Resource', 'Discord')
+
+# Interpolated clauses built by the handlers, rendered with their leading filter
+CLAUSES = {
+    ('content_controller', 'where_sql'): 's.id = ? AND c.booking IS ?',
+    ('music_controller', 'where_sql'): 'm.location = ? AND m.booking IS ?',
+    ('music_controller', 'bookings_condition'): 'IN (?, ?)',
+    ('music_controller', 'locations_condition'): 'IN (?, ?)',
+}
+
+
+def render(module: str, node) -> str:
+    '''
+    SQL of a string literal, with the interpolations of an f-string turned
+    into placeholders.
+    '''
+
+    if isinstance(node, ast.Constant):
+        return node.value
+
+    sql = ''
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            sql += value.value
+        elif (module, ast.unparse(value.value)) in CLAUSES:
+            sql += CLAUSES[(module, ast.unparse(value.value))]
+        elif re.search(r'\bIN\s*$', sql, re.IGNORECASE):
+            # A tuple rendered as a list of literals
+            sql += '(?, ?)'
+        elif sql.rstrip().endswith('('):
+            sql += '?, ?'
+        else:
+            raise AssertionError(
+                f'{module}:{node.lineno}: unknown interpolation {ast.unparse(value)}'
+            )
+    return sql
+
+
+def read_queries() -> dict:
+    queries = {}
+    for path in sorted(BACKEND.glob('*.py')):
+        module = path.stem
+        tree = ast.parse(path.read_text())
+
+        parts = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.JoinedStr):
+                parts.update(id(value) for value in node.values)
+
+        for node in ast.walk(tree):
+            if id(node) in parts:
+                continue
+            if not isinstance(node, ast.JoinedStr) and not (
+                isinstance(node, ast.Constant) and isinstance(node.value, str)
+            ):
+                continue
+            head = node.values[0] if isinstance(node, ast.JoinedStr) else node
+            if isinstance(head, ast.Constant) and re.match(
+                r'\s*(SELECT|WITH)\b', head.value, re.IGNORECASE
+            ):
+                queries[f'{module}:{node.lineno}'] = render(module, node)
+    return queries
+
+
+QUERIES = read_queries()
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = sqlite3.connect(':memory:')
+    for migration in sorted(MIGRATIONS.glob('*.sql')):
+        db.executescript(migration.read_text())
+    db.execute('ANALYZE')
+    yield db
+    db.close()
+
+
+def query_plan(db, sql: str) -> list:
+    try:
+        return db.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+    except sqlite3.ProgrammingError as e:
+        # Bind NULL to every placeholder, the plan does not depend on values
+        count = int(re.search(r'uses (\d+)', str(e))[1])
+        return db.execute(f'EXPLAIN QUERY PLAN {sql}', (None,) * count).fetchall()
+
+
+def full_scans(sql: str, plan: list) -> list:
+    '''
+    Plan steps reading every row of a watched table, straight or through
+    an index that does not cover the query.
+    '''
+
+    names = {table: table for table in WATCHED}
+    for table, alias in re.findall(
+        rf'\b({"|".join(WATCHED)})\s+(?:AS\s+)?(\w+)', sql, re.IGNORECASE
+    ):
+        names[alias] = table
+
+    scans = []
+    for *_, detail in plan:
+        match = re.match(r'SCAN (\w+)(.*)', detail)
+        if not match or match[1] not in names:
+            continue
+        if 'COVERING INDEX' in match[2]:
+            continue
+        scans.append(detail)
+    return scans
+
+
+def test_queries_are_found():
+    assert len(QUERIES) > 50
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_no_full_scan(db, name):
+    sql = QUERIES[name]
+    plan = query_plan(db, sql)
+    assert not full_scans(sql, plan), plan
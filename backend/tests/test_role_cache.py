@@ -0,0 +1,29 @@
+from tools import RoleCache
+
+
+def claims(address):
+    return {'signer_address': address, 'expired_at': '2030-01-01T00:00:00'}
+
+
+def test_role_read_before_invalidation_is_not_cached(run):
+    cache = RoleCache(100, 60)
+    generation = cache.generation('0xAbc')
+    other = cache.generation('0xdef')
+
+    # The role changes while the old one is being read
+    run(cache._on_invalidate({'address': '0xabc'}))
+    cache.put('token-a', claims('0xAbc'), ('admin',), generation)
+    cache.put('token-b', claims('0xdef'), ('user',), other)
+
+    assert cache.get('token-a') is None
+    assert cache.get('token-b') == (claims('0xdef'), ('user',))
+
+
+def test_invalidating_everyone_bumps_every_generation(run):
+    cache = RoleCache(100, 60)
+    generation = cache.generation('0xabc')
+
+    run(cache._on_invalidate({'address': None}))
+    cache.put('token-a', claims('0xabc'), ('admin',), generation)
+
+    assert cache.get('token-a') is None
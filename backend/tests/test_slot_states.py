@@ -0,0 +1,56 @@
+import asyncio
+
+from slot_states import SlotStateStore
+
+
+def test_concurrent_sessions_share_one_read(run, database):
+    database.execute(
+        'INSERT INTO SlotStates (booking, slot, content_index, is_paused) VALUES (1, 1, 3, 1)'
+    )
+    store = SlotStateStore(flush_interval=60)
+
+    async def open_sessions():
+        return await asyncio.gather(store.load(1), store.load(1), store.load(1))
+
+    for states in run(open_sessions()):
+        assert [(s['slot'], s['content_index'], s['is_paused']) for s in states] == [
+            (1, 3, 1)
+        ]
+
+
+def test_update_during_read_wins(run, database):
+    database.execute(
+        'INSERT INTO SlotStates (booking, slot, content_index, is_paused) VALUES (2, 1, 0, 0)'
+    )
+    store = SlotStateStore(flush_interval=60)
+
+    async def open_session():
+        loading = asyncio.create_task(store.load(2))
+        await asyncio.sleep(0)
+        await store._on_update(
+            {'booking': 2, 'slot': 1, 'content_index': 5, 'is_paused': 0}
+        )
+        return await loading
+
+    assert [s['content_index'] for s in run(open_session())] == [5]
+
+
+def test_no_state_lost_on_clean_shutdown(run, write_queue, database):
+    store = SlotStateStore(flush_interval=60)
+
+    async def present():
+        await store.load(3)
+        await store.update(3, {'slot': 1, 'content_index': 7, 'is_paused': True})
+        await store.update(3, {'slot': 2, 'content_index': 2, 'is_paused': False})
+        await store.close()
+
+    run(present())
+
+    rows = database.execute(
+        'SELECT slot, content_index, is_paused FROM SlotStates WHERE booking = 3 ORDER BY slot'
+    ).fetchall()
+    assert rows == [(1, 7, 1), (2, 2, 0)]
+
+    restarted = SlotStateStore(flush_interval=60)
+    states = run(restarted.load(3))
+    assert sorted((s['slot'], s['content_index'], s['is_paused']) for s in states) == rows
@@ -0,0 +1,189 @@
+'''
+S3Client against moto's S3 server, reached through a proxy that can answer
+the next requests with 503 SlowDown, as S3 does when throttling.
+'''
+
+import io
+import os
+import socket
+import threading
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from botocore.exceptions import ClientError
+from moto.server import ThreadedMotoServer
+
+from storage import S3Client
+
+
+BUCKET = 'test-bucket'
+PART_SIZE = 5 * 1024 * 1024  # smallest part S3 accepts
+
+SLOW_DOWN = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>'
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class ThrottlingProxy(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    upstream = None
+    failures = 0
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def handle_request(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        proxy = type(self)
+        proxy.requests.append((self.command, self.path))
+
+        if proxy.failures:
+            proxy.failures -= 1
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(SLOW_DOWN)))
+            self.end_headers()
+            self.wfile.write(SLOW_DOWN)
+            return
+
+        upstream = http.client.HTTPConnection(*proxy.upstream)
+        headers = {k: v for k, v in self.headers.items() if k.lower() != 'expect'}
+        upstream.request(self.command, self.path, body, headers)
+        response = upstream.getresponse()
+        data = response.read()
+        upstream.close()
+
+        self.send_response(response.status)
+        for key, value in response.getheaders():
+            if key.lower() not in ('content-length', 'transfer-encoding', 'connection'):
+                self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = handle_request
+
+
+@pytest.fixture(scope='module')
+def proxy():
+    moto_port = free_port()
+    moto = ThreadedMotoServer(ip_address='127.0.0.1', port=moto_port)
+    moto.start()
+
+    ThrottlingProxy.upstream = ('127.0.0.1', moto_port)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingProxy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    environ = dict(os.environ)
+    os.environ.update(
+        {
+            'AWS_ENDPOINT_URL': f'http://127.0.0.1:{server.server_port}',
+            'AWS_ACCESS_KEY_ID': 'test',
+            'AWS_SECRET_ACCESS_KEY': 'test',
+            'AWS_DEFAULT_REGION': 'us-east-1',
+        }
+    )
+    yield ThrottlingProxy
+
+    os.environ.clear()
+    os.environ.update(environ)
+    server.shutdown()
+    moto.stop()
+
+
+@pytest.fixture(scope='module')
+def s3(proxy, run):
+    s3 = S3Client(
+        max_connections=4,
+        multipart_threshold=PART_SIZE,
+        multipart_chunksize=PART_SIZE,
+        multipart_concurrency=2,
+        max_attempts=3,
+    )
+    run(s3.start())
+    run(s3._client.create_bucket(Bucket=BUCKET))
+    yield s3
+    run(s3.close())
+
+
+@pytest.fixture(autouse=True)
+def reset(proxy):
+    proxy.failures = 0
+    proxy.requests.clear()
+
+
+def get_body(run, s3, key):
+
+    async def get():
+        response = await s3._client.get_object(Bucket=BUCKET, Key=key)
+        async with response['Body'] as body:
+            return await body.read()
+
+    return run(get())
+
+
+def test_small_upload_is_a_single_put(run, s3, proxy):
+    run(s3.upload(BUCKET, 'small', b'x' * 1024, 'image/png'))
+
+    assert proxy.requests == [('PUT', f'/{BUCKET}/small')]
+    assert get_body(run, s3, 'small') == b'x' * 1024
+
+
+def test_large_upload_is_streamed_in_parts(run, s3, proxy):
+    data = os.urandom(2 * PART_SIZE + 1024)
+    run(s3.upload(BUCKET, 'large', io.BytesIO(data), 'audio/mpeg'))
+
+    requests = [(method, path.split('?')[1].split('&')[0]) for method, path in proxy.requests]
+    assert requests[0] == ('POST', 'uploads')
+    assert sorted(requests[1:-1]) == [
+        ('PUT', 'partNumber=1'),
+        ('PUT', 'partNumber=2'),
+        ('PUT', 'partNumber=3'),
+    ]
+    assert requests[-1][0] == 'POST' and requests[-1][1].startswith('uploadId=')
+    assert get_body(run, s3, 'large') == data
+    assert s3.operations['upload'].bytes >= len(data)
+
+
+def test_throttled_call_is_retried(run, s3, proxy):
+    errors = s3.stats().get('delete_many', {}).get('errors', 0)
+    run(s3.upload(BUCKET, 'retried', b'data', 'image/png'))
+
+    proxy.failures = 2
+    proxy.requests.clear()
+    assert run(s3.delete_many(BUCKET, ['retried'])) == []
+
+    assert len(proxy.requests) == 3
+    assert s3.operations['delete_many'].errors == errors
+    assert run(s3.list_keys(BUCKET, 'retried')) == []
+
+
+def test_gives_up_after_max_attempts(run, s3, proxy):
+    proxy.failures = 3
+
+    with pytest.raises(ClientError) as error:
+        run(s3.delete(BUCKET, 'missing'))
+
+    assert error.value.response['Error']['Code'] == 'SlowDown'
+    assert len(proxy.requests) == 3
+    assert s3.operations['delete'].errors == 1
+
+
+def test_list_keys_pages(run, s3, proxy):
+    run(s3.upload(BUCKET, 'listed/a', b'a', 'image/png'))
+    run(s3.upload(BUCKET, 'listed/b', b'b', 'image/png'))
+
+    assert sorted(run(s3.list_keys(BUCKET, 'listed/'))) == ['listed/a', 'listed/b']
+    assert run(s3.delete_many(BUCKET, ['listed/a', 'listed/b'])) == []
+    assert run(s3.list_keys(BUCKET, 'listed/')) == []
@@ -0,0 +1,148 @@
+'''
+StreamingRightsQueue against a stand-in worlds content server that checks
+the signed fetch headers and answers per address: `ok` succeeds, `flaky`
+fails twice with 503, `down` always does and `bad` gets a 400.
+'''
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+import delegate_streaming_rights
+from delegate_streaming_rights import EPHEMERAL_ADDRESS, StreamingRightsQueue
+
+
+class ContentServer(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    requests = []
+    errors = {}
+
+    def log_message(self, *args):
+        pass
+
+    def handle_request(self):
+        auth_chain = [
+            json.loads(self.headers[f'x-identity-auth-chain-{i}']) for i in range(3)
+        ]
+        timestamp = self.headers['x-identity-timestamp']
+        payload = f'{self.command.lower()}:{self.path}:{timestamp}:'
+        signer = Account.recover_message(
+            encode_defunct(text=payload), signature=auth_chain[2]['signature']
+        )
+        assert auth_chain[2]['payload'] == payload
+        assert signer == EPHEMERAL_ADDRESS
+
+        address = self.path.rsplit('/', 1)[1]
+        type(self).requests.append((self.command, address))
+        attempts = sum(1 for _, a in type(self).requests if a == address)
+
+        if 'bad' in address:
+            status = 400
+        elif 'down' in address or ('flaky' in address and attempts <= 2):
+            status = 503
+        else:
+            status = 204
+
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    do_PUT = do_DELETE = handle_request
+
+
+@pytest.fixture(scope='module')
+def content_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ContentServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    url = delegate_streaming_rights.CONTENT_SERVER_URL
+    delegate_streaming_rights.CONTENT_SERVER_URL = f'http://127.0.0.1:{server.server_port}'
+    yield ContentServer
+
+    delegate_streaming_rights.CONTENT_SERVER_URL = url
+    server.shutdown()
+
+
+@pytest.fixture
+def queue(write_queue, content_server):
+    content_server.requests.clear()
+    return StreamingRightsQueue(
+        workers=4, max_attempts=3, retry_base=0.05, retry_max=0.2, lease=30
+    )
+
+
+def process(run, queue, database, world: str, timeout: float = 10) -> dict:
+    '''
+    Run the queue until the jobs of `world` are finished and return their
+    (method, status, attempts) by address.
+    '''
+
+    async def wait():
+        worker = asyncio.create_task(queue.run())
+        deadline = time.monotonic() + timeout
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                active = database.execute(
+                    '''
+                    SELECT COUNT(*) FROM StreamingRightsJob
+                    WHERE world = ?1 AND status IN ('pending', 'running')
+                    ''',
+                    (world,),
+                ).fetchone()[0]
+                if not active:
+                    break
+        finally:
+            worker.cancel()
+            await asyncio.gather(worker, return_exceptions=True)
+
+    run(wait())
+
+    jobs = database.execute(
+        '''
+        SELECT address, method, status, attempts FROM StreamingRightsJob
+        WHERE world = ?1 ORDER BY id
+        ''',
+        (world,),
+    ).fetchall()
+    return {address: (method, status, attempts) for address, method, status, attempts in jobs}
+
+
+def test_jobs_are_signed_sent_and_retried(run, queue, database):
+    for address in ('0xok', '0xflaky', '0xbad'):
+        run(queue.enqueue('put', 'sent.dcl.eth', address))
+
+    assert process(run, queue, database, 'sent.dcl.eth') == {
+        '0xok': ('put', 'done', 1),
+        '0xflaky': ('put', 'done', 3),
+        '0xbad': ('put', 'failed', 1),
+    }
+    assert queue.succeeded == 2 and queue.failed == 1 and queue.retried == 2
+
+
+def test_retries_stop_at_max_attempts(run, queue, database, content_server):
+    run(queue.enqueue('delete', 'down.dcl.eth', '0xdown'))
+
+    assert process(run, queue, database, 'down.dcl.eth') == {
+        '0xdown': ('delete', 'failed', 3),
+    }
+    assert content_server.requests == [('DELETE', '0xdown')] * 3
+
+
+def test_latest_intent_wins(run, queue, database, content_server):
+    first = run(queue.enqueue('put', 'intent.dcl.eth', '0xok'))
+    assert run(queue.enqueue('put', 'intent.dcl.eth', '0xok')) == first
+    run(queue.enqueue('delete', 'intent.dcl.eth', '0xok'))
+
+    assert process(run, queue, database, 'intent.dcl.eth') == {
+        '0xok': ('delete', 'done', 1),
+    }
+    assert content_server.requests == [('DELETE', '0xok')]
+    assert queue.superseded == 1
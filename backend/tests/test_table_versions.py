@@ -0,0 +1,32 @@
+import sqlite3
+
+from conftest import DATABASE_PATH
+from database import TableVersions
+
+
+def write(sql):
+    db = sqlite3.connect(DATABASE_PATH)
+    db.execute(sql)
+    db.commit()
+    db.close()
+
+
+def test_workers_agree_on_the_tag(run):
+    first, second = TableVersions(), TableVersions()
+    tag = run(first.version(['slot', 'location']))
+
+    assert run(second.version(['slot', 'location'])) == tag
+
+
+def test_external_write_moves_only_its_table(run):
+    first, second = TableVersions(), TableVersions()
+    slot = run(first.version(['slot']))
+    discord = run(first.version(['discordscreen']))
+
+    # Written outside the service, as a trigger or another worker would
+    write("INSERT INTO Location (id) VALUES ('versions-a')")
+    write("INSERT INTO Slot (id, location) VALUES (300001, 'versions-a')")
+
+    assert run(first.version(['slot'])) != slot
+    assert run(second.version(['slot'])) == run(first.version(['slot']))
+    assert run(second.version(['discordscreen'])) == discord
@@ -0,0 +1,48 @@
+import asyncio
+
+
+INSERT = 'INSERT INTO SlotStates (booking, slot, content_index) VALUES (?1, ?2, ?3)'
+
+
+def test_broken_transaction_fails_its_group_and_queue_goes_on(
+    run, write_queue, database
+):
+
+    async def write():
+        # Releasing the job's savepoint from inside the job makes the queue's
+        # own RELEASE and ROLLBACK TO fail
+        results = await asyncio.gather(
+            write_queue.execute(INSERT, (100, 1, 1)),
+            write_queue.submit([('RELEASE job', ())]),
+            return_exceptions=True,
+        )
+        after = await asyncio.wait_for(write_queue.execute(INSERT, (100, 2, 2)), 5)
+        return results, after
+
+    (first, broken), after = run(write())
+
+    assert isinstance(first, Exception)
+    assert isinstance(broken, Exception)
+    assert after == []
+    assert database.execute(
+        'SELECT slot FROM SlotStates WHERE booking = 100'
+    ).fetchall() == [(2,)]
+
+
+def test_failing_job_does_not_affect_its_group(run, write_queue, database):
+
+    async def write():
+        return await asyncio.gather(
+            write_queue.execute(INSERT, (101, 1, 1)),
+            write_queue.execute(INSERT, (101, 1, 1)),
+            write_queue.execute(INSERT, (101, 2, 2)),
+            return_exceptions=True,
+        )
+
+    first, duplicate, third = run(write())
+
+    assert first == [] and third == []
+    assert isinstance(duplicate, Exception)
+    assert database.execute(
+        'SELECT slot FROM SlotStates WHERE booking = 101 ORDER BY slot'
+    ).fetchall() == [(1,), (2,)]
@@ -2,7 +2,12 @@ import aiosqlite
 import aioboto3
 import jwt
 import asyncio
+import hashlib
+import heapq
 import json
+import fcntl
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from botocore.exceptions import ClientError
 
@@ -10,7 +15,7 @@ from typing import List
 from time import time
 
 from eth_account.messages import encode_defunct
-from fastapi import HTTPException, WebSocket, Depends, Request
+from fastapi import HTTPException, WebSocket, Depends, Request, Response, UploadFile
 from fastapi.security import HTTPBearer, APIKeyHeader
 
 from eth_utils import is_address
@@ -26,8 +31,25 @@ from settings import (
     DEFAULT_IMAGE,
     DEFAULT_PREVIEW,
     DEFAULT_MUSIC,
+    ROLE_CACHE_SIZE,
+    ROLE_CACHE_TTL,
+    SIGNATURE_POOL,
+    SIGNATURE_WORKERS,
+    DELEGATION_CACHE_SIZE,
+    S3_GC_CONCURRENCY,
+    S3_UPLOAD_CONCURRENCY,
+    BROADCAST_DEBOUNCE_WINDOW,
+    CONTENT_LIMIT,
+    MUSIC_LIMIT,
+    DATABASE_PATH,
 )
 from settings import w3, aws_session, config
+from database import read_pool, write_pool, write_queue, table_versions
+from broadcasting import FanOut
+from backplane import backplane
+from change_feed import change_feed
+from signatures import SignaturePool
+from storage import s3_client
 
 from delegate_streaming_rights import delegate_streaming_rights, revoke_streaming_rights
 from models import SocketMessage
@@ -36,20 +58,51 @@ from models import SocketMessage
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.feed_connections: List[WebSocket] = []
+        self.fan_out = FanOut()
+        backplane.subscribe('changed-slots', self._deliver)
+
+    async def connect(
+        self, websocket: WebSocket, since: int = None, epoch: str = None
+    ):
+        '''
+        Without `since` the socket gets the plain [{slot, booking}] hints,
+        with it the change feed, starting with what it missed after `since`.
+        '''
 
-    async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.fan_out.add(websocket)
+
+        if since is None:
+            self.active_connections.append(websocket)
+            return
+
+        # No await until registered, so no event falls between the two
+        self.feed_connections.append(websocket)
+        for frame in change_feed.resume(since, epoch):
+            self.fan_out.send(frame, [websocket])
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        if websocket in self.feed_connections:
+            self.feed_connections.remove(websocket)
+        self.fan_out.remove(websocket)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_json(message)
+        self.fan_out.send(message, [websocket])
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        await backplane.publish('changed-slots', message)
+
+    async def _deliver(self, message: str):
+        self.fan_out.send(message, self.active_connections)
+
+        if self.feed_connections:
+            event = await change_feed.record(message)
+            self.fan_out.send(event, self.feed_connections)
+        else:
+            change_feed.skip()
 
 
 connection_manager = ConnectionManager()
@@ -58,35 +111,84 @@ connection_manager = ConnectionManager()
 class BookingSocketManager:
     def __init__(self):
         self.active_connections: dict[int, List[WebSocket]] = {}
+        self.fan_out = FanOut()
+        backplane.subscribe('booking', self._deliver)
 
     async def connect(self, websocket: WebSocket, booking_id: int):
         await websocket.accept()
         if booking_id not in self.active_connections:
             self.active_connections[booking_id] = []
         self.active_connections[booking_id].append(websocket)
+        self.fan_out.add(websocket)
 
     def disconnect(self, websocket: WebSocket, booking_id: int):
+        self.fan_out.remove(websocket)
+        if websocket not in self.active_connections.get(booking_id, []):
+            return
         self.active_connections[booking_id].remove(websocket)
         if not self.active_connections[booking_id]:
             del self.active_connections[booking_id]
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_json(message)
+        self.fan_out.send(message, [websocket])
 
     async def broadcast(self, message: str, booking_id: int):
+        await backplane.publish(
+            'booking', {'booking_id': booking_id, 'message': message}
+        )
+
+    async def _deliver(self, data: dict):
+        booking_id = data['booking_id']
         if booking_id in self.active_connections:
-            for connection in self.active_connections[booking_id]:
-                await connection.send_json(message)
+            self.fan_out.send(data['message'], self.active_connections[booking_id])
 
 
 booking_socket_manager = BookingSocketManager()
 
 
-async def db_connection():
-    async with aiosqlite.connect('database.sqlite', timeout=30) as db:
+async def db_connection(request: Request):
+    pool = read_pool if request.method in ('GET', 'HEAD') else write_pool
+    async with pool.connection() as db:
         yield db
 
 
+class ConditionalGet:
+    '''
+    ETag from the TableVersion counters of the tables a response is built from.
+
+    A matching If-None-Match is answered with 304 before anything else runs,
+    so declare it ahead of db_connection. The tag is taken before the
+    handler reads, so a body is never older than its tag. Responses served
+    from live_cache are tagged with its versions instead (check_etag).
+    '''
+
+    def __init__(self, *tables: str, cache_control: str = 'no-cache'):
+        self.tables = [table.lower() for table in tables]
+        self.cache_control = cache_control
+
+    async def __call__(self, request: Request, response: Response):
+        etag = f'"{await table_versions.version(self.tables)}"'
+        check_etag(request, response, etag, self.cache_control)
+
+
+def check_etag(
+    request: Request, response: Response, etag: str, cache_control: str = 'no-cache'
+):
+    '''
+    Answer 304 when If-None-Match has `etag`, else send it with the response.
+    '''
+
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if etag in tags or '*' in tags:
+            raise HTTPException(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+
+
 async def check_closest_booking(booking_id, location_id, booking_data, action, db):
 
     current_date = int(time() * 1000)
@@ -95,7 +197,7 @@ async def check_closest_booking(booking_id, location_id, booking_data, action, d
         SELECT id
         FROM Booking
         WHERE location = ?1
-        AND (start_date + duration) >= ?2
+        AND end_date >= ?2
         ORDER BY start_date
         LIMIT 2
         ''',
@@ -118,11 +220,12 @@ async def check_booking_overlap(location: str, start_date: int, duration: int, d
         '''
             SELECT id FROM Booking
             WHERE location = ?1
+            AND start_date <= ?3 AND end_date >= ?2
             AND (
-                (start_date <= ?2 AND start_date + duration > ?2) OR
-                (start_date <= ?3 AND start_date + duration > ?3) OR
+                (start_date <= ?2 AND end_date > ?2) OR
+                (start_date <= ?3 AND end_date > ?3) OR
                 (start_date >= ?2 AND start_date <= ?3) OR
-                (start_date = ?2 AND start_date + duration = ?3)
+                (start_date = ?2 AND end_date = ?3)
             )
             ''',
         (location, start_date, end_date),
@@ -136,9 +239,16 @@ async def check_booking_overlap(location: str, start_date: int, duration: int, d
         )
 
 
-def check_signature(signature, msg):
-    message = encode_defunct(text=msg)
-    signer_address = w3.eth.account.recover_message(message, signature=signature)
+signature_pool = SignaturePool(SIGNATURE_POOL, SIGNATURE_WORKERS)
+
+# Verified ECDSA_EPHEMERAL links:
+# (signer, ephemeral payload, signature) -> expiration of the delegation
+verified_delegations = OrderedDict()
+delegation_stats = {'hits': 0, 'misses': 0}
+
+
+async def check_signature(signature, msg):
+    signer_address = await signature_pool.recover(msg, signature)
 
     return signer_address
 
@@ -151,7 +261,7 @@ def is_not_expired(iso_date):
     return current_time < expiration_time
 
 
-def validate_auth_chain(request: Request):
+async def validate_auth_chain(request: Request):
 
     # Assume that the chain contains 3 elements
     # 1. Signer
@@ -211,14 +321,28 @@ def validate_auth_chain(request: Request):
 
     _, delegateAddress, expirationDate = parseEphemeralPayload(chain[1]["payload"])
 
-    if datetime.strptime(expirationDate, "%Y-%m-%dT%H:%M:%S.%fZ") < datetime.now():
+    expiration = datetime.strptime(expirationDate, "%Y-%m-%dT%H:%M:%S.%fZ")
+    if expiration < datetime.now():
         raise HTTPException(status_code=401, detail="Expiration date is in the past")
 
     # Checksum is not required
     if not is_address(delegateAddress):
         raise HTTPException(status_code=401, detail="Invalid delegate address")
 
-    validate_signature(chain[1]["payload"], chain[1]["signature"], chain[0]["payload"])
+    # The ephemeral key is reused by the same session until it expires,
+    # so its delegation only has to be verified once
+    delegation = (chain[0]["payload"], chain[1]["payload"], chain[1]["signature"])
+    if delegation in verified_delegations:
+        verified_delegations.move_to_end(delegation)
+        delegation_stats['hits'] += 1
+    else:
+        delegation_stats['misses'] += 1
+        await validate_signature(
+            chain[1]["payload"], chain[1]["signature"], chain[0]["payload"]
+        )
+        verified_delegations[delegation] = expiration
+        while len(verified_delegations) > DELEGATION_CACHE_SIZE:
+            verified_delegations.popitem(last=False)
 
     # Validate the third element
     if chain[2]["type"] != "ECDSA_SIGNED_ENTITY":
@@ -227,7 +351,9 @@ def validate_auth_chain(request: Request):
             detail="Third element of auth chain must be an ECDSA signed entity",
         )
 
-    validate_signature(chain[2]["payload"], chain[2]["signature"], delegateAddress)
+    await validate_signature(
+        chain[2]["payload"], chain[2]["signature"], delegateAddress
+    )
 
     return chain[0]["payload"]
 
@@ -271,16 +397,11 @@ def parseEphemeralPayload(payload):
     return (purpose, delegateAddress, expirationDate)
 
 
-def validate_signature(message, signature, expected_address):
+async def validate_signature(message, signature, expected_address):
 
     try:
-        # Prepare the message to match the format it had when signed
-        message_encoded = encode_defunct(text=message)
-
         # Recover the address from the signature
-        recovered_address = Web3().eth.account.recover_message(
-            message_encoded, signature=signature
-        )
+        recovered_address = await signature_pool.recover(message, signature)
     except Exception as e:
         raise Exception("Invalid signature fromat")
 
@@ -304,6 +425,121 @@ async def check_token(token: str):
     return decoded_token
 
 
+class RoleCache:
+    '''
+    LRU cache of verified tokens keyed by token hash.
+
+    Holds the decoded claims, the user role and the token expiration, so a
+    cached request skips JWT decoding, date parsing and the User lookup.
+    Entries live at most `ttl` seconds and are dropped as soon as a role
+    changes (on every worker, through the backplane). Invalidating bumps
+    the generation of the address, so a role read before the change is not
+    cached after it.
+    '''
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._epoch = 0
+        self._generations = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        backplane.subscribe('role-cache', self._on_invalidate)
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        entry = self._entries.get(key)
+
+        if entry:
+            decoded_token, user_role, expires_at, cached_at = entry
+            current_time = time()
+            if current_time < expires_at and current_time - cached_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return decoded_token, user_role
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def generation(self, address: str) -> tuple:
+        '''
+        Take before reading the role; `put` skips the entry if it changed.
+        '''
+
+        return self._epoch, self._generations.get((address or '').lower(), 0)
+
+    def put(self, token: str, decoded_token: dict, user_role, generation: tuple):
+        if generation != self.generation(decoded_token.get('signer_address')):
+            return
+
+        expires_at = (
+            datetime.fromisoformat(decoded_token['expired_at'])
+            .replace(tzinfo=timezone.utc)
+            .timestamp()
+        )
+        key = self._key(token)
+        self._entries[key] = (decoded_token, user_role, expires_at, time())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, address: str = None):
+        '''
+        Drop the cached tokens of `address`, or of everyone if omitted.
+        '''
+
+        await backplane.publish('role-cache', {'address': address})
+
+    async def _on_invalidate(self, data: dict):
+        self.invalidations += 1
+        address = data.get('address')
+
+        if address is None:
+            self._epoch += 1
+            self._generations.clear()
+            self._entries.clear()
+            return
+
+        address = address.lower()
+        self._generations[address] = self._generations.get(address, 0) + 1
+        for key, entry in list(self._entries.items()):
+            if (entry[0].get('signer_address') or '').lower() == address:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / requests, 4) if requests else 0,
+            'invalidations': self.invalidations,
+        }
+
+
+def signature_stats() -> dict:
+    return {
+        'recoveries': signature_pool.recoveries,
+        'delegations_cached': len(verified_delegations),
+        'delegation_hits': delegation_stats['hits'],
+        'delegation_misses': delegation_stats['misses'],
+    }
+
+
+role_cache = RoleCache(ROLE_CACHE_SIZE, ROLE_CACHE_TTL)
+
+
 auth_scheme = HTTPBearer(scheme_name='User Authorization')
 
 
@@ -313,24 +549,32 @@ class CheckRole:
         self.roles = roles
 
     async def __call__(self, token=Depends(auth_scheme)) -> str:
-        async with aiosqlite.connect('database.sqlite', timeout=30) as db:
-
-            if not isinstance(token, str):
-                token = token.credentials
+        if not isinstance(token, str):
+            token = token.credentials
 
+        cached = role_cache.get(token)
+        if cached:
+            decoded_token, user_role = cached
+            user_address = decoded_token.get('signer_address')
+        else:
             decoded_token = await check_token(token)
 
             user_address = decoded_token.get('signer_address')
+            generation = role_cache.generation(user_address)
+
+            async with read_pool.connection() as db:
+                cursor = await db.execute(
+                    '''
+                    SELECT role
+                    FROM User
+                    WHERE address = ?1
+                    ''',
+                    (user_address,),
+                )
+                user_role = await cursor.fetchone()
 
-            cursor = await db.execute(
-                '''
-                SELECT role
-                FROM User
-                WHERE address = ?1
-                ''',
-                (user_address,),
-            )
-            user_role = await cursor.fetchone()
+            if user_role:
+                role_cache.put(token, decoded_token, user_role, generation)
 
         if not user_role:
             raise HTTPException(status_code=401, detail="User does not exist")
@@ -352,21 +596,81 @@ async def check_system_token(token=Depends(system_token_header_scheme)):
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
+def upload_size(file: UploadFile) -> int:
+    '''
+    Size of an uploaded file without reading it into memory.
+    '''
+
+    if file.size is not None:
+        return file.size
+
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
 async def s3_upload(save_path, file):
 
     save_path = save_path.replace('+', '_')
 
-    async with aws_session.client('s3') as s3:
-        await s3.put_object(
-            Bucket=USER_FILES_BUCKET_NAME,
-            Key=f'{FILES_BUCKET_FOLDER}/{save_path}',
-            Body=file,
-            ContentType='image/png',
-        )
+    await s3_client.upload(
+        USER_FILES_BUCKET_NAME,
+        f'{FILES_BUCKET_FOLDER}/{save_path}',
+        file,
+        'image/png',
+    )
 
     return f"https://{USER_FILES_BUCKET_NAME}.s3.amazonaws.com/{FILES_BUCKET_FOLDER}/{save_path}"
 
 
+async def s3_upload_many(uploads: list) -> list:
+    '''
+    Upload `(save_path, file)` pairs concurrently, at most
+    S3_UPLOAD_CONCURRENCY at a time. Returns the urns in the same order.
+    When one upload fails the others are cancelled and the finished ones
+    deleted.
+    '''
+
+    semaphore = asyncio.Semaphore(S3_UPLOAD_CONCURRENCY)
+    s3_urns = [None] * len(uploads)
+
+    async def upload(i, save_path, file):
+        async with semaphore:
+            s3_urns[i] = await s3_upload(save_path, file)
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            for i, (save_path, file) in enumerate(uploads):
+                group.create_task(upload(i, save_path, file))
+    except BaseException as e:
+        await delete_s3_urns([s3_urn for s3_urn in s3_urns if s3_urn])
+        if isinstance(e, ExceptionGroup):
+            raise e.exceptions[0]
+        raise
+
+    return s3_urns
+
+
+async def delete_s3_urns(s3_urns: list):
+    '''
+    Delete objects of s3_upload that no row will reference, e.g. when the
+    transaction adding them failed. Whatever is left is for the S3 GC.
+    '''
+
+    keys = [s3_urn.split('.com')[1][1:] for s3_urn in s3_urns]
+
+    for start in range(0, len(keys), s3_client.max_delete_batch):
+        batch = keys[start : start + s3_client.max_delete_batch]
+        try:
+            failed = await s3_client.delete_many(USER_FILES_BUCKET_NAME, batch)
+        except Exception as e:
+            print(f"Deleting {len(batch)} unused uploads failed: {e}")
+            continue
+        if failed:
+            print(f"Deleting unused uploads failed for: {' '.join(failed)}")
+
+
 async def delete_s3_file_if_exceeds(
     db,
     max_files=100000,
@@ -429,51 +733,213 @@ async def delete_s3_object(url: str):
     bucket_name = url.split('//')[1].split('.')[0]
     object_key = url.split('.com')[1][1:]
 
-    async with aws_session.client('s3') as s3:
-        await s3.delete_object(Bucket=bucket_name, Key=object_key)
+    await s3_client.delete(bucket_name, object_key)
+
 
+async def index_db_urns():
+    '''
+    Collect the object keys referenced by the database into the indexed
+    S3GcUrn table, so S3 listings can be diffed against it page by page
+    instead of loading every URN into memory.
+    '''
 
-async def get_s3_objects(bucket_name: str, env: str):
+    await write_queue.submit(
+        [
+            ('DELETE FROM S3GcUrn', ()),
+            (
+                '''
+                INSERT OR IGNORE INTO S3GcUrn (urn)
+                SELECT substr(url, instr(url, '.com') + 5)
+                FROM (
+                    SELECT s3_urn AS url FROM Files
+                    UNION ALL SELECT s3_urn FROM Discord
+                    UNION ALL SELECT s3_urn FROM Metrics
+                    UNION ALL SELECT preview FROM Location
+                    UNION ALL SELECT preview FROM Booking
+                    UNION ALL SELECT preview FROM Files
+                )
+                WHERE instr(url, '.com') > 0
+                ''',
+                (),
+            ),
+        ]
+    )
 
-    session = aioboto3.Session()
-    async with session.client('s3') as s3_client:
-        response = await s3_client.list_objects_v2(Bucket=bucket_name, Prefix=env)
-        objects = response.get('Contents', [])
 
-        return [obj['Key'] for obj in objects]
+async def drop_db_urns():
+    '''
+    Empty the table of index_db_urns once a run is over.
+    '''
 
+    await write_queue.execute('DELETE FROM S3GcUrn')
 
-async def get_db_urns(db):
-    urls = set()
 
-    async with db.execute('SELECT s3_urn FROM Files') as cursor:
-        urls.update(row[0] for row in await cursor.fetchall())
-    async with db.execute('SELECT s3_urn FROM Discord') as cursor:
-        urls.update(row[0] for row in await cursor.fetchall())
-    async with db.execute('SELECT s3_urn FROM Metrics') as cursor:
-        urls.update(row[0] for row in await cursor.fetchall())
-    async with db.execute('SELECT preview FROM Location') as cursor:
-        urls.update(row[0] for row in await cursor.fetchall())
-    async with db.execute('SELECT preview FROM Booking') as cursor:
-        urls.update(row[0] for row in await cursor.fetchall())
-    async with db.execute('SELECT preview FROM Files') as cursor:
-        urls.update(row[0] for row in await cursor.fetchall())
+async def orphaned_s3_objects(bucket_name: str, prefix: str, modified_before):
+    '''
+    Yield the keys of `bucket_name` that are not in S3GcUrn.
+    '''
 
-    urns = []
-    for url in urls:
+    async for keys in s3_client.iter_key_pages(bucket_name, prefix, modified_before):
+        s3_gc_run.progress['listed'] += len(keys)
+        s3_gc_run.save()
+        if not keys:
+            continue
+
+        async with read_pool.connection() as db:
+            cursor = await db.execute(
+                '''
+                SELECT urn
+                FROM S3GcUrn
+                WHERE urn IN (SELECT value FROM json_each(?1))
+                ''',
+                (json.dumps(keys),),
+            )
+            referenced = {row[0] for row in await cursor.fetchall()}
+
+        for key in keys:
+            if key not in referenced:
+                yield key
+
+
+class S3GcRun:
+    '''
+    The DELETE /sync/s3 run: one at a time across all workers.
+
+    The running worker holds an exclusive flock on `path` and keeps the
+    progress of the run there as JSON, so GET /sync/s3 on any worker reads
+    the same progress, and a run whose worker died shows as not running.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.progress = {'running': False}
+
+        self._file = None
+
+    def start(self, **progress) -> bool:
+        '''
+        Take the lock and reset the progress; False when a run holds it.
+        '''
+
+        # Not 'w': truncating would wipe the progress of the running worker
+        lock_file = open(self.path, 'a+')
         try:
-            urns.append(url.split('.com')[1][1:])
-        except Exception:
-            pass
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+
+        self._file = lock_file
+        self.progress = {'running': True, **progress}
+        self.save()
+        return True
 
-    return urns
+    def save(self):
+        if self._file:
+            self._file.seek(0)
+            self._file.truncate()
+            json.dump(self.progress, self._file)
+            self._file.flush()
 
+    def finish(self):
+        self.progress['running'] = False
+        try:
+            self.save()
+        finally:
+            self._file.close()
+            self._file = None
+
+    def read(self) -> dict:
+        try:
+            with open(self.path) as lock_file:
+                progress = json.loads(lock_file.read() or '{}')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                    running = False
+                except BlockingIOError:
+                    running = True
+        except FileNotFoundError:
+            progress, running = {}, False
+
+        return {**progress, 'running': running}
+
+
+s3_gc_run = S3GcRun(f'{DATABASE_PATH}.s3-gc.lock')
+
+
+async def collect_s3_garbage(
+    bucket_name: str, prefix: str, modified_before, dry_run: bool = False
+) -> int:
+    '''
+    Delete the objects of `bucket_name` no longer referenced by the database
+    in DeleteObjects batches, at most S3_GC_CONCURRENCY batches in flight.
+    The keys are logged per batch; returns how many were deleted (would be
+    deleted on a dry run).
+    '''
+
+    semaphore = asyncio.Semaphore(S3_GC_CONCURRENCY)
+    progress = s3_gc_run.progress
+    deleted = 0
+    tasks = []
+
+    async def delete_batch(keys):
+        nonlocal deleted
+
+        try:
+            failed = set(await s3_client.delete_many(bucket_name, keys))
+        except Exception as e:
+            print(f"S3 GC batch in {bucket_name} failed: {e}")
+            failed = set(keys)
+        finally:
+            semaphore.release()
+
+        removed = [key for key in keys if key not in failed]
+        if removed:
+            print(f"S3 GC {bucket_name} deleted: {' '.join(removed)}")
+        deleted += len(removed)
+        progress['deleted'] += len(removed)
+        progress['failed'] += len(failed)
+        s3_gc_run.save()
+
+    async def flush(keys):
+        nonlocal deleted
+
+        if dry_run:
+            print(f"S3 GC {bucket_name} would delete: {' '.join(keys)}")
+            deleted += len(keys)
+            return
+
+        await semaphore.acquire()
+        tasks.append(asyncio.create_task(delete_batch(keys)))
+
+    progress['bucket'] = bucket_name
+
+    batch = []
+    async for key in orphaned_s3_objects(bucket_name, prefix, modified_before):
+        batch.append(key)
+        progress['orphaned'] += 1
+
+        if len(batch) == s3_client.max_delete_batch:
+            await flush(batch)
+            batch = []
+            print(
+                f"S3 GC {bucket_name}: {progress['listed']} listed, "
+                f"{progress['orphaned']} orphaned, "
+                f"{progress['deleted']} deleted"
+            )
+
+    if batch:
+        await flush(batch)
 
-async def delete_s3_objects(bucket_name: str, objects):
+    await asyncio.gather(*tasks)
+    s3_gc_run.save()
 
-    async with aws_session.client('s3') as s3_client:
-        for obj in objects:
-            await s3_client.delete_object(Bucket=bucket_name, Key=obj)
+    print(
+        f"S3 GC {bucket_name} done: {deleted} "
+        f"{'would be deleted' if dry_run else 'deleted'}"
+    )
+
+    return deleted
 
 
 external_service_token_header_scheme = APIKeyHeader(
@@ -510,6 +976,68 @@ async def check_booking_owner(booking_id, user_id, db):
         raise HTTPException(status_code=403, detail="Insufficient rights")
 
 
+# Messages of Content_limit_check and Music_limit_check
+LIMIT_ERRORS = ('Content limit full', 'Music content limit full')
+
+
+def check_limit(limit_data: dict, count: int, detail: str):
+    '''
+    403 unless `count` more items fit in the booking of `limit_data`
+    (GET /content/limit or /music/limit). A NULL limit does not limit,
+    as in the limit triggers.
+    '''
+
+    limit = limit_data['limit']
+    if limit is not None and limit - limit_data['content_count'] < count:
+        raise HTTPException(status_code=403, detail=detail)
+
+
+@contextmanager
+def limit_errors():
+    '''
+    Answer 403 when a limit trigger rejects the write, e.g. another upload
+    took the last place. Any other integrity error is raised as is.
+    '''
+
+    try:
+        yield
+    except aiosqlite.IntegrityError as e:
+        if str(e) not in LIMIT_ERRORS:
+            raise
+        raise HTTPException(status_code=403, detail=str(e))
+
+
+async def sync_booking_limits():
+    '''
+    Write the per 30 minutes limits from the config to BookingLimit, where
+    the Booking triggers read them, and recompute the limits of bookings
+    made under other values.
+    '''
+
+    limit = 'CAST(ROUND(duration / 60000.0 / 30 * ?{}, 2) AS INTEGER)'
+
+    await write_queue.submit(
+        [
+            (
+                '''
+                INSERT OR REPLACE INTO BookingLimit (name, per_half_hour)
+                VALUES ('content', ?1), ('music', ?2)
+                ''',
+                (CONTENT_LIMIT, MUSIC_LIMIT),
+            ),
+            (
+                f'''
+                UPDATE Booking
+                SET content_limit = {limit.format(1)}, music_limit = {limit.format(2)}
+                WHERE content_limit IS NOT {limit.format(1)}
+                OR music_limit IS NOT {limit.format(2)}
+                ''',
+                (CONTENT_LIMIT, MUSIC_LIMIT),
+            ),
+        ]
+    )
+
+
 async def get_default_content(location_id: str, db):
     db.row_factory = aiosqlite.Row
 
@@ -579,25 +1107,43 @@ def parse_location_identifier(scene):
 class SceneSocketManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.fan_out = FanOut()
+        backplane.subscribe('scene', self._deliver)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
+        self.fan_out.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.fan_out.remove(websocket)
 
     async def send_personal_message(self, message: SocketMessage, websocket: WebSocket):
-        await websocket.send_json(message)
+        self.fan_out.send(message, [websocket])
 
     async def broadcast(self, message: SocketMessage):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        await backplane.publish('scene', message)
+
+    async def _deliver(self, message: SocketMessage):
+        self.fan_out.send(message, self.active_connections)
 
 
 scene_socket_manager = SceneSocketManager()
 
 
+def broadcast_stats() -> dict:
+    return {
+        'scene': scene_socket_manager.fan_out.stats(),
+        'changed_slots': connection_manager.fan_out.stats(),
+        'change_feed': change_feed.stats(),
+        'change_dispatcher': change_dispatcher.stats(),
+        'booking': booking_socket_manager.fan_out.stats(),
+        'backplane': backplane.stats(),
+    }
+
+
 async def broadcast_deleted_ds_message(deleted_messages: list[dict]):
 
     await scene_socket_manager.broadcast(
@@ -607,7 +1153,7 @@ async def broadcast_deleted_ds_message(deleted_messages: list[dict]):
 
 async def broadcast_added_ds_message(message_link: str):
 
-    async with aiosqlite.connect('database.sqlite', timeout=30) as db:
+    async with read_pool.connection() as db:
         db.row_factory = aiosqlite.Row
 
         cursor = await db.execute(
@@ -626,14 +1172,116 @@ async def broadcast_added_ds_message(message_link: str):
     await scene_socket_manager.broadcast({'type': 'discord-added', 'data': data})
 
 
-async def broadcast_changed_slot_if_live(slot, booking):
+class ChangeDispatcher:
+    '''
+    Debounces content change notifications.
+
+    Changes reported within `window` seconds of the first one are merged
+    into one 'changed-slots' broadcast, followed by one 'slot-changed' scene
+    message for the slots whose change belongs to their live booking (or
+    to the default content of a slot without one), resolved in one query.
+    '''
+
+    def __init__(self, window: float):
+        self.window = window
+
+        self._pending = {}
+        self._task = None
+
+        self.changes = 0
+        self.broadcasts = 0
+
+    def notify(self, slot: int = None, booking: int = None, location: str = None):
+        '''
+        Report a committed change of the content of a slot, or of the music
+        of a location, for `booking` (None for the default content).
+        '''
+
+        if location is None:
+            change = {'slot': slot, 'booking': booking}
+        else:
+            change = {'location': location, 'booking': booking}
+
+        self._pending[tuple(change.items())] = change
+        self.changes += 1
+
+        if not self._task:
+            self._task = asyncio.create_task(self._dispatch_later())
+
+    async def _dispatch_later(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        changes = list(self._pending.values())
+        self._pending = {}
+        self._task = None
+
+        if not changes:
+            return
+
+        try:
+            await self._dispatch(changes)
+        except Exception as e:
+            print(f"Content change broadcast failed: {e}")
+
+    async def _dispatch(self, changes: list):
+        self.broadcasts += 1
+        await connection_manager.broadcast(changes)
+
+        slot_changes = [change for change in changes if 'slot' in change]
+        if not slot_changes:
+            return
 
-    async with aiosqlite.connect('database.sqlite', timeout=30) as db:
-        if booking == await live_booking_for(slot, db):
+        async with read_pool.connection() as db:
+            live_bookings = await live_bookings_for(
+                {change['slot'] for change in slot_changes}, db
+            )
+
+        live_changes = [
+            change
+            for change in slot_changes
+            if live_bookings.get(change['slot']) == change['booking']
+        ]
+        if live_changes:
             await scene_socket_manager.broadcast(
-                {'type': 'slot-changed', 'data': [{'slot': slot, 'booking': booking}]}
+                {'type': 'slot-changed', 'data': live_changes}
             )
 
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'changes': self.changes,
+            'broadcasts': self.broadcasts,
+        }
+
+
+change_dispatcher = ChangeDispatcher(BROADCAST_DEBOUNCE_WINDOW)
+
+
+async def live_bookings_for(slots, db) -> dict:
+    '''
+    Live booking of each of `slots` that has one.
+    '''
+
+    slots = list(slots)
+    cursor = await db.execute(
+        f'''
+        SELECT s.id, b.id
+        FROM Booking b
+        JOIN Location l ON b.location = l.id
+        JOIN Slot s ON s.location = l.id
+        WHERE s.id IN ({', '.join('?' * len(slots))}) AND b.is_live = 1
+        ''',
+        slots,
+    )
+    return dict(await cursor.fetchall())
+
 
 async def live_booking_for(slot: int, db) -> int | None:
 
@@ -694,7 +1342,7 @@ custom_current_bookings = set()
 
 
 async def notify_replaced_booking(location, started_bookings, finished_bookings):
-    async with aiosqlite.connect('database.sqlite', timeout=30) as db:
+    async with read_pool.connection() as db:
         db.row_factory = aiosqlite.Row
         await scene_socket_manager.broadcast(
             {
@@ -722,12 +1370,12 @@ async def notify_replaced_booking(location, started_bookings, finished_bookings)
             scene = scene['scene']
 
             realm = parse_location_identifier(scene)['realm']
-            asyncio.create_task(revoke_streaming_rights(realm, el['owner']))
+            await revoke_streaming_rights(realm, el['owner'])
 
 
 async def notify_finish_booking(location, bookings_to_send):
     print("notify_finish_booking")
-    async with aiosqlite.connect('database.sqlite', timeout=30) as db:
+    async with read_pool.connection() as db:
         db.row_factory = aiosqlite.Row
         await scene_socket_manager.broadcast(
             {
@@ -751,56 +1399,216 @@ async def notify_finish_booking(location, bookings_to_send):
             scene = scene['scene']
 
             realm = parse_location_identifier(scene)['realm']
-            asyncio.create_task(revoke_streaming_rights(realm, el['owner']))
+            await revoke_streaming_rights(realm, el['owner'])
 
 
-async def check_live_bookings():
+class BookingScheduler:
+    '''
+    Fires booking go-live and finish transitions at their exact boundaries.
 
-    while True:
-        async with aiosqlite.connect('database.sqlite', timeout=30) as db:
-            db.row_factory = aiosqlite.Row
+    Upcoming start/end dates are kept in a timer heap. Controllers call
+    `schedule` / `forget` when a booking's boundaries change; stale heap
+    entries are skipped by comparing their generation with the booking's
+    current one.
+    '''
 
-            current_time = int(time() * 1000)
+    retry_delay = 1000
+    max_retry_delay = 60000
+
+    def __init__(self):
+        self._timers = []
+        self._bookings = {}
+        self._generation = 0
+        self._unsent = []
+        self._wakeup = asyncio.Event()
+        backplane.subscribe('booking-scheduler', self._on_change)
+
+    async def reschedule(self, booking_id: int, start_date: int, end_date: int):
+        '''
+        Announce new boundaries of a booking to the schedulers of all workers.
+        '''
+
+        await backplane.publish(
+            'booking-scheduler',
+            {'booking_id': booking_id, 'start_date': start_date, 'end_date': end_date},
+        )
+
+    async def cancel(self, booking_id: int):
+        await backplane.publish('booking-scheduler', {'booking_id': booking_id})
+
+    async def _on_change(self, data: dict):
+        if data.get('start_date') is None:
+            self.forget(data['booking_id'])
+        else:
+            self.schedule(data['booking_id'], data['start_date'], data['end_date'])
+
+    def schedule(self, booking_id: int, start_date: int, end_date: int):
+        self._generation += 1
+        self._bookings[booking_id] = (self._generation, end_date)
+        for due_at in (start_date, end_date):
+            heapq.heappush(self._timers, (due_at, self._generation, booking_id))
+        self._wakeup.set()
+
+    def forget(self, booking_id: int):
+        self._bookings.pop(booking_id, None)
+
+    async def _load(self):
+        current_time = int(time() * 1000)
+
+        async with read_pool.connection() as db:
             cursor = await db.execute(
                 '''
-                SELECT *
+                SELECT id, start_date, end_date
                 FROM Booking
-                WHERE is_live = 1 AND ?1 >= (start_date + duration)
+                WHERE end_date >= ?1 OR is_live = 1
                 ''',
                 (current_time,),
             )
+            bookings = await cursor.fetchall()
+
+        for booking_id, start_date, end_date in bookings:
+            self.schedule(booking_id, start_date, end_date)
+
+    def _pop_due(self, current_time: int) -> set:
+        due = set()
+        while self._timers and self._timers[0][0] <= current_time:
+            _, generation, booking_id = heapq.heappop(self._timers)
+            if self._bookings.get(booking_id, (None,))[0] == generation:
+                due.add(booking_id)
+        return due
+
+    async def run(self):
+        delay = self.retry_delay
+        while True:
+            try:
+                await self._load()
+                break
+            except Exception as e:
+                print(f"Booking schedule load failed: {e}, retrying in {delay} ms")
+                await asyncio.sleep(delay / 1000)
+                delay = min(delay * 2, self.max_retry_delay)
+
+        while True:
+            current_time = int(time() * 1000)
+            due = self._pop_due(current_time)
+
+            if due:
+                try:
+                    notifications = await self._apply(due, current_time)
+                except Exception as e:
+                    print(f"Booking transitions failed: {e}")
+                    for booking_id in due:
+                        if booking_id in self._bookings:
+                            heapq.heappush(
+                                self._timers,
+                                (
+                                    current_time + self.retry_delay,
+                                    self._bookings[booking_id][0],
+                                    booking_id,
+                                ),
+                            )
+                else:
+                    for booking_id in due:
+                        if self._bookings.get(booking_id, (None, 0))[1] <= current_time:
+                            self._bookings.pop(booking_id, None)
+                    if notifications:
+                        self._unsent.append(notifications)
+
+            await self._send_unsent()
+
+            self._wakeup.clear()
+            timeout = None
+            if self._timers:
+                timeout = max(self._timers[0][0] - time() * 1000, 0) / 1000
+            if self._unsent:
+                retry_in = self.retry_delay / 1000
+                timeout = retry_in if timeout is None else min(timeout, retry_in)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send_unsent(self):
+        '''
+        Send the notifications of committed transitions in order. They are
+        kept apart from the transitions, which a failure here must not undo
+        or repeat; a failed one is sent again whole on the next tick.
+        '''
 
-            new_current_bookings = await cursor.fetchall()
-            finished_bookings_to_send = [
-                dict(booking) for booking in new_current_bookings
-            ]
-            if finished_bookings_to_send:
-                for el in finished_bookings_to_send:
-                    await db.execute(
-                        '''
-                        UPDATE Booking
-                        SET is_live = 0
-                        WHERE id = ?1
-                        ''',
-                        (el['id'],),
-                    )
+        while self._unsent:
+            try:
+                await self._notify(*self._unsent[0])
+            except Exception as e:
+                print(f"Booking notifications failed: {e}, retrying")
+                return
+            self._unsent.pop(0)
 
-                await db.commit()
+    async def _apply(self, booking_ids: set, current_time: int):
+        '''
+        Flip the due bookings and return the (started, finished) bookings
+        to notify, as committed.
+        '''
 
+        placeholders = ','.join('?' for _ in booking_ids)
+
+        async with read_pool.connection() as db:
+            db.row_factory = aiosqlite.Row
             cursor = await db.execute(
-                '''
-                SELECT * 
+                f'''
+                SELECT *
                 FROM Booking
-                WHERE ?1 <= (start_date + duration) AND ?1 >= start_date AND is_live != 1
+                WHERE id IN ({placeholders})
                 ''',
-                (current_time,),
+                list(booking_ids),
             )
-            new_current_bookings = await cursor.fetchall()
-            started_bookings_to_send = [
-                dict(booking) for booking in new_current_bookings
-            ]
+            bookings = [dict(booking) for booking in await cursor.fetchall()]
+
+        finished = {
+            b['id']: b for b in bookings if b['is_live'] and b['end_date'] <= current_time
+        }
+        started = {
+            b['id']: b
+            for b in bookings
+            if not b['is_live'] and b['start_date'] <= current_time < b['end_date']
+        }
+
+        if not finished and not started:
+            return None
+
+        # One statement for the whole tick; RETURNING reports only the rows
+        # this call actually flipped.
+        started_placeholders = ','.join('?' for _ in started) or 'NULL'
+        changed_placeholders = ','.join('?' for _ in [*started, *finished])
+        rows = await write_queue.execute(
+            f'''
+            UPDATE Booking
+            SET is_live = CASE WHEN id IN ({started_placeholders}) THEN 1 ELSE 0 END
+            WHERE id IN ({changed_placeholders})
+            AND is_live IS NOT (CASE WHEN id IN ({started_placeholders}) THEN 1 ELSE 0 END)
+            RETURNING id, is_live
+            ''',
+            [*started, *started, *finished, *started],
+        )
 
-            if started_bookings_to_send:
+        bookings = {**finished, **started}
+        started_bookings_to_send = []
+        finished_bookings_to_send = []
+        for booking_id, is_live in rows:
+            booking = bookings[booking_id]
+            booking['is_live'] = bool(is_live)
+            if is_live:
+                started_bookings_to_send.append(booking)
+            else:
+                finished_bookings_to_send.append(booking)
+
+        if not started_bookings_to_send and not finished_bookings_to_send:
+            return None
+        return started_bookings_to_send, finished_bookings_to_send
+
+    async def _notify(self, started_bookings_to_send, finished_bookings_to_send):
+        if started_bookings_to_send:
+            async with read_pool.connection() as db:
+                db.row_factory = aiosqlite.Row
                 for el in started_bookings_to_send:
                     is_booking_streaming = await is_booking_with_streaming(el['id'], db)
                     if not is_booking_streaming:
@@ -818,51 +1626,37 @@ async def check_live_bookings():
                     scene = await cursor.fetchone()
                     scene = scene['scene']
                     realm = parse_location_identifier(scene)['realm']
-                    asyncio.create_task(delegate_streaming_rights(realm, el['owner']))
+                    await delegate_streaming_rights(realm, el['owner'])
 
-                for el in started_bookings_to_send:
-                    await db.execute(
-                        '''
-                        UPDATE Booking
-                        SET is_live = 1
-                        WHERE id = ?1
-                        ''',
-                        (el['id'],),
-                    )
-
-                await db.commit()
+        changed_locations = set(
+            (b['location'] for b in started_bookings_to_send + finished_bookings_to_send)
+        )
 
-            changed_locations = set(
-                (
-                    b['location']
-                    for b in started_bookings_to_send + finished_bookings_to_send
+        for l in changed_locations:
+            finished = [b for b in finished_bookings_to_send if b['location'] == l]
+            started = [b for b in started_bookings_to_send if b['location'] == l]
+
+            if finished and started:
+                await notify_replaced_booking(l, started, finished)
+            elif finished:
+                for el in finished:
+                    el['is_live'] = False
+                await notify_finish_booking(l, finished)
+            else:  # started
+                for el in started:
+                    el['is_live'] = True
+                await scene_socket_manager.broadcast(
+                    {
+                        'type': 'bookings_started',
+                        'data': {'location': l, 'bookings': started},
+                    }
                 )
-            )
 
-            for l in changed_locations:
-                finished = [b for b in finished_bookings_to_send if b['location'] == l]
-                started = [b for b in started_bookings_to_send if b['location'] == l]
-
-                if finished and started:
-                    await notify_replaced_booking(l, started, finished)
-                elif finished:
-                    for el in finished:
-                        el['is_live'] = False
-                    await notify_finish_booking(l, finished)
-                else:  # started
-                    for el in started:
-                        el['is_live'] = True
-                    await scene_socket_manager.broadcast(
-                        {
-                            'type': 'bookings_started',
-                            'data': {'location': l, 'bookings': started},
-                        }
-                    )
 
-        await asyncio.sleep(5)
+booking_scheduler = BookingScheduler()
 
 
 async def booking_status():
     await asyncio.gather(
-        check_live_bookings(),
+        booking_scheduler.run(),
     )